@@ -12,5 +12,27 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# bajo ASGI las lecturas calientes van por pedidos/async_views.py
+os.environ.setdefault('ASYNC_READ_PATH', '1')
+# settings.py deja fuera WhiteNoise (solo síncrono): los estáticos van por StaticFiles
+os.environ['SERVER'] = 'asgi'
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler  # noqa: E402
+from django.views.static import serve  # noqa: E402
+
+
+class StaticFiles(ASGIStaticFilesHandler):
+    """
+    /static/ desde STATIC_ROOT (collectstatic, nombres con hash del manifest)
+    fuera de la cadena de middleware: el resto de peticiones siguen en async
+    de punta a punta y solo los estáticos pasan por un hilo.
+    """
+
+    def serve(self, request):
+        return serve(request, self.file_path(request.path), document_root=settings.STATIC_ROOT)
+
+
+application = StaticFiles(django_application)
@@ -62,6 +62,8 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'pedidos.CustomUser'
 SITE_ID = 1 
 MIDDLEWARE = [
+    "pedidos.middleware.ServerTimingMiddleware",  # primero: mide la petición entera
+    "pedidos.middleware.MetricsMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
@@ -74,6 +76,12 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "pedidos.middleware.FeedbackMiddleware",
 ]
+# SERVER=asgi (start.sh / config/asgi.py): WhiteNoise es solo síncrono y en la
+# cadena async obligaría a pasar cada petición por async_to_sync (un hilo por
+# petición). Ahí los estáticos los sirve config/asgi.py, fuera de Django.
+SERVER = os.getenv("SERVER", "wsgi")
+if SERVER == "asgi":
+    MIDDLEWARE.remove("whitenoise.middleware.WhiteNoiseMiddleware")
 
 
 ROOT_URLCONF = 'config.urls'
@@ -111,10 +119,67 @@ else:
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
+            # tests/benchmarks: BD creada desde los modelos (0009/0013 son SQL de PostgreSQL);
+            # las migraciones desde 0016 (backfills) las prueba MigrationTest
+            "TEST": {"MIGRATE": False},
         }
     }
 
 
+# Cache
+# Con varios workers de gunicorn la caché TIENE que ser compartida (Redis):
+# las versiones de los tags viven en la propia caché. LocMem solo vale en local
+# (y con ella pedidos/auth.py lee token_version de la BD en cada petición).
+
+REDIS_URL = os.getenv("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "audioguide",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# TTL (s) de las respuestas cacheadas en pedidos/cache.py
+PEDIDOS_CACHE_TIMEOUT = int(os.getenv("PEDIDOS_CACHE_TIMEOUT", "300"))
+
+# Vistas async para las lecturas calientes (pedidos/async_views.py).
+# config/asgi.py lo activa por defecto; con gunicorn/WSGI queda apagado.
+ASYNC_READ_PATH = os.getenv("ASYNC_READ_PATH", "0") == "1"
+
+# idx_pedido_solape usa INCLUDE (solo PostgreSQL); en SQLite se crea sin esa
+# columna y ya está bien así. En PostgreSQL el aviso se deja: ahí sí sería un fallo
+SILENCED_SYSTEM_CHECKS = (
+    ["models.W040"] if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3" else []
+)
+
+# Stock de material para el planificador (pedidos/planner.py); 0 = sin límite
+PLANNER_STOCK_EMISORES = int(os.getenv("PLANNER_STOCK_EMISORES", "0"))
+PLANNER_STOCK_RECEPTORES = int(os.getenv("PLANNER_STOCK_RECEPTORES", "0"))
+
+# Avisos de recordatorios vencidos (manage.py dispatch_reminders, pedidos/reminders.py)
+REMINDER_NOTIFIER = os.getenv("REMINDER_NOTIFIER", "pedidos.reminders.EmailNotifier")
+REMINDER_EMAIL_BACKEND = os.getenv(
+    "REMINDER_EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend"
+)
+
+# Cabecera Server-Timing (pedidos/timing.py): fracción de peticiones que se
+# miden (0 = apagado, 1 = todas). Barato; en local/staging se puede subir a 1.
+SERVER_TIMING_SAMPLE_RATE = float(os.getenv("SERVER_TIMING_SAMPLE_RATE", "0.1"))
+
+# /metrics (Prometheus, pedidos/metrics.py): hay que mandar
+# Authorization: Bearer <token>; sin token no se sirve (404).
+# Multiproceso: PROMETHEUS_MULTIPROC_DIR en start.sh
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -178,12 +243,16 @@ CORS_ALLOWED_ORIGIN_REGEXES = [
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        # JWT; las lecturas sin consultar el usuario (pedidos/auth.py)
+        "pedidos.auth.ClaimsJWTAuthentication",
         "rest_framework.authentication.TokenAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",
     ),
+    # Paginación keyset (cursor) en todos los listados; sin COUNT(*)
+    "DEFAULT_PAGINATION_CLASS": "pedidos.pagination.KeysetPagination",
+    "PAGE_SIZE": 50,
 }
 
 REST_AUTH = {
@@ -195,5 +264,7 @@ REST_AUTH = {
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
+    # no renueva tokens revocados (token_version, pedidos/auth.py)
+    "TOKEN_REFRESH_SERIALIZER": "pedidos.auth.VersionedTokenRefreshSerializer",
 }
 REST_USE_JWT = True 
@@ -7,6 +7,7 @@ from rest_framework import permissions
 
 # Importamos tu vista de login personalizada por email
 from pedidos.views import EmailTokenObtainPairView
+from pedidos.metrics import metrics_view
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -29,6 +30,9 @@ urlpatterns = [
     # Rutas principales de la app (pedidos, empresas, reminders, crucero bulk, mis pedidos, etc.)
     path("api/", include("pedidos.api_urls")),
 
+    # Prometheus (latencias por vista, queries, ingesta de manifiestos)
+    path("metrics", metrics_view, name="metrics"),
+
     # Documentación API
     path(
         "swagger/",
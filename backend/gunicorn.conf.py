@@ -0,0 +1,15 @@
+# backend/gunicorn.conf.py (start.sh lo pasa con --config)
+"""
+Prometheus en modo multiproceso (pedidos/metrics.py): cada worker escribe sus
+métricas en PROMETHEUS_MULTIPROC_DIR y /metrics las agrega. start.sh vacía el
+directorio al arrancar; aquí se avisa cuando un worker muere para que sus
+ficheros dejen de contar como vivos.
+"""
+import os
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -6,8 +6,9 @@ from .models import  Empresa, Pedido, CustomUser, PedidoCrucero, Reminder
 class CustomUserAdmin(UserAdmin):
     model = CustomUser
     list_display = ['username', 'email', 'empresa', 'is_staff', 'is_active']
+    list_select_related = ['empresa']
     fieldsets = UserAdmin.fieldsets + (
-        ('Información adicional', {'fields': ('empresa',)}),
+        ('Información adicional', {'fields': ('empresa', 'empresa_nombre')}),
     )
 @admin.register(PedidoCrucero)
 class PedidoCruceroAdmin(admin.ModelAdmin):
@@ -1,6 +1,7 @@
 from rest_framework.routers import DefaultRouter
-from django.urls import path
-from .views import PedidoViewSet, PedidoOpsViewSet, EmpresaViewSet, ReminderViewSet, CruceroBulkView, MisPedidosView, me_view
+from django.conf import settings
+from django.urls import include, path
+from .views import PedidoViewSet, PedidoOpsViewSet, EmpresaViewSet, ReminderViewSet, BulkPedidos, CruceroBulkView, CruceroUploadView, JobDetailView, MisPedidosView, OpsStatsView, OpsPlannerView, me_view
 
 router = DefaultRouter()
 router.register(r'pedidos', PedidoViewSet, basename='pedido')
@@ -9,8 +10,16 @@ router.register(r'empresas', EmpresaViewSet, basename='empresa')
 router.register(r'reminders', ReminderViewSet, basename='reminder')
 
 urlpatterns = [
+    # servidor ASGI: lecturas calientes con vistas async (ver async_views.py)
+    *([path('', include('pedidos.async_urls'))] if settings.ASYNC_READ_PATH else []),
+    # antes del router: si no, pedidos/<pk>/ se queda con "bulk"
+    path('pedidos/bulk/', BulkPedidos.as_view(), name='pedidos-bulk'),
     *router.urls,
     path('mis-pedidos/', MisPedidosView.as_view(), name='mis-pedidos'),
     path('pedidos/cruceros/bulk/', CruceroBulkView.as_view(), name='crucero-bulk'),
+    path('pedidos/cruceros/upload/', CruceroUploadView.as_view(), name='crucero-upload'),
+    path('jobs/<int:pk>/', JobDetailView.as_view(), name='job-detail'),
+    path('ops/stats/', OpsStatsView.as_view(), name='ops-stats'),
+    path('ops/planner/', OpsPlannerView.as_view(), name='ops-planner'),
     path('me/', me_view, name='me'),
 ]
@@ -2,4 +2,20 @@ from django.apps import AppConfig
 
 class PedidosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'pedidos'
\ No newline at end of file
+    name = 'pedidos'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from . import signals  # noqa: F401  (invalidación de caché)
+
+        post_migrate.connect(_install_search, sender=self)
+
+
+def _install_search(using, **kwargs):
+    # índices de texto (search.py): idempotente, también para BDs sin migraciones
+    from django.db import connections
+
+    from .search import install
+
+    install(connections[using])
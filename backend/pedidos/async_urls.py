@@ -0,0 +1,12 @@
+from django.urls import path
+
+from . import async_views
+
+# Camino de lectura async (ASGI). Se montan ANTES del router en api_urls.py
+# para que tapen las mismas URLs; lo que no es GET se delega a la vista DRF.
+urlpatterns = [
+    path('ops/pedidos/', async_views.ops_pedidos, name='pedido-ops-list'),
+    path('mis-pedidos/', async_views.mis_pedidos, name='mis-pedidos'),
+    path('pedidos/cruceros/bulk/', async_views.cruceros, name='crucero-bulk'),
+    path('me/', async_views.me, name='me'),
+]
@@ -0,0 +1,184 @@
+# backend/pedidos/async_views.py
+"""
+Camino de lectura async (ASGI) para los endpoints que se consultan en bucle:
+
+    GET /api/me/
+    GET /api/mis-pedidos/
+    GET /api/ops/pedidos/            (listado)
+    GET /api/pedidos/cruceros/bulk/  (listado)
+
+Son vistas Django nativas `async def` con el ORM async (aiterator, afirst,
+aaggregate): mientras esperan a la BD no ocupan un worker, así que con los
+mismos cores se atienden muchos más clientes haciendo polling.
+
+DRF no tiene vistas async, así que aquí se reutiliza lo que sí es síncrono
+pero barato y sin I/O de BD: autenticación (en un hilo), serializers sobre
+filas ya cargadas (ValuesSerializer en los listados de pedidos), paginación
+keyset, ETag y caché por tags. La respuesta es la misma que la de la vista
+DRF equivalente.
+
+Cualquier otro método (POST, ...) o la exportación (?export=) se delega a la
+vista DRF de siempre con sync_to_async.
+
+Solo se montan si settings.ASYNC_READ_PATH (lo activa config/asgi.py; con
+gunicorn/WSGI no tiene sentido: cada vista async correría en su propio loop).
+"""
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from .cache import acached_data, acached_value, crucero_tag, empresa_tags
+from .conditional import acollection_validators, not_modified, with_validators
+from .exports import EXPORT_QUERY_PARAM
+from .models import Empresa, Pedido
+from .pagination import KeysetPagination
+from .serializers import PedidoCruceroSerializer, PedidoOpsSerializer, PedidoSerializer
+from .values_serializers import ValuesSerializer, ordering_columns
+from .views import CruceroBulkView, MisPedidosView, PedidoOpsViewSet, me_view
+
+CRUCERO_CHUNK_SIZE = 2000
+
+# vistas DRF a las que se delega lo que no es lectura
+_ops_sync = PedidoOpsViewSet.as_view({"get": "list", "post": "create"})
+_crucero_sync = CruceroBulkView.as_view()
+_mis_pedidos_sync = MisPedidosView.as_view()
+_me_sync = me_view
+
+
+# ---------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------
+
+def _json(data, status=200):
+    return JsonResponse(
+        data,
+        status=status,
+        safe=False,
+        encoder=JSONEncoder,
+        json_dumps_params={"ensure_ascii": False, "separators": (",", ":")},
+    )
+
+
+def _error(exc):
+    detail = exc.detail if isinstance(exc.detail, (dict, list)) else {"detail": exc.detail}
+    response = _json(detail, status=exc.status_code)
+    if isinstance(exc, NotAuthenticated):
+        response["WWW-Authenticate"] = 'Bearer realm="api"'
+    return response
+
+
+def _authenticate(request):
+    """Request de DRF con el usuario ya resuelto (JWT / Token, como en settings)."""
+    drf_request = Request(
+        request,
+        authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+    )
+    user = drf_request.user
+    if not user or not user.is_authenticated:
+        raise NotAuthenticated()
+    return drf_request
+
+
+def async_read_view(sync_view):
+    """
+    Decorador: GET (sin ?export=) -> corrutina con request DRF autenticado;
+    el resto -> `sync_view` en un hilo.
+    """
+    def decorator(handler):
+        async def view(request, *args, **kwargs):
+            if request.method != "GET" or request.GET.get(EXPORT_QUERY_PARAM):
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+            try:
+                drf_request = await sync_to_async(_authenticate)(request)
+                return await handler(drf_request, *args, **kwargs)
+            except APIException as exc:
+                return _error(exc)
+
+        view.__name__ = handler.__name__
+        view.__doc__ = handler.__doc__
+        view.csrf_exempt = True
+        return view
+    return decorator
+
+
+async def _conditional(request, queryset, field):
+    validators = await acollection_validators(request, queryset, field)
+    return validators, not_modified(request, validators)
+
+
+# ---------------------------------------------------------
+# Vistas
+# ---------------------------------------------------------
+
+@async_read_view(_me_sync)
+async def me(request):
+    u = request.user
+    empresa_id = getattr(u, "empresa_id", None)
+    empresa_name = ""
+    if empresa_id:
+        async def nombre():
+            return await Empresa.objects.filter(pk=empresa_id).values_list("nombre", flat=True).afirst() or ""
+
+        empresa_name = await acached_value(f"empresa-nombre:{empresa_id}", empresa_tags(empresa_id), nombre)
+    return _json({
+        "id": u.id,
+        "username": getattr(u, "username", ""),
+        "email": getattr(u, "email", ""),
+        "is_staff": getattr(u, "is_staff", False),
+        "empresa_name": empresa_name,
+        "empresa_id": empresa_id,
+    })
+
+
+@async_read_view(_mis_pedidos_sync)
+async def mis_pedidos(request):
+    pedidos = Pedido.objects.filter(user=request.user)
+    validators, cached = await _conditional(request, pedidos, "fecha_modificacion")
+    if cached is not None:
+        return cached
+
+    paginator = KeysetPagination()
+    reader = ValuesSerializer(PedidoSerializer)
+    rows = reader.queryset(pedidos, extra=ordering_columns(MisPedidosView.keyset_ordering))
+    page = await paginator.apaginate_queryset(rows, request, view=MisPedidosView)
+    data = paginator.get_paginated_data(reader.data(page))
+    return with_validators(_json(data), validators)
+
+
+@async_read_view(_ops_sync)
+async def ops_pedidos(request):
+    view = PedidoOpsViewSet(action="list", request=request, format_kwarg=None)
+    qs = view.get_queryset()
+    validators, cached = await _conditional(request, qs, "fecha_modificacion")
+    if cached is not None:
+        return cached
+
+    async def build():
+        paginator = KeysetPagination()
+        reader = ValuesSerializer(PedidoOpsSerializer)
+        rows = reader.queryset(qs, extra=ordering_columns(view.keyset_ordering))
+        page = await paginator.apaginate_queryset(rows, request, view=view)
+        return paginator.get_paginated_data(reader.data(page))
+
+    data = await acached_data(request, "ops_pedidos", view._cache_tags(), build)
+    return with_validators(_json(data), validators)
+
+
+@async_read_view(_crucero_sync)
+async def cruceros(request):
+    qs = CruceroBulkView()._ordered_queryset(request)
+    validators, cached = await _conditional(request, qs, "updated_at")
+    if cached is not None:
+        return cached
+
+    async def build():
+        rows = [obj async for obj in qs.aiterator(chunk_size=CRUCERO_CHUNK_SIZE)]
+        return PedidoCruceroSerializer(rows, many=True).data
+
+    data = await acached_data(
+        request, "cruceros", [crucero_tag(*CruceroBulkView._group(request))], build, scope="all",
+    )
+    return with_validators(_json(data), validators)
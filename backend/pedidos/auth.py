@@ -0,0 +1,179 @@
+# backend/pedidos/auth.py
+"""
+JWT sin consulta del usuario en cada petición.
+
+JWTAuthentication de simplejwt carga el CustomUser de la BD en cada petición
+autenticada, y el panel de ops hace polling. Los tokens de /api/token/
+(EmailTokenObtainPairSerializer) llevan ya lo que las vistas miran del
+usuario:
+
+    user_id, is_staff, empresa_id, email, username, ver (= token_version)
+
+ClaimsJWTAuthentication:
+
+- GET/HEAD/OPTIONS  request.user se construye desde los claims (un CustomUser
+                    sin cargar, con pk: vale para filter(user=request.user)).
+                    Solo se comprueba que `ver` sigue siendo la versión
+                    actual del usuario, que vive en la caché (Redis en
+                    producción); la BD solo se toca si la caché no la tiene
+- escrituras        el usuario sale de la BD como siempre (y `ver` tiene que
+                    cuadrar): lo que se guarde con request.user es el real
+- tokens sin `ver`  (emitidos antes de esto) como JWTAuthentication
+
+Revocar = subir token_version. Lo hace signals.py al guardar un usuario con
+cambios en REVOKING_FIELDS (contraseña, activo, staff, empresa...), y al
+confirmar escribe la versión NUEVA en la caché (publish_version): a partir
+de ahí los tokens viejos dan 401 "token_revoked" y hay que volver a hacer
+login. El refresh también la comprueba, así que no se pueden sacar access
+nuevos con los claims viejos.
+
+La caché se rellena con add() y no con set(): una lectura que cargó la
+versión vieja de la BD justo antes del commit no puede pisar la publicada
+(si no, los tokens revocados valdrían hasta VERSION_CACHE_TIMEOUT). Un
+usuario borrado deja DELETED en su clave por lo mismo.
+
+Todo esto exige que todos los workers vean la MISMA caché: con LocMem (sin
+REDIS_URL) cada proceso tiene la suya y la revocación solo llegaría al
+worker que guardó el usuario. En ese caso la versión se lee siempre de la
+BD (una consulta por clave primaria, en vez de cargar el usuario entero).
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+VERSION_CLAIM = "ver"
+VERSION_KEY_PREFIX = "auth:token_version:"
+VERSION_CACHE_TIMEOUT = 24 * 3600  # = vida del refresh (settings.SIMPLE_JWT)
+DELETED = -1  # versión en caché de un usuario borrado
+
+# backends con una caché por proceso: no sirven para propagar revocaciones
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+# cambios en el usuario que invalidan sus tokens
+REVOKING_FIELDS = ("password", "is_active", "is_staff", "is_superuser", "empresa", "email", "username")
+
+
+def add_claims(token, user):
+    token["is_staff"] = user.is_staff
+    token["empresa_id"] = user.empresa_id
+    token["email"] = user.email
+    token["username"] = user.username
+    token[VERSION_CLAIM] = user.token_version
+    return token
+
+
+# ---------------------------------------------------------
+# Versión actual (caché -> BD)
+# ---------------------------------------------------------
+
+def _version_key(user_id):
+    return f"{VERSION_KEY_PREFIX}{user_id}"
+
+
+def shared_cache():
+    """¿La caché por defecto la comparten todos los workers?"""
+    return settings.CACHES["default"]["BACKEND"] not in PROCESS_LOCAL_CACHES
+
+
+def _db_version(user_id):
+    return (
+        get_user_model().objects.filter(pk=user_id, is_active=True)
+        .values_list("token_version", flat=True).first()
+    )
+
+
+def current_version(user_id):
+    """token_version actual del usuario activo `user_id`, o None si no existe / inactivo."""
+    if not shared_cache():
+        return _db_version(user_id)
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = _db_version(user_id)
+        if version is None:
+            return None
+        # add: si entretanto se publicó una versión nueva, gana esa
+        cache.add(key, version, VERSION_CACHE_TIMEOUT)
+    return None if version == DELETED else version
+
+
+def publish_version(user_id, deleted=False):
+    """Al confirmar: la versión actual de la BD (o DELETED) a la caché, pisando la que hubiera."""
+    def publish():
+        version = DELETED if deleted else (
+            get_user_model().objects.filter(pk=user_id).values_list("token_version", flat=True).first()
+        )
+        cache.set(_version_key(user_id), DELETED if version is None else version, VERSION_CACHE_TIMEOUT)
+
+    transaction.on_commit(publish)
+
+
+def _check_version(token, version):
+    if version is None:
+        raise AuthenticationFailed("Usuario no encontrado o inactivo.", code="user_not_found")
+    if token[VERSION_CLAIM] != version:
+        raise AuthenticationFailed("Token revocado, vuelve a iniciar sesión.", code="token_revoked")
+
+
+# ---------------------------------------------------------
+# Autenticación
+# ---------------------------------------------------------
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        token = self.get_validated_token(raw_token)
+
+        if VERSION_CLAIM not in token:
+            return self.get_user(token), token
+        if request.method not in SAFE_METHODS:
+            user = self.get_user(token)
+            _check_version(token, user.token_version)
+            return user, token
+        return self.claims_user(token), token
+
+    def claims_user(self, token):
+        try:
+            user_id = token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("El token no identifica a ningún usuario")
+        _check_version(token, current_version(user_id))
+
+        user = self.user_model(
+            pk=user_id,
+            is_staff=token["is_staff"],
+            empresa_id=token["empresa_id"],
+            email=token["email"],
+            username=token["username"],
+            token_version=token[VERSION_CLAIM],
+        )
+        # como si viniera de la BD (sin el resto de campos: no se guarda nunca)
+        user._state.adding = False
+        user._state.db = "default"
+        user.from_claims = True
+        return user
+
+
+class VersionedTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresh que no renueva tokens revocados (SIMPLE_JWT["TOKEN_REFRESH_SERIALIZER"])."""
+
+    def validate(self, attrs):
+        refresh = RefreshToken(attrs["refresh"])
+        if VERSION_CLAIM in refresh:
+            _check_version(refresh, current_version(refresh[jwt_settings.USER_ID_CLAIM]))
+        return super().validate(attrs)
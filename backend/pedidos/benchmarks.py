@@ -0,0 +1,399 @@
+# backend/pedidos/benchmarks.py
+"""
+Micro-benchmarks de los caminos calientes del backend.
+
+Cada benchmark recibe el contexto (usuario staff, empresa, factory) y el
+tamaño del dataset, y devuelve un callable `run(i)` que es lo que se cronometra.
+El dataset se genera con el mismo Seeder que `manage.py seed_load` en la BD
+actual; el comando `manage.py bench` se encarga de crear una BD de test
+desechable (SQLite en memoria en local).
+"""
+import asyncio
+import json
+import platform
+import statistics
+import time
+from datetime import timedelta
+
+import django
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.urls import include, path
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Empresa, Pedido, PedidoCrucero
+from .seeding import Seeder
+from .serializers import PedidoCruceroSerializer, PedidoOpsSerializer
+
+DELIVERED_CALLS = 200
+BULK_ROWS = 5000
+POLLERS = 60
+POLL_URLS = ("/api/ops/pedidos/?page_size=50", "/api/mis-pedidos/?page_size=50", "/api/me/")
+
+# urlconf de poll_asgi: camino async delante del de siempre (como con ASYNC_READ_PATH)
+urlpatterns = [
+    path("api/", include("pedidos.async_urls")),
+    path("api/", include("config.urls")),
+]
+
+
+class BenchContext:
+    def __init__(self):
+        User = get_user_model()
+        self.empresa, _ = Empresa.objects.get_or_create(nombre="Bench")
+        self.user, _ = User.objects.get_or_create(
+            email="bench@example.com",
+            defaults={"username": "bench", "is_staff": True, "empresa": self.empresa},
+        )
+        self.factory = APIRequestFactory()
+
+    def request(self, method, path, data=None):
+        req = getattr(self.factory, method)(path, data, format="json")
+        force_authenticate(req, user=self.user)
+        return req
+
+    def drf_request(self, method, path, data=None):
+        """Request de DRF ya autenticado, para llamar a vistas/serializers por dentro."""
+        return Request(self.request(method, path, data))
+
+    @property
+    def auth_headers(self):
+        """Cabecera JWT para pasar por el stack HTTP completo (middleware + auth)."""
+        return {"authorization": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+
+# ---------------------------------------------------------
+# Datasets
+# ---------------------------------------------------------
+
+CRUCERO_PAYLOAD_FIELDS = (
+    "supplier", "emergency_contact", "service_date", "ship", "sign", "excursion",
+    "language", "pax", "arrival_time", "status", "terminal",
+)
+
+
+def crucero_rows(limit=None):
+    """El manifiesto sembrado tal y como lo enviaría el cliente (JSON)."""
+    qs = PedidoCrucero.objects.order_by("service_date", "ship", "id").values_list(*CRUCERO_PAYLOAD_FIELDS)
+    if limit:
+        qs = qs[:limit]
+    return [
+        {k: (v.isoformat() if hasattr(v, "isoformat") else v) for k, v in zip(CRUCERO_PAYLOAD_FIELDS, row)}
+        for row in qs
+    ]
+
+
+def reset_dataset(ctx, n, seed=42):
+    """Dataset de n pedidos + n filas de manifiesto generado con seed_load."""
+    Seeder.clear()
+    Seeder(seed=seed, chunk_size=5000).run(
+        empresas=20, users=100, pedidos=n, events_per_pedido=4.0, cruceros=n, reminders=n // 10,
+    )
+
+
+# ---------------------------------------------------------
+# Benchmarks: (ctx, n) -> run(i)
+# ---------------------------------------------------------
+
+def bench_crucero_post(ctx, n):
+    """Re-subida del manifiesto completo con un 10% de filas cambiadas."""
+    from .views import CruceroBulkView
+
+    view = CruceroBulkView.as_view()
+    base = crucero_rows()
+
+    def run(i):
+        delta = 1 if i % 2 == 0 else 0
+        rows = [
+            {**r, "pax": r["pax"] + delta} if k % 10 == 0 else r
+            for k, r in enumerate(base)
+        ]
+        res = view(ctx.request("post", "/api/pedidos/cruceros/bulk/", rows))
+        assert res.status_code == 201, res.data
+    return run
+
+
+def bench_crucero_get(ctx, n):
+    """GET /api/pedidos/cruceros/bulk/ sin caché de respuestas (consulta + serialización)."""
+    from django.core.cache import cache
+
+    from .views import CruceroBulkView
+
+    view = CruceroBulkView.as_view()
+
+    def run(i):
+        cache.clear()
+        res = view(ctx.request("get", "/api/pedidos/cruceros/bulk/"))
+        assert res.status_code == 200
+    return run
+
+
+def bench_ops_list(ctx, n):
+    """get_queryset (staff, sin filtros) + PedidoOpsSerializer de todas las filas."""
+    from .views import PedidoOpsViewSet
+
+    def run(i):
+        view = PedidoOpsViewSet(action="list", format_kwarg=None)
+        view.request = ctx.drf_request("get", "/api/ops/pedidos/")
+        data = PedidoOpsSerializer(view.get_queryset(), many=True, context={"request": view.request}).data
+        assert len(data) == n
+    return run
+
+
+def bench_ops_list_values(ctx, n):
+    """Lo mismo que ops_list por ValuesSerializer (values_list + conversores)."""
+    from .values_serializers import ValuesSerializer
+    from .views import PedidoOpsViewSet
+
+    reader = ValuesSerializer(PedidoOpsSerializer)
+
+    def run(i):
+        view = PedidoOpsViewSet(action="list", format_kwarg=None)
+        view.request = ctx.drf_request("get", "/api/ops/pedidos/")
+        data = reader.data(reader.queryset(view.get_queryset()))
+        assert len(data) == n
+    return run
+
+
+def bench_ops_validate(ctx, n):
+    req = ctx.drf_request("post", "/api/ops/pedidos/")
+    payload = [
+        {
+            "empresa": ctx.empresa.pk,
+            "excursion": "City",
+            "fecha_inicio": "2025-06-01",
+            "tipo_servicio": "mediodia",
+            "estado": "pagado",
+            "pax": 10,
+        }
+        for _ in range(n)
+    ]
+
+    def run(i):
+        ser = PedidoOpsSerializer(data=payload, many=True, context={"request": req})
+        assert ser.is_valid(), ser.errors[:1]
+    return run
+
+
+def bench_crucero_validate(ctx, n):
+    rows = crucero_rows()
+
+    def run(i):
+        ser = PedidoCruceroSerializer(data=rows, many=True)
+        assert ser.is_valid(), ser.errors[:1]
+    return run
+
+
+def bench_set_delivered(ctx, n):
+    """DELIVERED_CALLS transiciones sobre una tabla de n pedidos."""
+    ids = list(Pedido.objects.order_by("id").values_list("id", flat=True)[:DELIVERED_CALLS])
+
+    def run(i):
+        for pk in ids:
+            Pedido.objects.get(pk=pk).set_delivered(user=ctx.user, delivered_pax=5)
+    return run
+
+
+def bench_poll_wsgi(ctx, n):
+    """
+    POLLERS GET de polling por el handler WSGI, en serie: es lo que puede
+    atender un worker síncrono de gunicorn.
+    """
+    client = Client(headers=ctx.auth_headers)
+
+    def run(i):
+        for k in range(POLLERS):
+            res = client.get(POLL_URLS[k % len(POLL_URLS)])
+            assert res.status_code == 200, res.status_code
+    return run
+
+
+def bench_poll_asgi(ctx, n):
+    """
+    Las mismas peticiones por el handler ASGI y las vistas async, todas a la
+    vez en un solo event loop (un worker uvicorn). Con SQLite en memoria las
+    queries se siguen ejecutando de una en una, así que esto mide sobre todo
+    el overhead del camino async; la ganancia real (esperas de red a
+    PostgreSQL solapadas) solo se ve contra una BD de verdad.
+    """
+    client = AsyncClient()
+    headers = ctx.auth_headers
+
+    async def poll_all():
+        responses = await asyncio.gather(*(
+            client.get(POLL_URLS[k % len(POLL_URLS)], headers=headers) for k in range(POLLERS)
+        ))
+        assert all(r.status_code == 200 for r in responses), [r.status_code for r in responses]
+
+    def run(i):
+        with override_settings(ROOT_URLCONF=__name__):
+            async_to_sync(poll_all)()
+    return run
+
+
+def bench_ops_search(ctx, n):
+    """?q= sobre /api/ops/pedidos/ (FTS + ranking + primera página), sin caché de respuestas."""
+    from django.core.cache import cache
+
+    from .views import PedidoOpsViewSet
+
+    view = PedidoOpsViewSet.as_view({"get": "list"})
+
+    def run(i):
+        cache.clear()
+        res = view(ctx.request("get", "/api/ops/pedidos/?q=city+tour"))
+        assert res.status_code == 200
+    return run
+
+
+def bench_planner_year(ctx, n):
+    """Planificador de emisores sobre un año entero del dataset (una consulta + NumPy)."""
+    from datetime import timedelta
+
+    from .planner import plan_demand
+
+    desde = Pedido.objects.order_by("fecha_inicio").values_list("fecha_inicio", flat=True).first()
+
+    def run(i):
+        plan = plan_demand(desde, desde + timedelta(days=365), stock_emisores=50)
+        assert len(plan["results"]) == 366
+    return run
+
+
+def bench_pedidos_bulk(ctx, n):
+    """
+    Alta masiva de BULK_ROWS pedidos por POST /api/pedidos/bulk/ (empresa por
+    nombre), repartidos como una importación de temporada: 120 días × 3 tipos
+    (cientos de claves distintas en el resumen diario).
+    """
+    from .views import BulkPedidos
+
+    view = BulkPedidos.as_view()
+    hoy = timezone.now().date()
+    tipos = ("mediodia", "dia_Completo", "circuito")
+    rows = [
+        {"empresa": ctx.empresa.nombre, "fecha_inicio": (hoy + timedelta(days=k % 120)).isoformat(),
+         "tipo_servicio": tipos[k // 120 % 3], "pax": 10 + k % 30,
+         "emisores": 1 + k % 3, "excursion": "Bench", "estado": "pagado"}
+        for k in range(BULK_ROWS)
+    ]
+
+    def run(i):
+        res = view(ctx.request("post", "/api/pedidos/bulk/", rows))
+        assert res.status_code == 201 and res.data["created"] == BULK_ROWS, res.data
+    return run
+
+
+BENCHMARKS = {
+    "crucero_post": bench_crucero_post,
+    "crucero_get": bench_crucero_get,
+    "ops_list": bench_ops_list,
+    "ops_list_values": bench_ops_list_values,
+    "ops_validate": bench_ops_validate,
+    "crucero_validate": bench_crucero_validate,
+    "set_delivered": bench_set_delivered,
+    "poll_wsgi": bench_poll_wsgi,
+    "poll_asgi": bench_poll_asgi,
+    "planner_year": bench_planner_year,
+    "ops_search": bench_ops_search,
+    "pedidos_bulk": bench_pedidos_bulk,
+}
+
+
+# ---------------------------------------------------------
+# Ejecución y comparación con baseline
+# ---------------------------------------------------------
+
+class QueryCounter:
+    """execute_wrapper que solo cuenta queries (sin el log de DEBUG)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def run_benchmarks(sizes, repeat=3, only=None, log=None):
+    """
+    Devuelve {"meta": {...}, "results": {"<bench>@<n>": {"seconds", "queries", "runs"}}}.
+    `seconds` es la mediana de `repeat` ejecuciones (tras un calentamiento).
+    """
+    ctx = BenchContext()
+    names = [name for name in BENCHMARKS if not only or name in only]
+    results = {}
+    for n in sizes:
+        reset_dataset(ctx, n)
+        for name in names:
+            run = BENCHMARKS[name](ctx, n)
+            run(-1)  # calentamiento (caches, primera subida, etc.)
+            timings = []
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                for i in range(repeat):
+                    t0 = time.perf_counter()
+                    run(i)
+                    timings.append(time.perf_counter() - t0)
+            key = f"{name}@{n}"
+            results[key] = {
+                "seconds": round(statistics.median(timings), 6),
+                "queries": counter.count // max(repeat, 1),
+                "runs": [round(t, 6) for t in timings],
+            }
+            if log:
+                log(f"{key:<28} {results[key]['seconds'] * 1000:>10.1f} ms  {results[key]['queries']:>7} queries")
+    return {
+        "meta": {
+            "created": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "vendor": connection.vendor,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare_results(current, baseline, threshold_pct, min_delta_ms=5.0):
+    """
+    Lista de regresiones: benchmarks presentes en ambos cuyo tiempo supera
+    el baseline en más de `threshold_pct` % y en más de `min_delta_ms` ms
+    (para no fallar por ruido en caminos de pocos milisegundos).
+    """
+    regressions = []
+    base = baseline.get("results", {})
+    for key, cur in current.get("results", {}).items():
+        ref = base.get(key)
+        if not ref or not ref.get("seconds"):
+            continue
+        delta = cur["seconds"] - ref["seconds"]
+        pct = delta / ref["seconds"] * 100
+        if pct > threshold_pct and delta * 1000 > min_delta_ms:
+            regressions.append({
+                "benchmark": key,
+                "baseline": ref["seconds"],
+                "current": cur["seconds"],
+                "pct": round(pct, 1),
+            })
+    return regressions
+
+
+def load_baseline(path):
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(data, fh, indent=2, sort_keys=True)
+        fh.write("\n")
@@ -0,0 +1,218 @@
+# backend/pedidos/cache.py
+"""
+Caché de respuestas por tags sobre el framework de caché de Django.
+
+Cada entrada se guarda bajo una clave que combina:
+
+    vista + alcance (staff / usuario) + query params normalizados
+    + la versión actual de cada uno de sus tags
+
+Invalidar un tag = darle una versión nueva (un token aleatorio). Las entradas
+viejas dejan de ser alcanzables y caducan solas por TTL; no hay que buscarlas
+ni borrarlas. Las versiones viven en la propia caché, así que con un backend
+compartido (Redis, ver settings.CACHES) todos los workers ven la invalidación.
+
+Tags en uso:
+    empresas, empresa:<id>
+    pedidos, pedidos:<empresa_id>, pedidos:user:<user_id>
+    cruceros, crucero:<service_date>:<ship>   (lecturas: uno de los dos; ver crucero_tag)
+
+Las invalidaciones se aplican en transaction.on_commit: si se aplicaran antes,
+otro worker podría volver a cachear los datos viejos (aún sin commit) con la
+versión nueva. Dentro de `invalidation_batch()` se acumulan y se publican de
+una vez (p. ej. un merge de manifiesto que toca cientos de filas).
+"""
+import hashlib
+import json
+import threading
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+CACHE_TIMEOUT = getattr(settings, "PEDIDOS_CACHE_TIMEOUT", 300)
+TAG_KEY_PREFIX = "pedidos:tag:"
+RESPONSE_KEY_PREFIX = "pedidos:resp:"
+
+_local = threading.local()
+
+
+# ---------------------------------------------------------
+# Tags
+# ---------------------------------------------------------
+
+def empresa_tags(empresa_id=None):
+    return ["empresas", f"empresa:{empresa_id}"] if empresa_id else ["empresas"]
+
+
+def pedido_tag(empresa_id=None, user_id=None):
+    """Tag de UN listado de pedidos: todos, los de una empresa o los de un usuario."""
+    if user_id:
+        return f"pedidos:user:{user_id}"
+    if empresa_id:
+        return f"pedidos:{empresa_id}"
+    return "pedidos"
+
+
+def pedido_tags(empresa_id=None, user_id=None):
+    """Tags que invalida una escritura sobre un pedido."""
+    tags = [pedido_tag()]
+    if empresa_id:
+        tags.append(pedido_tag(empresa_id=empresa_id))
+    if user_id:
+        tags.append(pedido_tag(user_id=user_id))
+    return tags
+
+
+def crucero_tag(service_date=None, ship=None):
+    """
+    Tag de UNA lectura de cruceros: la de un grupo (service_date, ship) solo
+    depende de ese grupo; cualquier otro listado (sin filtro o con uno
+    parcial), de todos ("cruceros"). `service_date` ya parseado (date), no el
+    texto del query param: "2025-6-1" tiene que dar el mismo tag.
+    """
+    if service_date and ship:
+        return f"crucero:{service_date}:{ship}"  # str(date) = YYYY-MM-DD
+    return "cruceros"
+
+
+def crucero_tags(service_date=None, ship=None):
+    """Tags que invalida una escritura en el grupo: el suyo y el de "todos"."""
+    tags = [crucero_tag()]
+    if service_date and ship:
+        tags.append(crucero_tag(service_date, ship))
+    return tags
+
+
+def _tag_key(tag):
+    # los nombres de barco llevan espacios/acentos: la clave va hasheada
+    return TAG_KEY_PREFIX + hashlib.md5(tag.encode(), usedforsecurity=False).hexdigest()
+
+
+def tag_versions(tags):
+    """Versión actual de cada tag (se crea si no existe)."""
+    keys = [_tag_key(t) for t in tags]
+    found = cache.get_many(keys)
+    missing = [k for k in keys if k not in found]
+    if missing:
+        for k in missing:
+            # add: si otro worker la creó a la vez, gana la suya
+            cache.add(k, uuid.uuid4().hex, None)
+        found.update(cache.get_many(missing))
+    return [found.get(k, "") for k in keys]
+
+
+async def atag_versions(tags):
+    keys = [_tag_key(t) for t in tags]
+    found = await cache.aget_many(keys)
+    missing = [k for k in keys if k not in found]
+    if missing:
+        for k in missing:
+            await cache.aadd(k, uuid.uuid4().hex, None)
+        found.update(await cache.aget_many(missing))
+    return [found.get(k, "") for k in keys]
+
+
+def _bump(tags):
+    if tags:
+        cache.set_many({_tag_key(t): uuid.uuid4().hex for t in tags}, None)
+
+
+def invalidate(*tags):
+    """Invalida los tags al hacer commit (o al salir del batch en curso)."""
+    tags = {t for t in tags if t}
+    if not tags:
+        return
+    batch = getattr(_local, "batch", None)
+    if batch is not None:
+        batch.update(tags)
+        return
+    transaction.on_commit(lambda: _bump(tags))
+
+
+@contextmanager
+def invalidation_batch():
+    """Agrupa todas las invalidaciones del bloque en una sola escritura."""
+    outer = getattr(_local, "batch", None)
+    if outer is not None:
+        yield outer
+        return
+    _local.batch = set()
+    try:
+        yield _local.batch
+        tags = _local.batch
+    finally:
+        _local.batch = None
+    invalidate(*tags)
+
+
+# ---------------------------------------------------------
+# Respuestas
+# ---------------------------------------------------------
+
+def request_scope(request):
+    """Alcance de los datos: staff ve lo mismo; el resto, lo suyo."""
+    user = request.user
+    return "staff" if user.is_staff else f"user:{user.pk}"
+
+
+def response_key(view_name, scope, query_params, tags, versions=None):
+    # se ordenan las claves, no los valores (?ordering=a&ordering=b importa)
+    params = sorted((k, query_params.getlist(k)) for k in query_params or ())
+    versions = tag_versions(tags) if versions is None else versions
+    raw = json.dumps([view_name, scope, params, tags, versions], default=str)
+    return RESPONSE_KEY_PREFIX + hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+
+
+def cached_data(request, view_name, tags, build, scope=None, timeout=None):
+    """
+    Devuelve `build()` (datos ya serializados) desde caché si la hay.
+    `scope` por defecto: request_scope(request).
+    """
+    scope = scope if scope is not None else request_scope(request)
+    key = response_key(view_name, scope, request.query_params, tags)
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, CACHE_TIMEOUT if timeout is None else timeout)
+    return data
+
+
+async def acached_data(request, view_name, tags, abuild, scope=None, timeout=None):
+    """Como cached_data, pero `abuild` es una corrutina (vistas ASGI)."""
+    scope = scope if scope is not None else request_scope(request)
+    versions = await atag_versions(tags)
+    key = response_key(view_name, scope, request.query_params, tags, versions)
+    data = await cache.aget(key)
+    if data is None:
+        data = await abuild()
+        await cache.aset(key, data, CACHE_TIMEOUT if timeout is None else timeout)
+    return data
+
+
+# ---------------------------------------------------------
+# Valores sueltos
+# ---------------------------------------------------------
+
+def cached_value(name, tags, build, timeout=None):
+    """
+    Como cached_data para un valor que no depende de la petición (p. ej. el
+    nombre de una empresa en /api/me/): misma clave para todos los usuarios.
+    """
+    key = response_key(name, "", None, tags)
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, CACHE_TIMEOUT if timeout is None else timeout)
+    return value
+
+
+async def acached_value(name, tags, abuild, timeout=None):
+    key = response_key(name, "", None, tags, await atag_versions(tags))
+    value = await cache.aget(key)
+    if value is None:
+        value = await abuild()
+        await cache.aset(key, value, CACHE_TIMEOUT if timeout is None else timeout)
+    return value
@@ -0,0 +1,93 @@
+# backend/pedidos/conditional.py
+"""
+GET condicional (ETag / Last-Modified) para los listados que se consultan
+en bucle (panel de operaciones, app móvil).
+
+Los validadores de un listado salen de UNA consulta agregada sobre el
+queryset ya filtrado:
+
+    SELECT MAX(<campo de modificación>), COUNT(*) ...
+
+- ETag (débil)   -> hash de MAX + COUNT + URL + usuario (el cuerpo depende
+                    de los filtros, del cursor y de lo que ve cada usuario)
+
+El COUNT cubre los borrados (el MAX no baja al borrar). Si el cliente manda
+If-None-Match y coincide, se devuelve 304 sin serializar.
+
+Los listados NO llevan Last-Modified: el MAX en segundos no ve los borrados
+(un merge que solo quita signs) ni una segunda escritura en el mismo segundo,
+así que un cliente que solo mandara If-Modified-Since se quedaría con datos
+viejos. Sin Last-Modified, If-Modified-Since se ignora. Una fila suelta
+(object_validators) sí lo lleva.
+
+Uso en una vista:
+
+    validators = collection_validators(request, qs, "fecha_modificacion")
+    cached = not_modified(request, validators)
+    if cached is not None:
+        return cached
+    response = ...
+    return with_validators(response, validators)
+"""
+import hashlib
+from calendar import timegm
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+CONDITIONAL_METHODS = ("GET", "HEAD")
+
+
+def _etag(*parts):
+    digest = hashlib.md5("|".join(str(p) for p in parts).encode(), usedforsecurity=False).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _timestamp(dt):
+    return timegm(dt.utctimetuple()) if dt else None
+
+
+def collection_validators(request, queryset, field):
+    """(etag, None) del queryset filtrado: sin Last-Modified (ver arriba)."""
+    agg = queryset.order_by().aggregate(last=Max(field), n=Count("pk"))
+    return _collection_result(request, agg)
+
+
+async def acollection_validators(request, queryset, field):
+    """Versión async (ORM async) para las vistas ASGI."""
+    agg = await queryset.order_by().aaggregate(last=Max(field), n=Count("pk"))
+    return _collection_result(request, agg)
+
+
+def _collection_result(request, agg):
+    last = agg["last"]
+    user_id = getattr(request.user, "pk", None)
+    etag = _etag(request.get_full_path(), user_id, agg["n"], last.isoformat() if last else "-")
+    return etag, None
+
+
+def object_validators(obj, field):
+    """(etag, last_modified) de una sola fila: pk + su campo de modificación."""
+    last = getattr(obj, field)
+    etag = _etag(obj._meta.label, obj.pk, last.isoformat() if last else "-")
+    return etag, _timestamp(last)
+
+
+def not_modified(request, validators):
+    """304 (o 412) si las cabeceras condicionales del cliente coinciden; None si no."""
+    if request.method not in CONDITIONAL_METHODS:
+        return None
+    etag, last_modified = validators
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    return with_validators(response, validators) if response is not None else None
+
+
+def with_validators(response, validators):
+    etag, last_modified = validators
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    # el cliente puede guardar la respuesta pero tiene que revalidar siempre
+    response["Cache-Control"] = "private, no-cache"
+    return response
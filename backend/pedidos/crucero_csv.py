@@ -0,0 +1,174 @@
+# backend/pedidos/crucero_csv.py
+"""
+Subida de manifiestos de crucero en CSV (POST /api/pedidos/cruceros/upload/).
+
+Los proveedores mandan exportaciones de hoja de cálculo; en vez de
+convertirlas a JSON rows/meta, se sube el fichero (multipart, campo "file")
+y se procesa en streaming:
+
+    fichero -> read_rows() (generador, fila a fila) -> trozos de CHUNK_ROWS
+            -> PedidoCruceroSerializer -> group_rows + merge_groups(seen=...)
+            -> al final remove_unseen(seen)
+
+En memoria solo hay un trozo y los signs vistos por grupo, así que un
+fichero grande con muchos barcos no crece con el nº de filas (Django ya deja
+en disco las subidas grandes, FILE_UPLOAD_MAX_MEMORY_SIZE). Los grupos
+(service_date, ship) pueden venir repartidos por el fichero.
+
+Cabeceras: se aceptan los alias habituales de los proveedores
+(HEADER_ALIASES, sin distinguir mayúsculas/acentos/espacios). Separador
+, ; tab o | (se detecta). Fechas ISO o dd/mm/aaaa.
+
+Todo va en una transacción: si alguna fila no valida no se guarda nada y se
+devuelven los errores con su nº de línea (hasta MAX_ERRORS).
+"""
+import csv
+import io
+import itertools
+import unicodedata
+from datetime import datetime
+
+from .crucero_merge import create_pedidos, group_rows, merge_groups, remove_unseen
+from .serializers import PedidoCruceroSerializer
+
+CHUNK_ROWS = 1000
+MAX_ERRORS = 50
+SNIFF_BYTES = 16 * 1024
+
+# campo de PedidoCrucero -> cabeceras aceptadas (ya normalizadas con _norm)
+HEADER_ALIASES = {
+    "supplier": ("supplier", "proveedor", "provider", "agency", "agencia"),
+    "emergency_contact": ("emergencycontact", "contact", "contacto", "contactoemergencia", "phone", "telefono"),
+    "service_date": ("servicedate", "date", "fecha", "fechaservicio", "dia"),
+    "ship": ("ship", "shipname", "barco", "buque", "vessel"),
+    "sign": ("sign", "bus", "busno", "busnumber", "nbus", "nobus", "numbus", "coach", "autobus"),
+    "excursion": ("excursion", "tour", "shoreexcursion", "tourname"),
+    "language": ("language", "idioma", "lang"),
+    "pax": ("pax", "passengers", "pasajeros", "guests"),
+    "arrival_time": ("arrivaltime", "arrival", "hora", "horallegada", "time"),
+    "status": ("status", "estado"),
+    "terminal": ("terminal", "muelle", "pier"),
+}
+_ALIASES = {alias: field for field, aliases in HEADER_ALIASES.items() for alias in aliases}
+# se pueden fijar para todo el fichero con campos del formulario (como meta en JSON)
+META_FIELDS = ("service_date", "ship", "status", "terminal", "supplier", "emergency_contact")
+REQUIRED_FIELDS = ("service_date", "ship", "sign", "excursion", "pax", "status", "supplier")
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d/%m/%y")
+
+
+class ManifestError(ValueError):
+    """Fichero que no se puede leer (cabecera, codificación...)."""
+
+
+def _norm(header):
+    text = unicodedata.normalize("NFKD", header or "").encode("ascii", "ignore").decode()
+    return "".join(c for c in text.lower() if c.isalnum())
+
+
+def header_fields(headers):
+    """Campo de PedidoCrucero de cada columna (None = se ignora)."""
+    return [_ALIASES.get(_norm(h)) for h in headers]
+
+
+def _date(value):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return value  # que lo rechace el serializer
+
+
+def read_rows(binary, overrides=None, encoding="utf-8-sig"):
+    """
+    Generador de (nº de línea, fila dict) a partir del fichero binario.
+    Las celdas vacías no se incluyen; `overrides` (campos del formulario)
+    manda sobre las columnas.
+    """
+    sample = binary.read(SNIFF_BYTES)
+    binary.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample.decode(encoding, errors="ignore"), delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+
+    text = io.TextIOWrapper(binary, encoding=encoding, newline="")
+    reader = csv.reader(text, dialect)
+    try:
+        headers = next(reader, None)
+    except UnicodeDecodeError:
+        raise ManifestError(f"El fichero no está en {encoding}.")
+    if not headers:
+        raise ManifestError("El fichero está vacío.")
+    fields = header_fields(headers)
+    overrides = {k: v for k, v in (overrides or {}).items() if v not in (None, "")}
+    missing = [f for f in REQUIRED_FIELDS if f not in fields and f not in overrides]
+    if missing:
+        raise ManifestError(f"Faltan columnas: {', '.join(missing)}.")
+
+    try:
+        for cells in reader:
+            if not any(c.strip() for c in cells):
+                continue
+            row = {}
+            for field, cell in zip(fields, cells):
+                cell = cell.strip()
+                if field and cell:
+                    row[field] = cell
+            row.update(overrides)
+            if "service_date" in row:
+                row["service_date"] = _date(row["service_date"])
+            yield reader.line_num, row
+    except UnicodeDecodeError:
+        raise ManifestError(f"El fichero no está en {encoding} (línea {reader.line_num + 1}).")
+    finally:
+        text.detach()  # no cerrar el upload al soltar el wrapper
+
+
+def _chunks(iterable, size):
+    it = iter(iterable)
+    while chunk := list(itertools.islice(it, size)):
+        yield chunk
+
+
+def import_manifest(binary, meta, user, printing_dt, chunk_rows=None, encoding="utf-8-sig"):
+    """
+    Importa el CSV por trozos. Llamar dentro de transaction.atomic(): si hay
+    "errors" en el resultado, hay que deshacer (el llamador hace rollback).
+    Mismos contadores que CruceroBulkView.post + rows/chunks/errors.
+    """
+    totals = {
+        "created": 0, "overwritten": 0, "blocked": 0, "blocked_groups": [],
+        "created_pedidos": 0, "inserted": 0, "updated": 0, "unchanged": 0, "removed": 0,
+        "rows": 0, "chunks": 0, "errors": [],
+    }
+    overrides = {k: meta.get(k) for k in META_FIELDS}
+    empresa_id = meta.get("empresa")
+    seen = {}
+
+    for chunk in _chunks(read_rows(binary, overrides, encoding), chunk_rows or CHUNK_ROWS):
+        totals["rows"] += len(chunk)
+        totals["chunks"] += 1
+        ser = PedidoCruceroSerializer(data=[row for _, row in chunk], many=True)
+        if not ser.is_valid():
+            for (line, _), errors in zip(chunk, ser.errors):
+                if errors and len(totals["errors"]) < MAX_ERRORS:
+                    totals["errors"].append({"line": line, "errors": errors})
+        if totals["errors"]:
+            continue  # se sigue leyendo solo para informar de más errores
+
+        merge = merge_groups(group_rows(ser.validated_data), printing_dt=printing_dt, seen=seen)
+        for key in ("created", "overwritten", "blocked", "inserted", "updated", "unchanged", "removed"):
+            totals[key] += merge[key]
+        totals["blocked_groups"].extend(
+            g for g in merge["blocked_groups"] if g not in totals["blocked_groups"]
+        )
+        if empresa_id:
+            totals["created_pedidos"] += create_pedidos(
+                merge["applied"], empresa_id, user, printing_dt,
+                estado=meta.get("estado_pedido") or "pagado",
+            )
+
+    if not totals["errors"]:
+        totals["removed"] += remove_unseen(seen)
+    return totals
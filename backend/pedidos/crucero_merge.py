@@ -0,0 +1,294 @@
+# backend/pedidos/crucero_merge.py
+"""
+Motor de merge para manifiestos de crucero.
+
+En vez de borrar y reinsertar cada (service_date, ship), se compara lo que
+llega con lo que ya hay, fila a fila por la clave (service_date, ship, sign):
+
+- filas nuevas            -> bulk_create
+- filas con cambios       -> bulk_update (solo esas)
+- filas idénticas         -> no se tocan (mantienen id)
+- filas que ya no vienen  -> un DELETE por lotes de ids
+
+Regla preliminary/final (igual que antes): si llega un "preliminary" para un
+barco/día que ya tiene alguna fila "final", se bloquea el grupo entero.
+
+Debe llamarse dentro de transaction.atomic(). Invalida en caché solo los
+grupos (service_date, ship) que han cambiado de verdad.
+
+Subidas por trozos (CSV en streaming, crucero_csv.py): un grupo puede llegar
+repartido en varios trozos, así que merge_groups(..., seen=dict) no borra lo
+que falta; va anotando los signs aplicados por grupo (None = bloqueado) y al
+final remove_unseen(seen) borra lo que no ha venido en toda la subida.
+"""
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .cache import crucero_tags, invalidate, invalidation_batch, pedido_tags
+from .metrics import record_merge, record_pedidos
+from .models import Pedido, PedidoCrucero
+from .stats import record_created
+
+# Campos que se comparan para decidir si una fila ha cambiado.
+# printing_date no cuenta: cambia en cada subida.
+MERGE_FIELDS = (
+    "supplier",
+    "emergency_contact",
+    "excursion",
+    "language",
+    "pax",
+    "arrival_time",
+    "status",
+    "terminal",
+)
+BATCH_SIZE = 500
+
+
+def group_rows(rows_data):
+    """Agrupa filas validadas por (service_date, ship) conservando el orden."""
+    groups = {}
+    for r in rows_data:
+        groups.setdefault((r["service_date"], r["ship"]), []).append(r)
+    return groups
+
+
+# campos de meta que se aplican a todas las filas
+META_KEYS = ("service_date", "ship", "status", "terminal", "supplier", "emergency_contact")
+
+
+def normalize_payload(payload):
+    """
+    (rows, meta) del body de /cruceros/bulk/: {"rows": [...], "meta": {...}}
+    (lo que venga en meta manda sobre cada fila) o directamente una lista.
+    """
+    if isinstance(payload, dict) and "rows" in payload:
+        meta = payload.get("meta", {}) or {}
+        common = {k: meta[k] for k in META_KEYS if meta.get(k) not in (None, "")}
+        return [{**r, **common} for r in payload.get("rows", []) or []], meta
+    return (payload if isinstance(payload, list) else []), {}
+
+
+def _group_filter(groups):
+    # producto fechas × barcos (usa idx_ship_date); lo que sobra se descarta en memoria
+    return {"service_date__in": {k[0] for k in groups}, "ship__in": {k[1] for k in groups}}
+
+
+def _existing_by_group(groups, signs=None):
+    """
+    Una sola consulta para todas las filas existentes de todos los grupos
+    (con `signs`, solo las de esos signs).
+    """
+    existing = {key: [] for key in groups}
+    qs = PedidoCrucero.objects.select_for_update().filter(**_group_filter(groups)).order_by("id")
+    if signs is not None:
+        qs = qs.filter(sign__in=signs)
+    for obj in qs:
+        key = (obj.service_date, obj.ship)
+        if key in existing:
+            existing[key].append(obj)
+    return existing
+
+
+def merge_groups(groups, printing_dt=None, seen=None):
+    """
+    Aplica el merge de todos los grupos y devuelve contadores:
+
+        inserted / updated / unchanged / removed
+        created     -> filas aceptadas (signs distintos de los grupos aplicados)
+        overwritten -> filas que había en los grupos aplicados
+        blocked, blocked_groups
+        applied     -> [((service_date, ship), lote), ...] para post-procesar
+
+    Con `seen` ({(service_date, ship): {signs}}) es un trozo de una subida
+    más grande: no se borran las filas que no vienen (ver remove_unseen).
+    """
+    printing_dt = printing_dt or timezone.now()
+    result = {
+        "inserted": 0,
+        "updated": 0,
+        "unchanged": 0,
+        "removed": 0,
+        "created": 0,
+        "overwritten": 0,
+        "blocked": 0,
+        "blocked_groups": [],
+        "applied": [],
+    }
+    if not groups:
+        return result
+
+    if seen is None:
+        existing = _existing_by_group(groups)
+        first = {key: (len(rows), any((o.status or "").lower() == "final" for o in rows))
+                 for key, rows in existing.items()}
+    else:
+        # por trozos: solo las filas que casan con lo que llega (leer el grupo
+        # entero en cada trozo sería cuadrático); el estado del grupo se mira
+        # una vez, la primera vez que aparece
+        existing = _existing_by_group(groups, signs={r["sign"] for lote in groups.values() for r in lote})
+        first = _group_status([key for key in groups if key not in seen])
+    to_create, to_update, to_delete = [], [], []
+    touched = set()
+
+    for (service_date, ship), lote in groups.items():
+        key = (service_date, ship)
+        current = existing[key]
+        new_status = (lote[0]["status"] or "").lower()
+        if key in first:
+            before, final_exists = first[key]
+            blocked = new_status == "preliminary" and final_exists
+        else:
+            before, blocked = 0, seen[key] is None  # ya decidido en un trozo anterior
+        if blocked:
+            if seen is not None:
+                seen[key] = None
+            result["blocked"] += len(lote)
+            if key in first:
+                result["blocked_groups"].append({"service_date": service_date, "ship": ship})
+            continue
+
+        # si el mismo sign viene repetido en la subida, gana la última fila
+        incoming = {}
+        for r in lote:
+            incoming[r["sign"]] = r
+
+        result["overwritten"] += before
+        result["created"] += len(incoming)
+        result["applied"].append(((service_date, ship), list(incoming.values())))
+        pending = len(to_create) + len(to_update) + len(to_delete)
+
+        # por sign; duplicados antiguos del mismo sign se eliminan
+        by_sign = {}
+        for obj in current:
+            if obj.sign in by_sign:
+                to_delete.append(obj.pk)
+            else:
+                by_sign[obj.sign] = obj
+
+        for sign, r in incoming.items():
+            obj = by_sign.pop(sign, None)
+            if obj is None:
+                to_create.append(PedidoCrucero(**{**r, "printing_date": printing_dt}))
+                continue
+            changed = False
+            for field in MERGE_FIELDS:
+                if field in r and getattr(obj, field) != r[field]:
+                    setattr(obj, field, r[field])
+                    changed = True
+            if changed:
+                obj.printing_date = printing_dt
+                obj.updated_at = printing_dt
+                to_update.append(obj)
+            else:
+                result["unchanged"] += 1
+
+        if seen is None:
+            to_delete.extend(o.pk for o in by_sign.values())
+        else:
+            seen.setdefault(key, set()).update(incoming)
+        if len(to_create) + len(to_update) + len(to_delete) > pending:
+            touched.add((service_date, ship))
+
+    if to_create:
+        PedidoCrucero.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+    if to_update:
+        PedidoCrucero.objects.bulk_update(
+            to_update,
+            fields=[*MERGE_FIELDS, "printing_date", "updated_at"],
+            batch_size=BATCH_SIZE,
+        )
+    with invalidation_batch():
+        for i in range(0, len(to_delete), BATCH_SIZE):
+            PedidoCrucero.objects.filter(pk__in=to_delete[i:i + BATCH_SIZE]).delete()
+        for service_date, ship in touched:
+            invalidate(*crucero_tags(service_date, ship))
+
+    result["inserted"] = len(to_create)
+    result["updated"] = len(to_update)
+    result["removed"] = len(to_delete)
+    record_merge(result)
+    return result
+
+
+def _group_status(keys):
+    """{(service_date, ship): (nº de filas, hay alguna final)} para los grupos que existan."""
+    status = {key: (0, False) for key in keys}
+    if not keys:
+        return status
+    rows = (
+        PedidoCrucero.objects.filter(**_group_filter(keys))
+        .values_list("service_date", "ship")
+        .annotate(n=Count("id"), finals=Count("id", filter=Q(status__iexact="final")))
+        .order_by()
+    )
+    for service_date, ship, n, finals in rows:
+        if (service_date, ship) in status:
+            status[(service_date, ship)] = (n, finals > 0)
+    return status
+
+
+def remove_unseen(seen):
+    """
+    Cierre de una subida por trozos: borra de cada grupo aplicado las filas
+    cuyo sign no ha llegado en ningún trozo. Una consulta para leer (solo
+    id/grupo/sign) y DELETE por lotes. Devuelve cuántas se han borrado.
+    """
+    if not seen:
+        return 0
+    rows = (
+        PedidoCrucero.objects
+        .filter(service_date__in={k[0] for k in seen}, ship__in={k[1] for k in seen})
+        .values_list("pk", "service_date", "ship", "sign")
+    )
+    to_delete, touched = [], set()
+    for pk, service_date, ship, sign in rows.iterator(chunk_size=BATCH_SIZE):
+        signs = seen.get((service_date, ship))
+        if signs is not None and sign not in signs:
+            to_delete.append(pk)
+            touched.add((service_date, ship))
+    with invalidation_batch():
+        for i in range(0, len(to_delete), BATCH_SIZE):
+            PedidoCrucero.objects.filter(pk__in=to_delete[i:i + BATCH_SIZE]).delete()
+        for service_date, ship in touched:
+            invalidate(*crucero_tags(service_date, ship))
+    return len(to_delete)
+
+
+def create_pedidos(applied, empresa_id, user, printing_dt, estado="pagado"):
+    """
+    Un Pedido (tipo crucero) por fila de los grupos aplicados, con
+    bulk_create. Devuelve cuántos se han creado.
+    """
+    ped_objs = []
+    for (service_date, ship), lote in applied:
+        for r in lote:
+            ped_objs.append(Pedido(
+                empresa_id=empresa_id,
+                user=user,
+                excursion=r.get("excursion") or "",
+                estado=estado,
+                # ¡Eliminados: lugar_entrega, lugar_recogida, emisores!
+                fecha_inicio=service_date,
+                fecha_fin=None,
+                pax=r.get("pax") or 0,
+                bono=r.get("sign") or "",
+                guia="",
+                tipo_servicio="crucero",
+                notas="; ".join(
+                    x for x in [
+                        f"Barco: {ship}",
+                        f"Idioma: {r.get('language') or ''}",
+                        f"Hora: {r.get('arrival_time') or ''}",
+                        f"Proveedor: {lote[0].get('supplier') or ''}",
+                        f"Terminal: {lote[0].get('terminal') or ''}",
+                        f"Impresión: {printing_dt.isoformat(timespec='minutes')}",
+                    ] if x and not x.endswith(': ')
+                ),
+            ))
+
+    if ped_objs:
+        Pedido.objects.bulk_create(ped_objs)
+        invalidate(*pedido_tags(empresa_id, user.pk))
+        record_created(ped_objs)
+        record_pedidos("crucero", len(ped_objs))
+    return len(ped_objs)
@@ -0,0 +1,131 @@
+# backend/pedidos/exports.py
+"""
+Exportación en streaming (CSV / NDJSON) para listados grandes.
+
+Se leen las filas con values_list().iterator(chunk_size=...) — sin instanciar
+modelos ni serializers — y se van escribiendo por bloques en un
+StreamingHttpResponse, así la memoria del worker no crece con el nº de filas.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime, time
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+EXPORT_QUERY_PARAM = "export"
+EXPORT_FORMATS = ("csv", "ndjson")
+EXPORT_CHUNK_SIZE = 2000
+
+# (cabecera, lookup ORM) — mismas claves que los serializers de lectura
+CRUCERO_EXPORT_COLUMNS = [
+    ("id", "id"),
+    ("printing_date", "printing_date"),
+    ("supplier", "supplier"),
+    ("emergency_contact", "emergency_contact"),
+    ("service_date", "service_date"),
+    ("ship", "ship"),
+    ("sign", "sign"),
+    ("excursion", "excursion"),
+    ("language", "language"),
+    ("pax", "pax"),
+    ("arrival_time", "arrival_time"),
+    ("status", "status"),
+    ("terminal", "terminal"),
+    ("uploaded_at", "uploaded_at"),
+    ("updated_at", "updated_at"),
+]
+
+PEDIDO_OPS_EXPORT_COLUMNS = [
+    ("id", "id"),
+    ("empresa", "empresa_id"),
+    ("excursion", "excursion"),
+    ("fecha_inicio", "fecha_inicio"),
+    ("fecha_fin", "fecha_fin"),
+    ("tipo_servicio", "tipo_servicio"),
+    ("estado", "estado"),
+    ("lugar_entrega", "lugar_entrega"),
+    ("lugar_recogida", "lugar_recogida"),
+    ("notas", "notas"),
+    ("bono", "bono"),
+    ("emisores", "emisores"),
+    ("pax", "pax"),
+    ("guia", "guia"),
+]
+
+
+def requested_format(request):
+    """
+    Devuelve "csv" / "ndjson" si la petición pide exportación (?export=...),
+    None si no. Formato desconocido → 400.
+    """
+    fmt = (request.query_params.get(EXPORT_QUERY_PARAM) or "").strip().lower()
+    if not fmt:
+        return None
+    if fmt not in EXPORT_FORMATS:
+        raise ValidationError({EXPORT_QUERY_PARAM: f"Formato no soportado. Usa: {', '.join(EXPORT_FORMATS)}."})
+    return fmt
+
+
+def _to_text(value):
+    # mismo formato que DRF: ISO 8601, UTC con "Z"
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        text = value.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    return value
+
+
+def _csv_chunks(headers, rows, batch):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(headers)
+    n = 0
+    for row in rows:
+        writer.writerow(["" if v is None else _to_text(v) for v in row])
+        n += 1
+        if n >= batch:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate(0)
+            n = 0
+    yield buf.getvalue()
+
+
+def _ndjson_chunks(headers, rows, batch):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(
+            dict(zip(headers, (_to_text(v) for v in row))),
+            ensure_ascii=False,
+        ))
+        if len(lines) >= batch:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def export_response(queryset, columns, fmt, filename, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    StreamingHttpResponse con el queryset ya filtrado/ordenado por la vista.
+    """
+    headers = [c[0] for c in columns]
+    lookups = [c[1] for c in columns]
+    rows = queryset.values_list(*lookups).iterator(chunk_size=chunk_size)
+
+    if fmt == "csv":
+        chunks = _csv_chunks(headers, rows, chunk_size)
+        content_type = "text/csv; charset=utf-8"
+    else:
+        chunks = _ndjson_chunks(headers, rows, chunk_size)
+        content_type = "application/x-ndjson; charset=utf-8"
+
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    return response
@@ -0,0 +1,274 @@
+# backend/pedidos/jobs.py
+"""
+Subidas de manifiesto en segundo plano (manage.py run_jobs).
+
+Un manifiesto de varios barcos por POST /cruceros/bulk/ valida, hace el merge
+de cada grupo y crea los Pedidos dentro de la petición: con lotes grandes se
+come el timeout de gunicorn y deja un worker web ocupado todo ese rato. Con
+?async=1 la vista solo guarda el lote normalizado en ManifestJob y contesta
+202 con el id; el resto lo hace este worker:
+
+1. claim()        pasa los pendientes más antiguos a running con un UPDATE
+                  condicional (si dos workers van a por el mismo, gana uno) y
+                  les pone dueño: un token "<worker>:<aleatorio>" y attempts+1
+2. process_job()  valida todas las filas (si alguna falla: failed con los
+                  errores por índice y no se toca nada), agrupa por
+                  (service_date, ship) y aplica grupo a grupo con el mismo
+                  merge_groups / create_pedidos que la vista
+3. progreso       cada grupo va en su transacción, junto con el UPDATE de
+                  groups_done y los contadores acumulados: GET /api/jobs/<id>/
+                  ve el avance y, si el worker se cae, el job se reanuda
+                  justo detrás del último grupo confirmado (requeue_stale)
+
+Propiedad: todos los UPDATE del job (progreso, final) filtran por el token
+del claim. Si ya no es suyo (se re-encoló y lo tiene otro worker) no casa
+ninguna fila: JobLost, la transacción del grupo se deshace y el worker lo
+suelta. create_pedidos no es idempotente, así que un grupo nunca se confirma
+dos veces.
+
+Latido: mientras un worker tiene un job, un hilo (Heartbeat) mueve updated_at
+cada HEARTBEAT_EVERY, también durante la validación o un grupo enorme.
+requeue_stale solo devuelve a la cola los running sin latido en STALE_AFTER
+(el worker que los tenía ya no está) y nunca los del propio worker que lo
+llama. Tras MAX_ATTEMPTS claims se da por fallido (un lote que tumba al
+worker no se reintenta para siempre).
+
+A diferencia de la vista síncrona no es todo-o-nada: si un grupo revienta, los
+anteriores quedan aplicados (groups_done dice cuántos). Los grupos son
+independientes (la regla preliminary/final es por grupo), así que no queda
+ningún grupo a medias.
+
+El pool de hilos (--threads) procesa varios jobs a la vez; cada hilo usa su
+propia conexión y la cierra al acabar el job. En SQLite se queda en un hilo y
+sin hilo de latido: solo admite un escritor y la transacción que lee y luego
+escribe falla al momento con "database is locked" en vez de esperar (ahí el
+único worker no re-encola lo suyo, que es lo que importa).
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.db import DatabaseError, close_old_connections, connection, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .crucero_merge import create_pedidos, group_rows, merge_groups
+from .models import ManifestJob
+from .serializers import PedidoCruceroSerializer
+
+log = logging.getLogger(__name__)
+
+# un running sin latido en este tiempo se da por muerto y vuelve a la cola
+STALE_AFTER = timedelta(minutes=10)
+HEARTBEAT_EVERY = timedelta(seconds=30)
+MAX_ATTEMPTS = 3
+MAX_ERRORS = 50
+COUNTERS = ("created", "overwritten", "blocked", "inserted", "updated", "unchanged", "removed")
+
+
+class JobLost(Exception):
+    """El job ya no es de este claim (re-encolado y reclamado por otro worker)."""
+
+
+def empty_result():
+    return {**dict.fromkeys(COUNTERS, 0), "blocked_groups": [], "created_pedidos": 0}
+
+
+def _owned(pk, owner):
+    return ManifestJob.objects.filter(pk=pk, owner=owner, status=ManifestJob.RUNNING)
+
+
+def _update(pk, owner, **fields):
+    """UPDATE del job solo si sigue siendo nuestro; si no, JobLost."""
+    if not _owned(pk, owner).update(updated_at=timezone.now(), **fields):
+        raise JobLost(pk)
+
+
+def _finish(pk, owner, status, **fields):
+    _update(pk, owner, status=status, finished_at=timezone.now(), **fields)
+
+
+# ---------------------------------------------------------
+# Cola
+# ---------------------------------------------------------
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def claim(limit, worker=""):
+    """
+    Pasa a running hasta `limit` pendientes (los más antiguos).
+    Devuelve [(id, owner)]: owner es el token que hay que pasar a process_job.
+    """
+    if limit <= 0:
+        return []
+    ids = list(
+        ManifestJob.objects.filter(status=ManifestJob.PENDING)
+        .order_by("created_at", "id")
+        .values_list("id", flat=True)[:limit]
+    )
+    now = timezone.now()
+    claimed = []
+    for pk in ids:
+        owner = f"{worker}:{uuid.uuid4().hex[:12]}"
+        if ManifestJob.objects.filter(pk=pk, status=ManifestJob.PENDING).update(
+            status=ManifestJob.RUNNING, owner=owner, attempts=F("attempts") + 1,
+            started_at=now, updated_at=now,
+        ):
+            claimed.append((pk, owner))
+    return claimed
+
+
+def requeue_stale(now=None, worker=None):
+    """
+    Devuelve a la cola los running sin latido desde hace STALE_AFTER (menos
+    los de `worker`, que sigue vivo: es quien llama). Los que ya llevan
+    MAX_ATTEMPTS claims pasan a failed. Devuelve cuántos se re-encolan.
+    """
+    now = now or timezone.now()
+    stale = ManifestJob.objects.filter(status=ManifestJob.RUNNING, updated_at__lt=now - STALE_AFTER)
+    if worker:
+        stale = stale.exclude(owner__startswith=f"{worker}:")
+    stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status=ManifestJob.FAILED, owner="", finished_at=now, updated_at=now,
+        errors=[{"detail": f"El worker se cayó {MAX_ATTEMPTS} veces con este job"}],
+    )
+    return stale.update(status=ManifestJob.PENDING, owner="", updated_at=now)
+
+
+class Heartbeat:
+    """
+    with Heartbeat(pk, owner): mueve updated_at del job cada HEARTBEAT_EVERY
+    desde un hilo aparte (con su conexión) mientras dure el bloque. Si el job
+    deja de ser suyo, para (el siguiente UPDATE del proceso da JobLost).
+    """
+
+    def __init__(self, pk, owner, every=HEARTBEAT_EVERY):
+        self.pk, self.owner = pk, owner
+        self.every = every.total_seconds()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _beat(self):
+        try:
+            while not self._stop.wait(self.every):
+                try:
+                    if not _owned(self.pk, self.owner).update(updated_at=timezone.now()):
+                        return
+                except DatabaseError:
+                    log.warning("Latido del job %s fallido", self.pk, exc_info=True)
+        finally:
+            connections.close_all()  # solo las de este hilo
+
+    def __enter__(self):
+        if connection.vendor != "sqlite":
+            self._thread = threading.Thread(target=self._beat, name=f"job-{self.pk}-latido", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+# ---------------------------------------------------------
+# Proceso de un job
+# ---------------------------------------------------------
+
+def process_job(pk, owner):
+    """Procesa (o reanuda) el job `pk`, que debe estar en running con este `owner`."""
+    job = ManifestJob.objects.select_related("user").filter(pk=pk, owner=owner).first()
+    if job is None:
+        raise JobLost(pk)
+    printing_dt = job.created_at  # = momento de la subida, como en la vista
+    meta = job.payload.get("meta") or {}
+    rows = [
+        {**r, "printing_date": printing_dt} if isinstance(r, dict) else r
+        for r in job.payload.get("rows") or []
+    ]
+
+    ser = PedidoCruceroSerializer(data=rows, many=True)
+    if not ser.is_valid():
+        errors = [{"index": i, "errors": e} for i, e in enumerate(ser.errors) if e]
+        _finish(pk, owner, ManifestJob.FAILED, errors=errors[:MAX_ERRORS])
+        return
+
+    groups = list(group_rows(ser.validated_data).items())
+    _update(pk, owner, groups_total=len(groups))
+
+    result = job.result or empty_result()  # al reanudar, lo ya acumulado
+    empresa_id = meta.get("empresa")
+    for done, (key, lote) in enumerate(groups[job.groups_done:], start=job.groups_done + 1):
+        with transaction.atomic():
+            merge = merge_groups({key: lote}, printing_dt=printing_dt)
+            for counter in COUNTERS:
+                result[counter] += merge[counter]
+            result["blocked_groups"] += merge["blocked_groups"]
+            if empresa_id:
+                result["created_pedidos"] += create_pedidos(
+                    merge["applied"], empresa_id, job.user, printing_dt,
+                    estado=meta.get("estado_pedido") or "pagado",
+                )
+            # si ya no es nuestro, JobLost deshace el grupo entero
+            _update(pk, owner, groups_done=done, result=result)
+
+    # hecho: el lote ya no hace falta para reanudar
+    _finish(pk, owner, ManifestJob.DONE, result=result, payload={})
+
+
+# ---------------------------------------------------------
+# Worker
+# ---------------------------------------------------------
+
+class JobWorker:
+    def __init__(self, threads=4, poll_interval=2.0):
+        if connection.vendor == "sqlite" and threads > 1:
+            log.warning("SQLite: el worker de jobs va con 1 hilo (un solo escritor)")
+            threads = 1
+        self.threads = max(threads, 1)
+        self.poll_interval = poll_interval
+        self.worker = worker_id()
+
+    def _run(self, pk, owner):
+        try:
+            with Heartbeat(pk, owner):
+                process_job(pk, owner)
+        except JobLost:
+            log.warning("Job %s: lo tiene otro worker, se suelta", pk)
+        except Exception as e:
+            log.exception("Job %s fallido", pk)
+            try:
+                _finish(pk, owner, ManifestJob.FAILED, errors=[{"detail": str(e)}])
+            except JobLost:
+                pass
+        finally:
+            connections.close_all()  # solo las de este hilo
+
+    def run(self, once=False, sleep=time.sleep):
+        """
+        Bucle del worker. Con once=True procesa lo que haya en cola y sale.
+        Devuelve cuántos jobs ha terminado.
+        """
+        finished_total = 0
+        running = set()
+        with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="job") as pool:
+            while True:
+                close_old_connections()
+                requeue_stale(worker=self.worker)
+                for pk, owner in claim(self.threads - len(running), self.worker):
+                    log.info("Job %s en curso", pk)
+                    running.add(pool.submit(self._run, pk, owner))
+                if not running:
+                    if once:
+                        return finished_total
+                    sleep(self.poll_interval)
+                    continue
+                finished, running = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                finished_total += len(finished)
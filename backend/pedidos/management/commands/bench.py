@@ -0,0 +1,80 @@
+# backend/pedidos/management/commands/bench.py
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, teardown_databases
+
+from pedidos.benchmarks import (
+    BENCHMARKS,
+    compare_results,
+    load_baseline,
+    run_benchmarks,
+    save_baseline,
+)
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / "benchmarks" / "baseline.json"
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmarks de los caminos calientes sobre datasets generados "
+        "(por defecto 1k/10k/100k filas) en una BD de test desechable. "
+        "Compara con el baseline JSON y falla si algo empeora más del umbral."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 100000])
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), default=None)
+        parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+        parser.add_argument(
+            "--threshold", type=float, default=20.0,
+            help="%% de empeoramiento permitido respecto al baseline (default 20).",
+        )
+        parser.add_argument(
+            "--min-delta-ms", type=float, default=5.0,
+            help="Diferencia absoluta mínima para contar como regresión (ruido).",
+        )
+        parser.add_argument("--save-baseline", action="store_true", help="Guarda los resultados como nuevo baseline.")
+        parser.add_argument("--output", type=Path, default=None, help="Guarda también los resultados en este JSON.")
+
+    def handle(self, *args, **opts):
+        # BD de test aislada: nunca toca la BD real
+        old_config = setup_databases(verbosity=0, interactive=False, serialized_aliases=[])
+        try:
+            current = run_benchmarks(
+                opts["sizes"],
+                repeat=opts["repeat"],
+                only=opts["only"],
+                log=self.stdout.write,
+            )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        if opts["output"]:
+            save_baseline(opts["output"], current)
+
+        if opts["save_baseline"]:
+            save_baseline(opts["baseline"], current)
+            self.stdout.write(self.style.SUCCESS(f"Baseline guardado en {opts['baseline']}"))
+            return
+
+        baseline = load_baseline(opts["baseline"])
+        if baseline is None:
+            self.stdout.write(self.style.WARNING(
+                f"No hay baseline en {opts['baseline']} (usa --save-baseline)."
+            ))
+            return
+
+        regressions = compare_results(
+            current, baseline, opts["threshold"], min_delta_ms=opts["min_delta_ms"]
+        )
+        if regressions:
+            for r in regressions:
+                self.stderr.write(
+                    f"REGRESIÓN {r['benchmark']}: {r['baseline'] * 1000:.1f} ms -> "
+                    f"{r['current'] * 1000:.1f} ms (+{r['pct']}%)"
+                )
+            raise CommandError(f"{len(regressions)} benchmark(s) por encima del umbral de {opts['threshold']}%.")
+        self.stdout.write(self.style.SUCCESS("Sin regresiones respecto al baseline."))
@@ -0,0 +1,33 @@
+# backend/pedidos/management/commands/dispatch_reminders.py
+from django.core.management.base import BaseCommand
+
+from pedidos.reminders import ReminderDispatcher, get_notifier
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker que avisa de los recordatorios al vencer (heap en memoria por "
+        "due_at; lee solo los cambios cada --poll-interval segundos). Con --once "
+        "avisa de lo ya vencido y termina (para cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poll-interval", type=float, default=5.0,
+                            help="Segundos entre lecturas de cambios (default 5)")
+        parser.add_argument("--batch-size", type=int, default=200,
+                            help="Recordatorios por lote de aviso/UPDATE (default 200)")
+        parser.add_argument("--notifier", help="Ruta de la clase notificadora (default settings.REMINDER_NOTIFIER)")
+        parser.add_argument("--once", action="store_true", help="Una pasada y salir")
+
+    def handle(self, *args, **opts):
+        dispatcher = ReminderDispatcher(
+            notifier=get_notifier(opts["notifier"]),
+            poll_interval=opts["poll_interval"],
+            batch_size=opts["batch_size"],
+        )
+        try:
+            fired = dispatcher.run(once=opts["once"])
+        except KeyboardInterrupt:
+            self.stdout.write("Detenido.")
+            return
+        self.stdout.write(self.style.SUCCESS(f"{fired} recordatorios avisados."))
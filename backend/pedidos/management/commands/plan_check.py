@@ -0,0 +1,40 @@
+# backend/pedidos/management/commands/plan_check.py
+from django.core.management.base import BaseCommand, CommandError
+
+from pedidos.plan_checks import analyze, api_plan_cases, explain, plan_problems, sample_actors
+
+
+class Command(BaseCommand):
+    help = (
+        "Lanza EXPLAIN de cada combinación de filtros de /api/ops/pedidos/ y "
+        "/api/reminders/ contra la BD actual (con datos: seed_load o producción) "
+        "y falla si alguna cae en full scan o sort aparte."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--no-analyze", action="store_true",
+                            help="No lanzar ANALYZE antes (estadísticas ya frescas).")
+        parser.add_argument("--verbose-plans", action="store_true",
+                            help="Imprime el plan completo de cada consulta.")
+
+    def handle(self, *args, **opts):
+        staff, user, empresa_id = sample_actors()
+        if not staff or not user:
+            raise CommandError("Hacen falta un usuario staff y un usuario normal con pedidos.")
+        if not opts["no_analyze"]:
+            analyze()
+
+        failures = 0
+        for label, queryset, allow_sort in api_plan_cases(staff, user, empresa_id):
+            problems = plan_problems(queryset, allow_sort=allow_sort)
+            if problems:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f"FAIL {label}: {'; '.join(problems)}"))
+            else:
+                self.stdout.write(f"ok   {label}")
+            if opts["verbose_plans"] or problems:
+                self.stdout.write("       " + explain(queryset).replace("\n", "\n       "))
+
+        if failures:
+            raise CommandError(f"{failures} consultas con plan degradado.")
+        self.stdout.write(self.style.SUCCESS("Todos los planes usan índice y sin sort."))
@@ -0,0 +1,31 @@
+# backend/pedidos/management/commands/rebuild_daily_summary.py
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pedidos.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Regenera PedidoDailySummary desde Pedido (reparación). Sin fechas, "
+        "la tabla entera; con --desde/--hasta, solo ese rango de fecha_inicio."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", help="YYYY-MM-DD (incluido)")
+        parser.add_argument("--hasta", help="YYYY-MM-DD (incluido)")
+
+    def handle(self, *args, **opts):
+        try:
+            desde = date.fromisoformat(opts["desde"]) if opts["desde"] else None
+            hasta = date.fromisoformat(opts["hasta"]) if opts["hasta"] else None
+        except ValueError as e:
+            raise CommandError(f"Fecha inválida: {e}")
+
+        t0 = time.perf_counter()
+        n = rebuild(desde=desde, hasta=hasta)
+        self.stdout.write(self.style.SUCCESS(
+            f"{n} filas de resumen regeneradas en {time.perf_counter() - t0:.1f}s."
+        ))
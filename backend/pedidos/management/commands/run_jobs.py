@@ -0,0 +1,28 @@
+# backend/pedidos/management/commands/run_jobs.py
+from django.core.management.base import BaseCommand
+
+from pedidos.jobs import JobWorker
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker de subidas de manifiesto en segundo plano (POST "
+        "/cruceros/bulk/?async=1). Procesa --threads jobs a la vez y mira la "
+        "cola cada --poll-interval segundos. Con --once vacía la cola y termina."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=4,
+                            help="Jobs en paralelo (default 4)")
+        parser.add_argument("--poll-interval", type=float, default=2.0,
+                            help="Segundos entre lecturas de la cola (default 2)")
+        parser.add_argument("--once", action="store_true", help="Vaciar la cola y salir")
+
+    def handle(self, *args, **opts):
+        worker = JobWorker(threads=opts["threads"], poll_interval=opts["poll_interval"])
+        try:
+            finished = worker.run(once=opts["once"])
+        except KeyboardInterrupt:
+            self.stdout.write("Detenido.")
+            return
+        self.stdout.write(self.style.SUCCESS(f"{finished} jobs terminados."))
@@ -0,0 +1,60 @@
+# backend/pedidos/management/commands/seed_load.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from pedidos.seeding import Seeder
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera datos realistas a escala de producción (determinista por --seed) "
+        "con bulk_create por bloques. Ej.: "
+        "manage.py seed_load --pedidos 2000000 --cruceros 2500000 --reminders 500000 --clear"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--empresas", type=int, default=40)
+        parser.add_argument("--users", type=int, default=400)
+        parser.add_argument("--pedidos", type=int, default=100000)
+        parser.add_argument("--events-per-pedido", type=float, default=4.0,
+                            help="Media de eventos de historial por pedido (cola larga).")
+        parser.add_argument("--cruceros", type=int, default=100000)
+        parser.add_argument("--reminders", type=int, default=20000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--chunk", type=int, default=5000)
+        parser.add_argument("--start", default="2025-01-01", help="Inicio de temporada (YYYY-MM-DD).")
+        parser.add_argument("--days", type=int, default=365, help="Duración de la temporada en días.")
+        parser.add_argument("--clear", action="store_true",
+                            help="Borra antes lo sembrado (tenants/usuarios seed y sus datos); "
+                                 "el resto de la BD no se toca.")
+
+    def handle(self, *args, **opts):
+        from datetime import date
+
+        if opts["clear"]:
+            Seeder.clear()
+            self.stdout.write("Datos sembrados borrados.")
+
+        seeder = Seeder(
+            seed=opts["seed"],
+            chunk_size=opts["chunk"],
+            start=date.fromisoformat(opts["start"]),
+            days=opts["days"],
+            log=(lambda msg: self.stdout.write(msg)) if opts["verbosity"] > 1 else None,
+        )
+        t0 = time.perf_counter()
+        counts = seeder.run(
+            empresas=opts["empresas"],
+            users=opts["users"],
+            pedidos=opts["pedidos"],
+            events_per_pedido=opts["events_per_pedido"],
+            cruceros=opts["cruceros"],
+            reminders=opts["reminders"],
+        )
+        elapsed = time.perf_counter() - t0
+        total = sum(counts.values())
+        resumen = ", ".join(f"{k}={v}" for k, v in counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"{resumen} -> {total} filas en {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} filas/s)"
+        ))
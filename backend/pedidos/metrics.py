@@ -0,0 +1,163 @@
+# backend/pedidos/metrics.py
+"""
+Métricas Prometheus (GET /metrics).
+
+- http_request_duration_seconds{view, status}   latencia por vista y acción
+- http_request_db_queries{view}                 queries por petición
+- crucero_rows_total{result}                    filas de manifiesto aceptadas
+                                                (created), que había en los
+                                                grupos pisados (overwritten)
+                                                y bloqueadas (blocked)
+- pedidos_created_total{source}                 Pedidos de un manifiesto
+                                                (crucero) o de /pedidos/bulk/
+
+Las queries se cuentan con un execute_wrapper propio (un contador en un
+ContextVar), sin encender la medición de Server-Timing (pedidos/timing.py):
+fuera de su muestra, una petición no pasa por sus ganchos.
+
+`view` es "<basename>:<acción>" en los ViewSets (pedido-ops:list,
+pedido-ops:delivered) y "<url_name>:<método>" en el resto (crucero-bulk:post).
+Los contadores de ingesta se suman en on_commit: una subida que se deshace
+(CSV con errores, transacción que revienta) no cuenta.
+
+Multiproceso: con gunicorn cada worker es un proceso con sus propios
+contadores. Con PROMETHEUS_MULTIPROC_DIR (lo pone start.sh) prometheus_client
+escribe los valores en ficheros de ese directorio y /metrics los agrega todos
+(MultiProcessCollector). gunicorn.conf.py avisa cuando muere un worker. La
+variable tiene que estar antes de importar prometheus_client, por eso va en el
+entorno y no en settings.
+
+Sin METRICS_TOKEN el endpoint no se sirve (404): los datos de tráfico e
+ingesta no quedan abiertos por olvidar la variable en producción.
+"""
+import hmac
+import os
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotFound
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Latencia de la petición por vista/acción",
+    ["view", "status"], buckets=LATENCY_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "Queries a la BD por petición",
+    ["view"], buckets=QUERY_BUCKETS,
+)
+CRUCERO_ROWS = Counter(
+    "crucero_rows", "Filas de manifiesto de crucero por resultado", ["result"],
+)
+PEDIDOS_CREATED = Counter(
+    "pedidos_created", "Pedidos creados en altas masivas", ["source"],
+)
+
+
+# ---------------------------------------------------------
+# Queries por petición
+# ---------------------------------------------------------
+
+_queries = ContextVar("metrics_queries", default=None)
+
+
+def _count_query(execute, sql, params, many, context):
+    counter = _queries.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def _hook_connection(connection, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+connection_created.connect(_hook_connection)
+
+
+def start_counting():
+    """Cuenta las queries del contexto actual. Devuelve (contador, token para stop_counting)."""
+    # conexiones abiertas antes de importar este módulo (o en otro hilo)
+    for connection in connections.all(initialized_only=True):
+        _hook_connection(connection)
+    counter = [0]  # lista: sync_to_async copia el contexto, no el entero
+    return counter, _queries.set(counter)
+
+
+def stop_counting(token):
+    _queries.reset(token)
+
+
+# ---------------------------------------------------------
+# Peticiones
+# ---------------------------------------------------------
+
+def view_label(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    method = request.method.lower()
+    actions = getattr(match.func, "actions", None)
+    if actions:  # ViewSet del router
+        basename = match.func.initkwargs.get("basename") or match.url_name
+        return f"{basename}:{actions.get(method, method)}"
+    return f"{match.url_name or match.view_name}:{method}"
+
+
+def observe_request(request, response, seconds, queries):
+    view = view_label(request)
+    REQUEST_LATENCY.labels(view, f"{response.status_code // 100}xx").observe(seconds)
+    REQUEST_QUERIES.labels(view).observe(queries)
+
+
+# ---------------------------------------------------------
+# Ingesta (al confirmar la transacción)
+# ---------------------------------------------------------
+
+def record_merge(merge):
+    """Contadores de merge_groups (created / overwritten / blocked)."""
+    counts = {key: merge[key] for key in ("created", "overwritten", "blocked") if merge[key]}
+    if counts:
+        transaction.on_commit(lambda: [CRUCERO_ROWS.labels(k).inc(v) for k, v in counts.items()])
+
+
+def record_pedidos(source, n):
+    if n:
+        transaction.on_commit(lambda: PEDIDOS_CREATED.labels(source).inc(n))
+
+
+# ---------------------------------------------------------
+# Endpoint
+# ---------------------------------------------------------
+
+def registry():
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        collected = CollectorRegistry()
+        multiprocess.MultiProcessCollector(collected)
+        return collected
+    return REGISTRY
+
+
+def metrics_view(request):
+    """GET /metrics con Authorization: Bearer <METRICS_TOKEN>; sin token configurado, 404."""
+    token = settings.METRICS_TOKEN
+    if not token:
+        return HttpResponseNotFound()
+    sent = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    if not hmac.compare_digest(sent, token):
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(registry()), content_type=CONTENT_TYPE_LATEST)
@@ -1,9 +1,117 @@
 # backend/pedidos/middleware.py
+import random
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
 from django.utils.deprecation import MiddlewareMixin
 
+from . import timing
+from .metrics import observe_request, start_counting, stop_counting
+
+
 class FeedbackMiddleware(MiddlewareMixin):
     def process_response(self, request, response):
         if hasattr(request, "_feedback"):
             response.data = response.data or {}
             response.data["feedback"] = request._feedback
         return response
+
+
+class _AroundMiddleware:
+    """
+    Base para middlewares que envuelven la petición entera, igual con WSGI que
+    con ASGI (sin pasar a un hilo): begin() antes, end() siempre al salir
+    (también con excepción) y after() con la respuesta.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def begin(self, request):
+        return None
+
+    def end(self, state):
+        pass
+
+    def after(self, request, response, state):
+        return response
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state = self.begin(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.end(state)
+        return self.after(request, response, state)
+
+    async def __acall__(self, request):
+        state = self.begin(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.end(state)
+        return self.after(request, response, state)
+
+
+class ServerTimingMiddleware(_AroundMiddleware):
+    """
+    Server-Timing con BD (tiempo y nº de queries), auth, serialización, render
+    y total, en una muestra de SERVER_TIMING_SAMPLE_RATE de las peticiones
+    (ver pedidos/timing.py). Con 0 no se carga. Va el primero en MIDDLEWARE
+    para que "total" lo cubra todo.
+    """
+
+    def __init__(self, get_response):
+        self.sample_rate = settings.SERVER_TIMING_SAMPLE_RATE
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+        timing.install()
+        super().__init__(get_response)
+
+    def begin(self, request):
+        if self.sample_rate >= 1 or random.random() < self.sample_rate:
+            return timing.start()
+        return None
+
+    def end(self, state):
+        if state is not None:
+            timing.stop(state[1])
+
+    def after(self, request, response, state):
+        if state is not None:
+            response["Server-Timing"] = state[0].header()
+        return response
+
+    def process_template_response(self, request, response):
+        # el primero de MIDDLEWARE es el último aquí: justo antes de render()
+        timing.start_render(response)
+        return response
+
+
+class MetricsMiddleware(_AroundMiddleware):
+    """
+    Latencia y nº de queries por vista para /metrics (pedidos/metrics.py).
+    Las queries van con su propio contador: no enciende Server-Timing.
+    """
+
+    def begin(self, request):
+        counter, token = start_counting()
+        return counter, token, perf_counter()
+
+    def end(self, state):
+        stop_counting(state[1])
+
+    def after(self, request, response, state):
+        counter, _, t0 = state
+        if getattr(request.resolver_match, "url_name", None) != "metrics":
+            observe_request(request, response, perf_counter() - t0, counter[0])
+        return response
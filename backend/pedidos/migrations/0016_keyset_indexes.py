@@ -0,0 +1,25 @@
+# Generated by Django 5.2.2 on 2026-10-17 23:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0015_reminder'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['-fecha_creacion', '-id'], name='idx_pedido_creacion'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['user', '-fecha_creacion', '-id'], name='idx_pedido_user_creacion'),
+        ),
+        migrations.AddIndex(
+            model_name='reminder',
+            index=models.Index(fields=['user', 'is_done', 'due_at', 'id'], name='idx_reminder_user_due'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.2 on 2026-10-17 23:26
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0016_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PedidoEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ts', models.DateTimeField(default=django.utils.timezone.now)),
+                ('event', models.CharField(max_length=50)),
+                ('user_label', models.CharField(blank=True, max_length=255)),
+                ('note', models.TextField(blank=True)),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='pedidos.pedido')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['ts', 'id'],
+                'indexes': [models.Index(fields=['pedido', 'ts'], name='idx_event_pedido_ts')],
+            },
+        ),
+    ]
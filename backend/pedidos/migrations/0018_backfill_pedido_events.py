@@ -0,0 +1,75 @@
+# pedidos/migrations/0018_backfill_pedido_events.py
+from django.db import migrations
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+BATCH = 1000
+
+
+def backfill_events(apps, schema_editor):
+    """
+    Copia Pedido.updates (lista JSON) a PedidoEvent por lotes de ids,
+    sin cargar la tabla entera. Cada lote se confirma por separado
+    (migración no atómica) para no mantener locks largos.
+
+    Idempotente: se saltan los pedidos que ya tienen eventos, así que si
+    falla a medias se puede volver a lanzar sin duplicar el historial de
+    los lotes ya confirmados.
+    """
+    Pedido = apps.get_model("pedidos", "Pedido")
+    PedidoEvent = apps.get_model("pedidos", "PedidoEvent")
+    User = apps.get_model("pedidos", "CustomUser")
+
+    already = PedidoEvent.objects.filter(pedido_id=OuterRef("pk"))
+    last_id = 0
+    while True:
+        batch = list(
+            Pedido.objects
+            .filter(~Exists(already), id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "updates", "fecha_creacion")[:BATCH]
+        )
+        if not batch:
+            break
+        last_id = batch[-1][0]
+
+        user_ids = {
+            e.get("user_id")
+            for _, updates, _ in batch
+            for e in (updates or [])
+            if isinstance(e, dict) and e.get("user_id")
+        }
+        existing_users = set(User.objects.filter(id__in=user_ids).values_list("id", flat=True))
+
+        events = []
+        for pedido_id, updates, creado in batch:
+            for e in updates or []:
+                if not isinstance(e, dict):
+                    continue
+                ts = parse_datetime(str(e.get("ts") or "")) or creado or timezone.now()
+                if timezone.is_naive(ts):
+                    ts = timezone.make_aware(ts)
+                user_id = e.get("user_id")
+                events.append(PedidoEvent(
+                    pedido_id=pedido_id,
+                    ts=ts,
+                    event=str(e.get("event") or "")[:50],
+                    user_id=user_id if user_id in existing_users else None,
+                    user_label=str(e.get("user") or "")[:255],
+                    note=str(e.get("note") or ""),
+                ))
+        if events:
+            PedidoEvent.objects.bulk_create(events, batch_size=BATCH)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("pedidos", "0017_pedidoevent"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_events, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# pedidos/migrations/0019_customuser_empresa_fk.py
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pedidos", "0018_backfill_pedido_events"),
+    ]
+
+    operations = [
+        # el texto libre se conserva como legacy para el backfill
+        migrations.RenameField(
+            model_name="customuser",
+            old_name="empresa",
+            new_name="empresa_nombre",
+        ),
+        migrations.AlterField(
+            model_name="customuser",
+            name="empresa_nombre",
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name="customuser",
+            name="empresa",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="usuarios",
+                to="pedidos.empresa",
+            ),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# pedidos/migrations/0020_backfill_customuser_empresa.py
+from django.db import migrations
+
+BATCH = 2000
+
+
+def backfill_empresa_fk(apps, schema_editor):
+    """
+    Resuelve CustomUser.empresa_nombre -> empresa_id por lotes de ids.
+    El mapa nombre -> id se carga una vez (Empresa es pequeña); si hay
+    nombres repetidos gana el id más bajo. Cada lote se confirma aparte
+    (migración no atómica) para no bloquear la tabla de usuarios.
+    """
+    Empresa = apps.get_model("pedidos", "Empresa")
+    User = apps.get_model("pedidos", "CustomUser")
+
+    por_nombre = {}
+    for pk, nombre in Empresa.objects.order_by("id").values_list("id", "nombre"):
+        por_nombre.setdefault((nombre or "").strip(), pk)
+
+    last_id = 0
+    while True:
+        batch = list(
+            User.objects
+            .filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "empresa_nombre", "empresa_id")[:BATCH]
+        )
+        if not batch:
+            break
+        last_id = batch[-1][0]
+
+        ids_por_empresa = {}
+        for user_id, nombre, actual in batch:
+            empresa_id = por_nombre.get((nombre or "").strip())
+            if empresa_id and actual is None:
+                ids_por_empresa.setdefault(empresa_id, []).append(user_id)
+
+        for empresa_id, user_ids in ids_por_empresa.items():
+            User.objects.filter(id__in=user_ids).update(empresa_id=empresa_id)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("pedidos", "0019_customuser_empresa_fk"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_empresa_fk, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.2 on 2026-10-17 23:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0020_backfill_customuser_empresa'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['empresa', '-fecha_creacion', '-id'], name='idx_pedido_empresa_creacion'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['estado', '-fecha_creacion', '-id'], name='idx_pedido_estado_creacion'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['tipo_servicio', '-fecha_creacion', '-id'], name='idx_pedido_tipo_creacion'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(condition=models.Q(('estado', 'recogido'), _negated=True), fields=['-fecha_creacion', '-id'], name='idx_pedido_activos'),
+        ),
+    ]
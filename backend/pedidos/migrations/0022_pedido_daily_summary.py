@@ -0,0 +1,31 @@
+# Generated by Django 5.2.2 on 2026-10-17 23:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0021_ops_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PedidoDailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('tipo_servicio', models.CharField(max_length=15)),
+                ('estado', models.CharField(max_length=20)),
+                ('pedidos', models.IntegerField(default=0)),
+                ('pax', models.IntegerField(default=0)),
+                ('emisores', models.IntegerField(default=0)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pedidos.empresa')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['empresa', 'dia'], name='idx_summary_empresa_dia')],
+                'constraints': [models.UniqueConstraint(fields=('dia', 'empresa', 'tipo_servicio', 'estado'), name='uniq_summary_dia_empresa')],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# pedidos/migrations/0023_populate_daily_summary.py
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+
+BATCH = 1000
+
+
+def populate_summary(apps, schema_editor):
+    """
+    Carga inicial del resumen diario: un GROUP BY sobre Pedido. A partir de
+    aquí lo mantienen los deltas de pedidos/stats.py.
+    """
+    Pedido = apps.get_model("pedidos", "Pedido")
+    Summary = apps.get_model("pedidos", "PedidoDailySummary")
+
+    rows = (
+        Pedido.objects.order_by()
+        .values("fecha_inicio", "empresa_id", "tipo_servicio", "estado")
+        .annotate(n=Count("id"), total_pax=Coalesce(Sum("pax"), 0), total_emisores=Coalesce(Sum("emisores"), 0))
+    )
+    batch = []
+    for r in rows.iterator(chunk_size=BATCH):
+        batch.append(Summary(
+            dia=r["fecha_inicio"],
+            empresa_id=r["empresa_id"],
+            tipo_servicio=r["tipo_servicio"],
+            estado=r["estado"],
+            pedidos=r["n"],
+            pax=r["total_pax"],
+            emisores=r["total_emisores"],
+        ))
+        if len(batch) >= BATCH:
+            Summary.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Summary.objects.bulk_create(batch)
+
+
+def clear_summary(apps, schema_editor):
+    apps.get_model("pedidos", "PedidoDailySummary").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pedidos", "0022_pedido_daily_summary"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_summary, clear_summary),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.2 on 2026-10-18 00:00
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0023_populate_daily_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='fecha_fin_efectiva',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Greatest(django.db.models.functions.comparison.Coalesce('fecha_fin', 'fecha_inicio'), 'fecha_inicio'), output_field=models.DateField()),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['fecha_fin_efectiva'], include=('fecha_inicio',), name='idx_pedido_solape'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# pedidos/migrations/0025_search_indexes.py
+from django.db import migrations
+
+
+def install_search(apps, schema_editor):
+    """FTS5 + triggers (SQLite) o índices GIN de tsvector (PostgreSQL); ver pedidos/search.py."""
+    from pedidos.search import install
+
+    install(schema_editor.connection)
+
+
+def uninstall_search(apps, schema_editor):
+    from pedidos.search import uninstall
+
+    uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pedidos", "0024_pedido_fecha_fin_efectiva"),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search, uninstall_search),
+    ]
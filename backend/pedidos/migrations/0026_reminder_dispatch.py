@@ -0,0 +1,31 @@
+# Generated by Django 5.2.2 on 2026-10-18 00:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0025_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reminder',
+            name='notified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='reminder',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='reminder',
+            index=models.Index(fields=['updated_at'], name='idx_reminder_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='reminder',
+            index=models.Index(condition=models.Q(('is_done', False), ('notified_at__isnull', True)), fields=['due_at'], name='idx_reminder_pending'),
+        ),
+    ]
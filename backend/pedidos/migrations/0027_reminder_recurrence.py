@@ -0,0 +1,34 @@
+# Generated by Django 5.2.2 on 2026-10-18 00:17
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0026_reminder_dispatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reminder',
+            name='recurrence',
+            field=models.CharField(blank=True, choices=[('diario', 'Diario'), ('semanal', 'Semanal'), ('laborables', 'Días laborables')], default='', max_length=12),
+        ),
+        migrations.AddField(
+            model_name='reminder',
+            name='recurrence_exceptions',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='reminder',
+            name='recurrence_interval',
+            field=models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='reminder',
+            name='recurrence_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
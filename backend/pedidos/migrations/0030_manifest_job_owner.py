@@ -0,0 +1,23 @@
+# Generated by Django 5.2.2 on 2026-10-18 01:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0029_user_token_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='manifestjob',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='manifestjob',
+            name='owner',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
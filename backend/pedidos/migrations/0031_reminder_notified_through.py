@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-18 01:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0030_manifest_job_owner'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reminder',
+            name='notified_through',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
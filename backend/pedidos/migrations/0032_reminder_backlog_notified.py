@@ -0,0 +1,34 @@
+# pedidos/migrations/0032_reminder_backlog_notified.py
+from django.db import migrations
+from django.db.models import F
+from django.utils import timezone
+
+
+def mark_past_as_notified(apps, schema_editor):
+    """
+    Los recordatorios que ya existían llegan con notified_at = NULL, así que
+    el primer dispatch_reminders avisaría de golpe de todo lo vencido (meses
+    de historial). Lo vencido antes de desplegar el despachador se da por
+    avisado, igual que hace el seeder:
+
+    - sueltos: notified_at = due_at
+    - series:  notified_through = ahora (se avisa desde la próxima ocurrencia)
+
+    update(): no toca updated_at, así que tampoco entra por el feed de cambios.
+    """
+    Reminder = apps.get_model("pedidos", "Reminder")
+    now = timezone.now()
+    pending = Reminder.objects.filter(is_done=False, notified_at__isnull=True, due_at__lt=now)
+    pending.filter(recurrence="").update(notified_at=F("due_at"))
+    pending.exclude(recurrence="").filter(notified_through__isnull=True).update(notified_through=now)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0031_reminder_notified_through'),
+    ]
+
+    operations = [
+        migrations.RunPython(mark_past_as_notified, migrations.RunPython.noop),
+    ]
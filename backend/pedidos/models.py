@@ -1,19 +1,35 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import MinValueValidator
+from django.db.models.functions import Coalesce, Greatest
+
+from .cache import invalidate, pedido_tags
+from .recurrence import RECURRENCE_CHOICES, advance
 
 
 
 class CustomUser(AbstractUser):
     email = models.EmailField(unique=True)
-    empresa = models.CharField(max_length=255)
+    empresa = models.ForeignKey(
+        "Empresa",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="usuarios",
+    )
+    # LEGACY: nombre de empresa en texto libre (antes de la FK). Solo lectura/backfill.
+    empresa_nombre = models.CharField(max_length=255, blank=True)
+    # se sube al cambiar contraseña/staff/empresa...: revoca los JWT emitidos (ver auth.py)
+    token_version = models.PositiveIntegerField(default=0, editable=False)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']  # solo username se pedirá al crear desde la terminal
 
     def __str__(self):
-        return f"{self.username} ({self.empresa})"
+        return f"{self.username} ({self.empresa or '-'})"
 
 class Empresa(models.Model):
     nombre = models.CharField(max_length=100)
@@ -28,6 +44,14 @@ class Pedido(models.Model):
     excursion = models.CharField(max_length=150, blank=True)
     fecha_inicio = models.DateField()
     fecha_fin = models.DateField(blank=True, null=True)
+    # último día que el pedido tiene material fuera: fecha_fin, o fecha_inicio si
+    # no hay (servicios de un día) o si viene antes. Lo calcula la BD; sirve
+    # para las consultas de solape (?dia= / ?solapa_desde= ?solapa_hasta=).
+    fecha_fin_efectiva = models.GeneratedField(
+        expression=Greatest(Coalesce("fecha_fin", "fecha_inicio"), "fecha_inicio"),
+        output_field=models.DateField(),
+        db_persist=True,
+    )
     ESTADOS = [
             ('pendiente_pago', 'Pendiente de pago'),
             ('pagado',        'Pagado'),
@@ -51,20 +75,54 @@ class Pedido(models.Model):
     emisores = models.PositiveIntegerField(null=True, blank=True)
     pax = models.PositiveIntegerField()
     guia = models.CharField(max_length=150, blank=True)
+    # LEGACY: historial antiguo en JSON. Ya no se escribe (ver PedidoEvent);
+    # se conserva solo para el backfill y no se carga en los listados.
     updates = models.JSONField(default=list, blank=True, editable=False)
     fecha_modificacion = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # keyset pagination: ORDER BY -fecha_creacion, -id
+            models.Index(fields=["-fecha_creacion", "-id"], name="idx_pedido_creacion"),
+            models.Index(fields=["user", "-fecha_creacion", "-id"], name="idx_pedido_user_creacion"),
+            # filtros del panel de ops (igualdad + mismo orden -> sin sort);
+            # el rango de fecha_inicio se filtra sobre el índice que toque.
+            # plan_checks.py / tests comprueban con EXPLAIN que se usan.
+            models.Index(fields=["empresa", "-fecha_creacion", "-id"], name="idx_pedido_empresa_creacion"),
+            models.Index(fields=["estado", "-fecha_creacion", "-id"], name="idx_pedido_estado_creacion"),
+            models.Index(fields=["tipo_servicio", "-fecha_creacion", "-id"], name="idx_pedido_tipo_creacion"),
+            # solape con [D1, D2]: fecha_fin_efectiva >= D1 AND fecha_inicio <= D2.
+            # fecha_inicio va como INCLUDE (PostgreSQL: se filtra sin ir a la tabla)
+            # y no como 2ª columna: si no, SQLite lo usa con skip-scan para ?desde/?hasta
+            # y ordena aparte en vez de recorrer idx_pedido_creacion.
+            models.Index(fields=["fecha_fin_efectiva"], include=["fecha_inicio"], name="idx_pedido_solape"),
+            # parcial: pedidos activos (?activos=1), los recogidos son la mayoría
+            models.Index(
+                fields=["-fecha_creacion", "-id"],
+                name="idx_pedido_activos",
+                condition=~models.Q(estado="recogido"),
+            ),
+        ]
+
+    def _build_event(self, event, user=None, note=None):
+        """Evento sin guardar (para bulk_create en operaciones masivas)."""
+        user_id = getattr(user, "pk", None) if user else None
+        label = ""
+        if user_id:
+            label = getattr(user, "username", "") or getattr(user, "email", "")
+        return PedidoEvent(
+            pedido_id=self.pk,
+            event=str(event),
+            user_id=user_id,
+            user_label=label or "",
+            note=str(note) if note else "",
+        )
+
     def _log_update(self, event, user=None, note=None):
-            entry = {
-                "ts": timezone.now().isoformat(),
-                "event": str(event),
-            }
-            if user:
-                entry["user_id"] = user.pk
-                entry["user"] = getattr(user, "username", "") or getattr(user, "email", "")
-            if note:
-                entry["note"] = str(note)
-            self.updates = (self.updates or []) + [entry]
+        """Añade un evento al historial: un INSERT, sin reescribir nada."""
+        entry = self._build_event(event, user=user, note=note)
+        entry.save()
+        return entry
 
     def set_delivered(self, user=None, note=None, delivered_pax=None, override_pax=False):
         self.estado = "entregado"
@@ -81,19 +139,137 @@ class Pedido(models.Model):
         if note:
             extra_note.append(str(note))
         full_note = "; ".join([n for n in extra_note if n]) if extra_note else None
-        self._log_update("delivered", user=user, note=full_note)
-        self.save(update_fields=["estado", "updates", "pax"])
+        with transaction.atomic():
+            self.save(update_fields=["estado", "pax", "fecha_modificacion"])
+            self._log_update("delivered", user=user, note=full_note)
 
     def set_collected(self, user=None, note=None):
             self.estado = "recogido"
-            self._log_update("collected", user=user, note=note)
-            self.save(update_fields=["estado", "updates"])
+            with transaction.atomic():
+                self.save(update_fields=["estado", "fecha_modificacion"])
+                self._log_update("collected", user=user, note=note)
+
+    @classmethod
+    def bulk_apply(cls, ids, changes, event, user=None, note=None):
+        """
+        Aplica `changes` a varios pedidos con un único UPDATE y registra un
+        PedidoEvent por pedido con un único bulk_create. `ids` ya debe venir
+        filtrado por permisos. Devuelve el nº de filas actualizadas.
+        """
+        from .stats import SUMMARY_SOURCE_FIELDS, add_delta, apply_deltas, new_deltas
+
+        ids = list(ids)
+        if not ids:
+            return 0
+        now = timezone.now()
+        with transaction.atomic():
+            # UPDATE no dispara post_save: caché y resumen diario a mano
+            before = list(
+                cls.objects.select_for_update().filter(pk__in=ids)
+                .values("user", *SUMMARY_SOURCE_FIELDS)
+            )
+            n = cls.objects.filter(pk__in=ids).update(**changes, fecha_modificacion=now)
+            deltas = new_deltas()
+            for old in before:
+                invalidate(*pedido_tags(old["empresa"], old["user"]))
+                new = {**old, **{f: v for f, v in changes.items() if f in old}}
+                if new != old:
+                    add_delta(deltas, old, new)
+            apply_deltas(deltas)
+            events = []
+            for pk in ids:
+                entry = cls(pk=pk)._build_event(event, user=user, note=note)
+                entry.ts = now
+                events.append(entry)
+            PedidoEvent.objects.bulk_create(events, batch_size=500)
+        return n
+
+    @classmethod
+    def bulk_insert(cls, pedidos, batch_size=500):
+        """
+        Alta masiva: bulk_create por trozos y el evento "created" de cada
+        pedido (lo que hace save()) con otro bulk_create. Sin señales: caché
+        y resumen diario a mano, como bulk_apply. Devuelve los pedidos con pk.
+        """
+        from .metrics import record_pedidos
+        from .stats import record_created
+
+        if not pedidos:
+            return pedidos
+        with transaction.atomic():
+            cls.objects.bulk_create(pedidos, batch_size=batch_size)
+            PedidoEvent.objects.bulk_create(
+                [p._build_event("created") for p in pedidos], batch_size=batch_size,
+            )
+            record_created(pedidos)
+            record_pedidos("bulk", len(pedidos))
+            for empresa_id, user_id in {(p.empresa_id, p.user_id) for p in pedidos}:
+                invalidate(*pedido_tags(empresa_id, user_id))
+        return pedidos
 
     def save(self, *args, **kwargs):
             is_new = self.pk is None
-            if is_new and not self.updates:
-                self.updates = [{"ts": timezone.now().isoformat(), "event": "created"}]
-            super().save(*args, **kwargs)
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                if is_new:
+                    self._log_update("created")
+
+
+class PedidoDailySummary(models.Model):
+    """
+    Resumen diario (fecha_inicio × empresa × tipo_servicio × estado) para el
+    dashboard. Se mantiene con deltas (upsert que suma) desde los caminos de
+    escritura de Pedido (ver stats.py); `manage.py rebuild_daily_summary` lo
+    regenera.
+    """
+    dia = models.DateField()
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name="+")
+    tipo_servicio = models.CharField(max_length=15)
+    estado = models.CharField(max_length=20)
+    pedidos = models.IntegerField(default=0)
+    pax = models.IntegerField(default=0)
+    emisores = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dia", "empresa", "tipo_servicio", "estado"], name="uniq_summary_dia_empresa",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["empresa", "dia"], name="idx_summary_empresa_dia"),
+        ]
+
+    def __str__(self):
+        return f"{self.dia} {self.empresa_id} {self.tipo_servicio}/{self.estado}: {self.pedidos}"
+
+
+class PedidoEvent(models.Model):
+    """
+    Historial de un Pedido (append-only): una fila por transición.
+    Sustituye a la lista JSON Pedido.updates.
+    """
+    pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name="events")
+    ts = models.DateTimeField(default=timezone.now)
+    event = models.CharField(max_length=50)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    user_label = models.CharField(max_length=255, blank=True)  # username/email en el momento del evento
+    note = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["pedido", "ts"], name="idx_event_pedido_ts"),
+        ]
+        ordering = ["ts", "id"]
+
+    def __str__(self):
+        return f"{self.pedido_id} - {self.event} - {self.ts:%Y-%m-%d %H:%M}"
 
 class PedidoCrucero(models.Model):
     printing_date = models.DateTimeField(default=timezone.now)     
@@ -133,13 +309,93 @@ class Reminder(models.Model):
     due_at = models.DateTimeField()              # <- tu serializer usa "due_at" directamente
     is_done = models.BooleanField(default=False)
     done_at = models.DateTimeField(null=True, blank=True)
+    # lo rellena el despachador (pedidos/reminders.py) al avisar; se limpia si cambia due_at
+    notified_at = models.DateTimeField(null=True, blank=True)
+    # series: última ocurrencia avisada (notified_at no se usa: la serie sigue pendiente)
+    notified_through = models.DateTimeField(null=True, blank=True)
+
+    # Recurrencia (pedidos/recurrence.py): due_at es la próxima ocurrencia; las
+    # demás se generan al vuelo. Solo se guardan las ocurrencias saltadas.
+    recurrence = models.CharField(max_length=12, choices=RECURRENCE_CHOICES, blank=True, default="")
+    recurrence_interval = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)])
+    recurrence_until = models.DateTimeField(null=True, blank=True)
+    recurrence_exceptions = models.JSONField(default=list, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
+    # feed de cambios del despachador: los save() con update_fields deben incluirlo
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["is_done", "due_at", "-created_at"]
+        indexes = [
+            models.Index(fields=["user", "is_done", "due_at", "id"], name="idx_reminder_user_due"),
+            models.Index(fields=["updated_at"], name="idx_reminder_updated"),
+            # carga inicial del despachador: solo los pendientes de avisar
+            models.Index(
+                fields=["due_at"], name="idx_reminder_pending",
+                condition=models.Q(is_done=False, notified_at__isnull=True),
+            ),
+        ]
 
     def mark_done(self):
+        """Hecho. En una serie, pasa a la siguiente ocurrencia tras ahora (si queda)."""
+        now = timezone.now()
+        self.done_at = now
+        if self.recurrence and advance(self, max(self.due_at, now)):
+            self.save(update_fields=[
+                "due_at", "done_at", "notified_at", "recurrence_exceptions", "updated_at",
+            ])
+            return
         self.is_done = True
-        self.done_at = timezone.now()
-        self.save(update_fields=["is_done", "done_at"])
\ No newline at end of file
+        self.save(update_fields=["is_done", "done_at", "updated_at"])
+
+
+class ManifestJob(models.Model):
+    """
+    Subida de manifiesto en segundo plano (POST /api/pedidos/cruceros/bulk/?async=1).
+    La procesa el worker de pedidos/jobs.py (manage.py run_jobs); el estado se
+    consulta en GET /api/jobs/<id>/.
+    """
+    PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+    STATUS_CHOICES = [
+        (PENDING, "En cola"),
+        (RUNNING, "En curso"),
+        (DONE, "Terminado"),
+        (FAILED, "Fallido"),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="manifest_jobs",
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    # {"rows": [...], "meta": {...}} ya normalizado (meta aplicada a cada fila)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    # mismos contadores que devuelve CruceroBulkView.post, acumulados por grupo
+    result = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    errors = models.JSONField(default=list, blank=True, encoder=DjangoJSONEncoder)
+    groups_total = models.PositiveIntegerField(default=0)
+    groups_done = models.PositiveIntegerField(default=0)
+    # quién lo tiene (token del claim: "<worker>:<aleatorio>") y cuántas veces se ha reclamado
+    owner = models.CharField(max_length=100, blank=True, default="")
+    attempts = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)   # = fecha de impresión del lote
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # latido: lo mueve un hilo del worker mientras tiene el job (los running parados se re-encolan)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            # cola del worker: solo los pendientes
+            models.Index(
+                fields=["created_at", "id"], name="idx_job_pending",
+                condition=models.Q(status="pending"),
+            ),
+        ]
+
+    def __str__(self):
+        return f"job {self.pk} ({self.status}, {self.groups_done}/{self.groups_total})"
@@ -0,0 +1,227 @@
+# backend/pedidos/pagination.py
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from .values_serializers import ValuesSerializer, ordering_columns
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por cursor (keyset) sobre una ordenación compuesta.
+
+    - El cursor es opaco: base64 de los valores de ordenación de la fila frontera.
+    - La página siguiente se pide con WHERE (a, b) < (x, y), así que la página N
+      cuesta lo mismo que la 1 y nunca se lanza COUNT(*).
+    - Cada vista define su orden con `keyset_ordering`; el último campo tiene
+      que ser único (normalmente "id") y ninguno puede ser NULL. Vale también
+      un annotate del queryset (p. ej. search_rank de search.py).
+
+    Respuesta: {"next": url|null, "previous": url|null, "results": [...]}
+    """
+
+    page_size = api_settings.PAGE_SIZE or 50
+    max_page_size = 500
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    ordering = ("-fecha_creacion", "-id")
+    invalid_cursor_message = "Cursor inválido."
+    annotations = {}
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset, position, reverse = self._page_queryset(queryset, request, view)
+        return self._set_page(list(queryset), position, reverse)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Igual que paginate_queryset pero con el ORM async (vistas ASGI)."""
+        queryset, position, reverse = self._page_queryset(queryset, request, view)
+        return self._set_page([row async for row in queryset], position, reverse)
+
+    def _page_queryset(self, queryset, request, view):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = tuple(getattr(view, "keyset_ordering", None) or self.ordering)
+        self.model = queryset.model
+        self.annotations = queryset.query.annotations
+
+        position, reverse = self.decode_cursor(request)
+
+        order = [_invert(o) for o in self.ordering] if reverse else list(self.ordering)
+        queryset = queryset.order_by(*order)
+        if position is not None:
+            queryset = queryset.filter(self._keyset_filter(position, reverse))
+
+        # una fila de más para saber si hay otra página (sin COUNT)
+        return queryset[: self.page_size + 1], position, reverse
+
+    def _set_page(self, rows, position, reverse):
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if reverse:
+            rows.reverse()
+
+        if reverse:
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None and bool(rows)
+
+        self.page = rows
+        return rows
+
+    def get_paginated_data(self, data):
+        return OrderedDict([
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("results", data),
+        ])
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        raw = request.query_params.get(self.page_size_query_param)
+        if raw:
+            try:
+                size = int(raw)
+                if size > 0:
+                    return min(size, self.max_page_size)
+            except (TypeError, ValueError):
+                pass
+        return self.page_size
+
+    # ---------- enlaces ----------
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._link(self.page[0], reverse=True)
+
+    def _link(self, row, reverse):
+        values = [_dump(self._value(row, name)) for name, _ in self._fields()]
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, self.encode_cursor(values, reverse)
+        )
+
+    # ---------- cursor ----------
+    def encode_cursor(self, values, reverse=False):
+        raw = json.dumps({"p": values, "r": int(reverse)}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            padded = encoded + "=" * (-len(encoded) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+            raw_values = data["p"]
+            reverse = bool(data.get("r"))
+            fields = self._fields()
+            if len(raw_values) != len(fields):
+                raise ValueError("longitud de cursor")
+            position = [
+                self._model_field(name).to_python(value)
+                for (name, _), value in zip(fields, raw_values)
+            ]
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    # ---------- helpers ----------
+    def _fields(self):
+        return [(o.lstrip("-"), o.startswith("-")) for o in self.ordering]
+
+    def _model_field(self, name):
+        if name == "pk":
+            return self.model._meta.pk
+        if name in self.annotations:
+            return self.annotations[name].output_field
+        return self.model._meta.get_field(name)
+
+    def _value(self, row, name):
+        if isinstance(row, dict) or name in self.annotations:
+            return row[name] if isinstance(row, dict) else getattr(row, name)
+        return getattr(row, self._model_field(name).attname)
+
+    def _keyset_filter(self, position, reverse):
+        """
+        (a, b, c) < (x, y, z) expandido a ORs para poder mezclar ASC/DESC:
+            a < x  OR  (a = x AND b < y)  OR  (a = x AND b = y AND c < z)
+        Se añade además la cota a <= x para que el planner haga range scan
+        sobre el índice compuesto.
+        """
+        fields = self._fields()
+        q = Q()
+        prefix = {}
+        for (name, desc), value in zip(fields, position):
+            op = "lt" if desc != reverse else "gt"
+            q |= Q(**prefix, **{f"{name}__{op}": value})
+            prefix[name] = value
+
+        first_name, first_desc = fields[0]
+        bound = "lte" if first_desc != reverse else "gte"
+        return Q(**{f"{first_name}__{bound}": position[0]}) & q
+
+
+def _invert(order):
+    return order[1:] if order.startswith("-") else f"-{order}"
+
+
+def _dump(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def paginate(request, queryset, serializer_class, view=None, ordering=None, **serializer_kwargs):
+    """
+    Atajo para APIView "a mano" (sin GenericAPIView) o sub-listados de una
+    acción: pagina y serializa. `ordering` manda sobre view.keyset_ordering.
+    """
+    paginator = KeysetPagination()
+    if ordering:
+        paginator.ordering = tuple(ordering)
+        view = None
+    page = paginator.paginate_queryset(queryset, request, view=view)
+    serializer = serializer_class(page, many=True, **serializer_kwargs)
+    return paginator.get_paginated_response(serializer.data)
+
+
+def paginate_values(request, queryset, serializer_class, view=None):
+    """
+    Como paginate() pero sin instancias: values_list + ValuesSerializer
+    (values_serializers.py), misma salida que `serializer_class`.
+    """
+    paginator = KeysetPagination()
+    reader = ValuesSerializer(serializer_class)
+    ordering = getattr(view, "keyset_ordering", None) or paginator.ordering
+    queryset = reader.queryset(queryset, extra=ordering_columns(ordering))
+    page = paginator.paginate_queryset(queryset, request, view=view)
+    return paginator.get_paginated_response(reader.data(page))
@@ -0,0 +1,98 @@
+# backend/pedidos/pedido_batch.py
+"""
+Alta masiva de pedidos (POST /api/pedidos/bulk/, BulkPedidos).
+
+Antes era PedidoSerializer(many=True).save(): un create() y un INSERT (más su
+evento y su delta del resumen) por fila. Ahora, para que 5.000 filas sean un
+puñado de consultas:
+
+1. validar    todas las filas en una pasada con PedidoBatchRowSerializer,
+              sin consultas (la empresa queda como referencia: id o nombre)
+2. resolver   las empresas de todo el lote con UNA consulta
+3. escribir   Pedido.bulk_insert: bulk_create por trozos de BATCH_SIZE, eventos
+              "created" igual, resumen diario y caché; todo en una transacción
+
+Éxito parcial: las filas con errores se saltan y se informa por índice de
+fila, [{"index": 0, "id": 120}, {"index": 1, "errors": {...}}, ...].
+
+Usuario normal: la empresa es la suya (la del payload se ignora, como en
+PedidoSerializer.create). Staff: cada fila dice su empresa.
+"""
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+from .models import Empresa, Pedido
+from .serializers import PedidoBatchRowSerializer
+
+MAX_ROWS = 10000
+BATCH_SIZE = 500
+
+
+def validate_rows(rows):
+    """([(índice, attrs)], {índice: errores}) validando con un solo serializer."""
+    child = PedidoBatchRowSerializer()
+    valid, errors = [], {}
+    for i, row in enumerate(rows):
+        try:
+            valid.append((i, child.run_validation(row)))
+        except ValidationError as e:
+            errors[i] = e.detail
+    return valid, errors
+
+
+def _empresa_lookup(refs):
+    """{referencia: empresa_id} para ids y nombres (nombre repetido -> None)."""
+    ids = {r for r in refs if isinstance(r, int)}
+    names = {r for r in refs if isinstance(r, str)}
+    lookup = {}
+    if not (ids or names):
+        return lookup
+    rows = Empresa.objects.filter(Q(pk__in=ids) | Q(nombre__in=names)).values_list("id", "nombre")
+    for pk, nombre in rows:
+        if pk in ids:
+            lookup[pk] = pk
+        if nombre in names:
+            lookup[nombre] = None if nombre in lookup else pk
+    return lookup
+
+
+def resolve_empresas(valid, user, errors):
+    """Pone empresa_id en cada fila válida; las que no se resuelven pasan a `errors`."""
+    if not user.is_staff:
+        if not user.empresa_id:
+            errors.update({i: {"empresa": ["Tu usuario no tiene empresa asignada."]} for i, _ in valid})
+            return []
+        for _, attrs in valid:
+            attrs.pop("empresa", None)
+            attrs["empresa_id"] = user.empresa_id
+        return valid
+
+    lookup = _empresa_lookup({attrs.get("empresa") for _, attrs in valid} - {None})
+    resolved = []
+    for i, attrs in valid:
+        ref = attrs.pop("empresa", None)
+        if ref is None:
+            errors[i] = {"empresa": ["Este campo es obligatorio para staff."]}
+        elif ref not in lookup:
+            errors[i] = {"empresa": [f"No existe la empresa {ref!r}."]}
+        elif lookup[ref] is None:
+            errors[i] = {"empresa": [f"Hay varias empresas llamadas {ref!r}; usa el id."]}
+        else:
+            attrs["empresa_id"] = lookup[ref]
+            resolved.append((i, attrs))
+    return resolved
+
+
+def create_batch(rows, user):
+    """
+    {"created": n, "failed": n, "results": [...]} (results ordenado por índice).
+    `rows` es la lista del payload, ya comprobado que es lista y <= MAX_ROWS.
+    """
+    valid, errors = validate_rows(rows)
+    valid = resolve_empresas(valid, user, errors)
+    pedidos = Pedido.bulk_insert([Pedido(user=user, **attrs) for _, attrs in valid], batch_size=BATCH_SIZE)
+
+    results = [{"index": i, "id": p.pk} for (i, _), p in zip(valid, pedidos)]
+    results += [{"index": i, "errors": e} for i, e in errors.items()]
+    results.sort(key=lambda r: r["index"])
+    return {"created": len(pedidos), "failed": len(errors), "results": results}
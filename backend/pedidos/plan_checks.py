@@ -0,0 +1,195 @@
+# backend/pedidos/plan_checks.py
+"""
+Comprobación de planes de ejecución (EXPLAIN) de los listados filtrables.
+
+Para cada combinación de filtros que aceptan PedidoOpsViewSet y
+ReminderViewSet se construye EXACTAMENTE la consulta que lanza la API
+(get_queryset + página keyset, primera y siguiente) y se mira su plan:
+
+- full scan de la tabla (sin índice)          -> problema
+- sort aparte para el ORDER BY (filesort)     -> problema, salvo con los
+  filtros de SORT_OK_GROUPS (ventanas acotadas: se ordenan pocas filas)
+
+Soporta SQLite (EXPLAIN QUERY PLAN) y PostgreSQL (EXPLAIN FORMAT JSON).
+Los planes dependen de las estadísticas: hay que lanzarlo sobre una BD con
+datos (seed_load) y tras ANALYZE. Lo usan los tests y `manage.py plan_check`.
+"""
+import itertools
+import json
+import re
+
+from django.db import connection
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from .models import Pedido
+from .pagination import KeysetPagination
+
+# grupos de filtros: se prueban todos los subconjuntos
+OPS_FILTER_GROUPS = {
+    "estado": {"estado": "pagado"},
+    "tipo_servicio": {"tipo_servicio": "mediodia"},
+    "rango": {"desde": "2025-03-01", "hasta": "2025-06-30"},
+    "activos": {"activos": "1"},
+    "solape": {"solapa_desde": "2025-06-01", "solapa_hasta": "2025-06-07"},
+    "texto": {"q": "city"},
+    "empresa": {},  # solo staff; el id se rellena con una empresa real
+}
+REMINDER_FILTER_GROUPS = {
+    "done": {"done": "false"},
+    "overdue": {"overdue": "1"},
+    "rango": {"due_after": "2025-03-01", "due_before": "2025-06-30"},
+    "texto": {"q": "llamar"},
+}
+
+# filtros que devuelven una ventana acotada por índice propio (solape de fechas,
+# texto con FTS ordenado por relevancia): ahí lo correcto es buscar por ese
+# índice y ordenar el resultado aparte
+SORT_OK_GROUPS = {"solape", "texto"}
+
+_SQLITE_FULL_SCAN = re.compile(r"\bSCAN (\w+)$")
+
+
+# ---------------------------------------------------------
+# EXPLAIN
+# ---------------------------------------------------------
+
+def analyze():
+    """Refresca estadísticas del planner (sin ellas los planes no valen)."""
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+def explain(queryset):
+    if connection.vendor == "postgresql":
+        return queryset.explain(format="json")
+    return queryset.explain()
+
+
+def plan_problems(queryset, tables=None, allow_sort=False):
+    """
+    Lista de problemas del plan (vacía = bien). `tables`: tablas en las que
+    un full scan es un fallo (por defecto la del modelo del queryset).
+    `allow_sort`: un sort aparte no cuenta como problema.
+    """
+    tables = set(tables or [queryset.model._meta.db_table])
+    plan = explain(queryset)
+    if connection.vendor == "postgresql":
+        problems = _pg_problems(json.loads(plan), tables)
+    elif connection.vendor == "sqlite":
+        problems = _sqlite_problems(plan, tables)
+    else:
+        problems = []
+    if allow_sort:
+        problems = [p for p in problems if not p.startswith("filesort")]
+    return problems
+
+
+def _sqlite_problems(plan, tables):
+    problems = []
+    for line in plan.splitlines():
+        detail = line.split(" ", 3)[-1].strip()
+        match = _SQLITE_FULL_SCAN.search(detail)
+        if match and match.group(1) in tables:
+            problems.append(f"full scan: {detail}")
+        if "USE TEMP B-TREE FOR ORDER BY" in detail:
+            problems.append("filesort: USE TEMP B-TREE FOR ORDER BY")
+    return problems
+
+
+def _pg_problems(plan, tables):
+    problems = []
+
+    def walk(node):
+        kind = node.get("Node Type")
+        if kind == "Seq Scan" and node.get("Relation Name") in tables:
+            problems.append(f"full scan: Seq Scan on {node['Relation Name']}")
+        if kind in ("Sort", "Incremental Sort"):
+            problems.append(f"filesort: {kind} ({', '.join(node.get('Sort Key', []))})")
+        for child in node.get("Plans", []):
+            walk(child)
+
+    for entry in plan:
+        walk(entry["Plan"])
+    return problems
+
+
+# ---------------------------------------------------------
+# Consultas de la API
+# ---------------------------------------------------------
+
+def _combinations(groups):
+    names = list(groups)
+    for r in range(len(names) + 1):
+        yield from itertools.combinations(names, r)
+
+
+def _api_queryset(view_class, user, path, params):
+    """get_queryset + la página keyset que sacaría la API con esos params."""
+    request = APIRequestFactory().get(path, params)
+    force_authenticate(request, user=user)
+    request = Request(request)
+    request.user = user
+    view = view_class(action="list", request=request, format_kwarg=None)
+    paginator = KeysetPagination()
+    queryset, _, _ = paginator._page_queryset(view.get_queryset(), request, view)
+    return queryset, paginator
+
+
+def _next_cursor(view_class, user, path, params):
+    """Cursor de la 2ª página (si hay), para comprobar también el WHERE keyset."""
+    queryset, paginator = _api_queryset(view_class, user, path, params)
+    paginator._set_page(list(queryset), None, False)
+    if not paginator.has_next:
+        return None
+    values = [paginator._value(paginator.page[-1], name) for name, _ in paginator._fields()]
+    return paginator.encode_cursor([v.isoformat() if hasattr(v, "isoformat") else v for v in values])
+
+
+def api_plan_cases(staff, user, empresa_id):
+    """
+    (nombre, queryset, allow_sort) de cada combinación de filtros, para staff
+    y para un usuario normal, primera página y siguiente.
+    """
+    from .views import PedidoOpsViewSet, ReminderViewSet
+
+    endpoints = [
+        ("ops", PedidoOpsViewSet, "/api/ops/pedidos/", OPS_FILTER_GROUPS,
+         [("staff", staff), ("user", user)]),
+        ("reminders", ReminderViewSet, "/api/reminders/", REMINDER_FILTER_GROUPS,
+         [("user", user)]),
+    ]
+    for prefix, view_class, path, groups, users in endpoints:
+        for who, u in users:
+            for combo in _combinations(groups):
+                if "empresa" in combo and not u.is_staff:
+                    continue
+                params = {}
+                for name in combo:
+                    params.update(groups[name] or {"empresa": empresa_id})
+                label = f"{prefix}[{who}] {'+'.join(combo) or 'sin filtros'}"
+                allow_sort = bool(SORT_OK_GROUPS & set(combo))
+                yield label, _api_queryset(view_class, u, path, params)[0], allow_sort
+
+                cursor = _next_cursor(view_class, u, path, params)
+                if cursor:
+                    yield f"{label} (pág. 2)", _api_queryset(
+                        view_class, u, path, {**params, "cursor": cursor},
+                    )[0], allow_sort
+
+
+def sample_actors():
+    """Staff, un usuario normal con pedidos y una empresa con pedidos (de la BD actual)."""
+    from django.contrib.auth import get_user_model
+
+    User = get_user_model()
+    staff = User.objects.filter(is_staff=True).order_by("id").first()
+    first = (
+        Pedido.objects.filter(user__is_staff=False)
+        .order_by("-fecha_creacion", "-id")
+        .values_list("user_id", "empresa_id")
+        .first()
+    )
+    user_id, empresa_id = first or (None, None)
+    user = User.objects.filter(pk=user_id).first() if user_id else None
+    return staff, user, empresa_id
@@ -0,0 +1,186 @@
+# backend/pedidos/planner.py
+"""
+Planificador de material: cuántos emisores y receptores hay fuera cada día.
+
+Un pedido ocupa su material desde fecha_inicio hasta fecha_fin_efectiva
+(ambos incluidos; sin fecha_fin, solo ese día). Receptores = pax, emisores =
+emisores (vacío cuenta 0).
+
+En vez de recorrer día a día, se carga la temporada con UN values_list y se
+hace un barrido con array de diferencias en NumPy:
+
+    diff[inicio] += n ; diff[fin + 1] -= n ; ocupación = cumsum(diff)
+
+por cada grupo (empresa, tipo_servicio) a la vez (una fila por grupo, con
+np.bincount sobre índices aplanados). El barrido de un año son
+milisegundos; casi todo el coste es la consulta (~0,3 s con 50k pedidos en
+SQLite).
+
+El stock se configura en settings (PLANNER_STOCK_EMISORES /
+PLANNER_STOCK_RECEPTORES, 0 = sin límite) y se puede sobreescribir por
+petición (?stock_emisores= / ?stock_receptores=) para simular.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+
+from .models import Pedido
+from .stats import _parse_date
+
+# tope de días por consulta (arrays de grupos × días)
+MAX_DAYS = 3 * 366
+
+
+def _stock(params, name, default):
+    raw = params.get(name)
+    if raw in (None, ""):
+        return default or None
+    try:
+        value = int(raw)
+    except ValueError:
+        raise ValidationError({name: "Debe ser un entero."})
+    if value < 0:
+        raise ValidationError({name: "Debe ser >= 0."})
+    return value or None
+
+
+def _season(params):
+    """[desde, hasta] de la petición; por defecto el año en curso."""
+    today = date.today()
+    desde = _parse_date(params, "desde") or date(today.year, 1, 1)
+    hasta = _parse_date(params, "hasta") or date(desde.year, 12, 31)
+    if hasta < desde:
+        raise ValidationError({"hasta": "Debe ser >= desde."})
+    if (hasta - desde).days >= MAX_DAYS:
+        raise ValidationError({"hasta": f"Como mucho {MAX_DAYS} días por consulta."})
+    return desde, hasta
+
+
+def load_intervals(desde, hasta, empresa_id=None):
+    """
+    Pedidos que pisan [desde, hasta] como columnas NumPy:
+    (inicio, fin) en días desde `desde` (recortados al rango), emisores, pax,
+    empresa_id, tipo_servicio.
+    """
+    qs = Pedido.objects.filter(fecha_fin_efectiva__gte=desde, fecha_inicio__lte=hasta)
+    if empresa_id:
+        qs = qs.filter(empresa_id=empresa_id)
+    rows = list(qs.order_by().values_list(
+        "fecha_inicio", "fecha_fin_efectiva", "emisores", "pax", "empresa_id", "tipo_servicio",
+    ))
+    if not rows:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty, empty, empty, np.zeros(0, dtype=object)
+
+    inicio, fin, emisores, pax, empresas, tipos = zip(*rows)
+    n = len(rows)
+    origin = desde.toordinal()
+    last = (hasta - desde).days
+    # toordinal + fromiter: bastante más rápido que np.array(dates, "datetime64[D]")
+    start = np.fromiter((d.toordinal() for d in inicio), dtype=np.int64, count=n) - origin
+    end = np.fromiter((d.toordinal() for d in fin), dtype=np.int64, count=n) - origin
+    return (
+        np.clip(start, 0, last),
+        np.clip(end, 0, last),
+        np.array([e or 0 for e in emisores], dtype=np.int64),
+        np.array(pax, dtype=np.int64),
+        np.array(empresas, dtype=np.int64),
+        np.array(tipos, dtype=object),
+    )
+
+
+def sweep(start, end, values, group, n_groups, n_days):
+    """Ocupación diaria (n_groups × n_days) con array de diferencias."""
+    width = n_days + 1
+    size = n_groups * width
+    diff = (
+        np.bincount(group * width + start, weights=values, minlength=size)
+        - np.bincount(group * width + end + 1, weights=values, minlength=size)
+    )
+    return np.cumsum(diff.reshape(n_groups, width)[:, :n_days], axis=1).astype(np.int64)
+
+
+def plan_demand(desde, hasta, empresa_id=None, stock_emisores=None, stock_receptores=None):
+    """
+    {
+      "desde", "hasta", "stock": {"emisores", "receptores"},
+      "results":    [{"dia", "emisores", "receptores", "excede"}]   (un elemento por día)
+      "peak":       {"emisores": {"dia", "valor"}, "receptores": {...}},
+      "groups":     [{"empresa", "tipo_servicio", "pico_emisores", "dia_pico_emisores",
+                      "pico_receptores", "dia_pico_receptores"}],
+      "over_stock": ["YYYY-MM-DD", ...],
+    }
+    """
+    n_days = (hasta - desde).days + 1
+    start, end, emisores, pax, empresas, tipos = load_intervals(desde, hasta, empresa_id)
+
+    empresa_ids, empresa_idx = np.unique(empresas, return_inverse=True)
+    tipo_names, tipo_idx = np.unique(tipos, return_inverse=True)
+    n_groups = max(len(empresa_ids) * len(tipo_names), 1)
+    group = empresa_idx * len(tipo_names) + tipo_idx
+
+    por_grupo = {
+        "emisores": sweep(start, end, emisores, group, n_groups, n_days),
+        "receptores": sweep(start, end, pax, group, n_groups, n_days),
+    }
+    total = {name: series.sum(axis=0) for name, series in por_grupo.items()}
+    stock = {"emisores": stock_emisores, "receptores": stock_receptores}
+
+    excede = np.zeros(n_days, dtype=bool)
+    for name, limit in stock.items():
+        if limit:
+            excede |= total[name] > limit
+
+    dias = [desde + timedelta(days=d) for d in range(n_days)]
+    results = [
+        {"dia": dia, "emisores": int(e), "receptores": int(r), "excede": bool(x)}
+        for dia, e, r, x in zip(dias, total["emisores"], total["receptores"], excede)
+    ]
+
+    peak = {}
+    for name, series in total.items():
+        d = int(series.argmax())
+        peak[name] = {"dia": dias[d], "valor": int(series[d])}
+
+    groups = []
+    for g in range(len(empresa_ids) * len(tipo_names)):
+        em, rec = por_grupo["emisores"][g], por_grupo["receptores"][g]
+        if not rec.any() and not em.any():
+            continue
+        de, dr = int(em.argmax()), int(rec.argmax())
+        groups.append({
+            "empresa": int(empresa_ids[g // len(tipo_names)]),
+            "tipo_servicio": tipo_names[g % len(tipo_names)],
+            "pico_emisores": int(em[de]),
+            "dia_pico_emisores": dias[de],
+            "pico_receptores": int(rec[dr]),
+            "dia_pico_receptores": dias[dr],
+        })
+
+    return {
+        "desde": desde,
+        "hasta": hasta,
+        "stock": stock,
+        "results": results,
+        "peak": peak,
+        "groups": groups,
+        "over_stock": [dias[d] for d in np.flatnonzero(excede)],
+    }
+
+
+def plan_from_params(params):
+    """plan_demand a partir de los query params de /api/ops/planner/ (los valida)."""
+    desde, hasta = _season(params)
+    empresa_id = None
+    if params.get("empresa"):
+        try:
+            empresa_id = int(params["empresa"])
+        except ValueError:
+            raise ValidationError({"empresa": "Debe ser un id numérico."})
+    return plan_demand(
+        desde, hasta, empresa_id=empresa_id,
+        stock_emisores=_stock(params, "stock_emisores", settings.PLANNER_STOCK_EMISORES),
+        stock_receptores=_stock(params, "stock_receptores", settings.PLANNER_STOCK_RECEPTORES),
+    )
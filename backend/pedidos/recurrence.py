@@ -0,0 +1,166 @@
+# backend/pedidos/recurrence.py
+"""
+Recordatorios recurrentes sin materializar filas.
+
+Una serie es UNA fila de Reminder con `recurrence` (diario, semanal, días
+laborables) cuyo due_at es la próxima ocurrencia pendiente. El resto se
+genera al vuelo con occurrences(): un diario durante un año sigue siendo una
+fila. Lo único que se guarda además son las excepciones (ocurrencias
+saltadas), en recurrence_exceptions.
+
+- Marcar hecho (Reminder.mark_done) avanza due_at a la siguiente ocurrencia
+  posterior a ahora; la serie solo queda is_done al pasar recurrence_until.
+- Los pasos se calculan en hora local: "todos los lunes a las 9" sigue a las
+  9 tras el cambio de hora.
+- ReminderViewSet expande las series en el listado cuando se pide ventana
+  (?due_before=): merge_page() mezcla las filas normales de la página con
+  los generadores de cada serie y corta en page_size, así que solo se generan
+  las ocurrencias que caben en la página.
+"""
+import copy
+import heapq
+import itertools
+from collections import deque
+from datetime import UTC, datetime, timedelta
+
+from django.utils import timezone
+
+DAILY, WEEKLY, WEEKDAYS = "diario", "semanal", "laborables"
+RECURRENCE_CHOICES = [
+    (DAILY, "Diario"),
+    (WEEKLY, "Semanal"),
+    (WEEKDAYS, "Días laborables"),
+]
+
+_STEP = {DAILY: timedelta(days=1), WEEKLY: timedelta(weeks=1)}
+
+
+def exception_key(dt):
+    """Clave de una ocurrencia en recurrence_exceptions (ISO en UTC)."""
+    return dt.astimezone(UTC).isoformat()
+
+
+def _jump(local, target, rule, interval):
+    """Adelanta `local` (naive) casi hasta `target` sin recorrer ocurrencia a ocurrencia."""
+    if target <= local:
+        return local
+    if rule == WEEKDAYS:
+        # semanas enteras: el día de la semana no cambia
+        return local + timedelta(weeks=(target - local).days // 7)
+    step = _STEP[rule] * interval
+    return local + step * ((target - local) // step)
+
+
+def _next(local, rule, interval):
+    if rule == WEEKDAYS:
+        local += timedelta(days=1)
+        while local.weekday() >= 5:
+            local += timedelta(days=1)
+        return local
+    return local + _STEP[rule] * interval
+
+
+def occurrences(reminder, start=None, end=None):
+    """
+    Generador de los due_at de la serie a partir de su due_at, dentro de
+    [start, end] (ambos opcionales), sin excepciones y sin pasar de
+    recurrence_until. Sin `end` ni until es infinito: consumir con islice.
+    Un recordatorio sin recurrencia da solo su due_at.
+    """
+    rule = reminder.recurrence
+    until = reminder.recurrence_until
+    if end is None or (until and until < end):
+        end = until
+    if not rule:
+        if (start is None or reminder.due_at >= start) and (end is None or reminder.due_at <= end):
+            yield reminder.due_at
+        return
+
+    interval = max(reminder.recurrence_interval or 1, 1)
+    skip = set(reminder.recurrence_exceptions or ())
+    local = timezone.make_naive(reminder.due_at)
+    if start is not None:
+        local = _jump(local, timezone.make_naive(start), rule, interval)
+    while True:
+        dt = timezone.make_aware(local)
+        if end is not None and dt > end:
+            return
+        if (start is None or dt >= start) and exception_key(dt) not in skip:
+            yield dt
+        local = _next(local, rule, interval)
+
+
+def next_occurrence(reminder, after):
+    """Primera ocurrencia estrictamente posterior a `after` (o None si la serie acaba)."""
+    return next(occurrences(reminder, start=after + timedelta(microseconds=1)), None)
+
+
+def is_occurrence(reminder, dt):
+    return next(occurrences(reminder, start=dt, end=dt), None) == dt
+
+
+def advance(reminder, after):
+    """
+    Mueve la serie a su siguiente ocurrencia tras `after` y poda las
+    excepciones ya pasadas. Devuelve False si no quedan ocurrencias.
+    """
+    nxt = next_occurrence(reminder, after)
+    if nxt is None:
+        return False
+    reminder.due_at = nxt
+    reminder.notified_at = None
+    reminder.recurrence_exceptions = [
+        e for e in reminder.recurrence_exceptions or () if datetime.fromisoformat(e) > nxt
+    ]
+    return True
+
+
+# ---------------------------------------------------------
+# Listado (ReminderViewSet)
+# ---------------------------------------------------------
+
+def _sort_key(reminder):
+    # = keyset_ordering de ReminderViewSet ("is_done", "due_at", "id")
+    return (reminder.is_done, reminder.due_at, reminder.pk)
+
+
+def occurrence_rows(series, start=None, end=None):
+    """Ocurrencias de una serie como copias de la fila con su due_at."""
+    for dt in occurrences(series, start, end):
+        row = copy.copy(series)
+        row.due_at = dt
+        row.is_occurrence = dt != series.due_at
+        yield row
+
+
+def merge_page(paginator, singles, series, request, view, start=None, end=None):
+    """
+    Página keyset mezclando `singles` (queryset de filas normales) con las
+    ocurrencias de `series` en [start, end]. Deja el paginador listo para
+    get_paginated_response, igual que paginate_queryset.
+    """
+    rows_qs, position, reverse = paginator._page_queryset(singles, request, view)
+    singles = list(rows_qs)
+    limit = paginator.page_size + 1
+    series = list(series)
+    position = tuple(position) if position is not None else None
+
+    if not reverse:
+        if position is not None:
+            if position[0]:  # ya en los hechos: las ocurrencias van todas antes
+                series = []
+            elif start is None or position[1] > start:
+                start = position[1]
+        generated = heapq.merge(*(occurrence_rows(s, start, end) for s in series), key=_sort_key)
+        if position is not None:
+            generated = (r for r in generated if _sort_key(r) > position)
+        rows = heapq.merge(singles, generated, key=_sort_key)
+    else:
+        if not position[0]:
+            end = position[1] if end is None or position[1] < end else end
+        generated = heapq.merge(*(occurrence_rows(s, start, end) for s in series), key=_sort_key)
+        # hacia atrás: las `limit` últimas antes de la posición
+        tail = deque((r for r in generated if _sort_key(r) < position), maxlen=limit)
+        rows = heapq.merge(singles, reversed(tail), key=_sort_key, reverse=True)
+
+    return paginator._set_page(list(itertools.islice(rows, limit)), position, reverse)
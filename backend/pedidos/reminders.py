@@ -0,0 +1,254 @@
+# backend/pedidos/reminders.py
+"""
+Despachador de recordatorios (manage.py dispatch_reminders).
+
+En vez de que cada cliente sondee ?overdue=true, un único proceso:
+
+1. carga UNA vez los pendientes (no hechos y sin avisar, índice parcial
+   idx_reminder_pending) en un min-heap por due_at
+2. duerme hasta el siguiente vencimiento o el siguiente sondeo de cambios,
+   lo que llegue antes
+3. al vencer, revalida el lote contra la BD (borrados, hechos o re-programados
+   mientras tanto), avisa por el notificador configurado y marca notified_at
+   con UN solo UPDATE por lote
+4. cada `poll_interval` lee solo lo que ha cambiado (updated_at >= cursor,
+   índice idx_reminder_updated): altas, cambios de due_at y marcados como
+   hechos. Nada de re-escanear la tabla.
+
+Se marca notified_at y no done_at: done_at es "el usuario lo ha hecho", y un
+aviso no lo quita de su lista. Al cambiar due_at el serializer limpia
+notified_at y vuelve a entrar al heap.
+
+Series (pedidos/recurrence.py): no se marca notified_at (la serie tiene más
+ocurrencias), sino notified_through = la última ocurrencia avisada, y se
+vuelve a programar para la siguiente. Así una ocurrencia que nadie marca como
+hecha no deja la serie muda: la semana siguiente se avisa otra vez. fire_at()
+da cuándo toca avisar cada fila.
+
+El heap usa borrado perezoso: `scheduled` guarda el fire_at vigente de cada id
+y al sacar una entrada que no coincide se descarta (se ha re-programado o ya
+no está pendiente). Cuando la basura supera a lo vivo se reconstruye.
+
+Notificadores (settings.REMINDER_NOTIFIER, ruta con punto): una clase con
+send(reminders) que devuelve los ids avisados. EmailNotifier usa el backend de
+correo de settings.REMINDER_EMAIL_BACKEND (consola/fichero en local).
+"""
+import heapq
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Reminder
+from .recurrence import next_occurrence, occurrences
+
+log = logging.getLogger(__name__)
+
+# margen al leer cambios: una transacción que confirma tarde puede traer un
+# updated_at algo anterior al cursor (releer de más no hace daño)
+CHANGE_LAG = timedelta(seconds=30)
+# si el notificador falla, se reintenta el lote pasado este tiempo
+RETRY_DELAY = timedelta(minutes=1)
+LOAD_CHUNK = 2000
+# columnas para calcular fire_at sin cargar instancias completas
+SCHEDULE_FIELDS = (
+    "id", "due_at", "notified_through",
+    "recurrence", "recurrence_interval", "recurrence_until", "recurrence_exceptions",
+)
+
+
+def fire_at(reminder):
+    """
+    Cuándo avisar: due_at; en una serie, la primera ocurrencia (desde due_at)
+    aún sin avisar. None si la serie ya no tiene más.
+    """
+    if not reminder.recurrence:
+        return reminder.due_at
+    through = reminder.notified_through
+    if through is None or through < reminder.due_at:
+        return next(occurrences(reminder, start=reminder.due_at), None)
+    return next_occurrence(reminder, through)
+
+
+def _row_fire_at(row):
+    # row = values_list(*SCHEDULE_FIELDS): solo las series necesitan el objeto
+    if not row[3]:
+        return row[1]
+    return fire_at(Reminder(**dict(zip(SCHEDULE_FIELDS, row))))
+
+
+# ---------------------------------------------------------
+# Notificadores
+# ---------------------------------------------------------
+
+class LogNotifier:
+    """Solo escribe en el log (útil para probar el worker sin correo)."""
+
+    def send(self, reminders):
+        for r in reminders:
+            log.info("Recordatorio %s vencido (%s) para %s: %s", r.pk, r.due_at, r.user_id, r.title)
+        return [r.pk for r in reminders]
+
+
+class EmailNotifier:
+    """Un correo por recordatorio al email del usuario, todos por la misma conexión."""
+
+    def __init__(self, backend=None):
+        self.backend = backend or settings.REMINDER_EMAIL_BACKEND
+
+    def send(self, reminders):
+        messages = [
+            EmailMessage(
+                subject=f"Recordatorio: {r.title}",
+                body=f"{r.title}\nVence: {timezone.localtime(r.due_at):%d/%m/%Y %H:%M}\n\n{r.note}".rstrip(),
+                to=[r.user.email],
+            )
+            for r in reminders
+            if r.user.email
+        ]
+        if messages:
+            with get_connection(backend=self.backend) as connection:
+                connection.send_messages(messages)
+        # sin email no hay a quién avisar: se marcan igual para no reintentar siempre
+        return [r.pk for r in reminders]
+
+
+def get_notifier(path=None):
+    return import_string(path or settings.REMINDER_NOTIFIER)()
+
+
+# ---------------------------------------------------------
+# Despachador
+# ---------------------------------------------------------
+
+class ReminderDispatcher:
+    def __init__(self, notifier=None, poll_interval=5.0, batch_size=200):
+        self.notifier = notifier or get_notifier()
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.heap = []        # (cuándo avisar, id, fire_at)
+        self.scheduled = {}   # id -> fire_at vigente
+        self.cursor = None    # updated_at desde el que leer cambios
+
+    @staticmethod
+    def pending():
+        return Reminder.objects.filter(is_done=False, notified_at__isnull=True)
+
+    def _schedule(self, pk, fire, when=None):
+        self.scheduled[pk] = fire
+        heapq.heappush(self.heap, (when or fire, pk, fire))
+
+    def _rebuild(self):
+        self.heap = [(fire, pk, fire) for pk, fire in self.scheduled.items()]
+        heapq.heapify(self.heap)
+
+    def load(self):
+        """Carga inicial de todos los pendientes. Devuelve cuántos."""
+        # el cursor se toma antes de leer: lo que cambie durante la carga se relee
+        self.cursor = timezone.now()
+        rows = self.pending().order_by().values_list(*SCHEDULE_FIELDS)
+        self.scheduled = {}
+        for row in rows.iterator(chunk_size=LOAD_CHUNK):
+            fire = _row_fire_at(row)
+            if fire is not None:
+                self.scheduled[row[0]] = fire
+        self._rebuild()
+        return len(self.scheduled)
+
+    def poll_changes(self):
+        """Aplica altas/ediciones desde el último sondeo. Devuelve las filas leídas."""
+        since = self.cursor - CHANGE_LAG
+        self.cursor = timezone.now()
+        rows = (
+            Reminder.objects.filter(updated_at__gte=since)
+            .order_by()
+            .values_list(*SCHEDULE_FIELDS, "is_done", "notified_at")
+        )
+        n = 0
+        for row in rows.iterator(chunk_size=LOAD_CHUNK):
+            n += 1
+            pk, (is_done, notified_at) = row[0], row[-2:]
+            fire = None if is_done or notified_at else _row_fire_at(row[:-2])
+            if fire is None:
+                self.scheduled.pop(pk, None)
+            elif self.scheduled.get(pk) != fire:
+                self._schedule(pk, fire)
+        if len(self.heap) > 2 * len(self.scheduled) + LOAD_CHUNK:
+            self._rebuild()
+        return n
+
+    def _pop_due(self, now):
+        ids = []
+        while self.heap and self.heap[0][0] <= now and len(ids) < self.batch_size:
+            _, pk, fire = heapq.heappop(self.heap)
+            if self.scheduled.get(pk) == fire:
+                del self.scheduled[pk]
+                ids.append(pk)
+        return ids
+
+    def _fire(self, ids, now):
+        reminders = [
+            r for r in self.pending().filter(pk__in=ids, due_at__lte=now).select_related("user")
+            if (fire := fire_at(r)) is not None and fire <= now
+        ]
+        if not reminders:
+            return 0
+        try:
+            sent = set(self.notifier.send(reminders))
+        except Exception:
+            log.exception("Fallo al avisar %d recordatorios; reintento en %s", len(reminders), RETRY_DELAY)
+            for r in reminders:
+                self._schedule(r.pk, fire_at(r), when=now + RETRY_DELAY)
+            return 0
+
+        fired = 0
+        singles = [r.pk for r in reminders if r.pk in sent and not r.recurrence]
+        series = [r for r in reminders if r.pk in sent and r.recurrence]
+        # update()/bulk_update(): no tocan updated_at, así que el aviso no vuelve por el feed de cambios
+        if singles:
+            fired += self.pending().filter(pk__in=singles).update(notified_at=now)
+        if series:
+            for r in series:
+                # la última vencida (si el despachador estuvo parado, las de en medio no se repiten)
+                for dt in occurrences(r, start=fire_at(r), end=now):
+                    r.notified_through = dt
+                nxt = fire_at(r)
+                if nxt is not None:
+                    self._schedule(r.pk, nxt)
+            fired += Reminder.objects.bulk_update(series, ["notified_through"])
+        return fired
+
+    def fire_due(self, now=None):
+        """Avisa de todo lo vencido en lotes de batch_size. Devuelve cuántos se marcaron."""
+        now = now or timezone.now()
+        fired = 0
+        while ids := self._pop_due(now):
+            fired += self._fire(ids, now)
+        return fired
+
+    def seconds_to_wake(self, now, next_poll):
+        wait = next_poll - time.monotonic()
+        if self.heap:
+            wait = min(wait, (self.heap[0][0] - now).total_seconds())
+        return max(wait, 0)
+
+    def run(self, once=False, sleep=time.sleep):
+        log.info("Despachador de recordatorios: %d pendientes", self.load())
+        next_poll = time.monotonic() + self.poll_interval
+        while True:
+            fired = self.fire_due()
+            if fired:
+                log.info("%d recordatorios avisados", fired)
+            if once:
+                return fired
+            if time.monotonic() >= next_poll:
+                close_old_connections()
+                self.poll_changes()
+                next_poll = time.monotonic() + self.poll_interval
+                continue
+            sleep(self.seconds_to_wake(timezone.now(), next_poll))
@@ -0,0 +1,187 @@
+# backend/pedidos/search.py
+"""
+Búsqueda de texto libre (?q=) con índice de verdad, por motor:
+
+- SQLite:      tabla virtual FTS5 "<tabla>_fts" (external content: solo guarda
+               el índice, el texto sigue en la tabla) sincronizada con
+               triggers AFTER INSERT/UPDATE/DELETE. Ranking: bm25().
+- PostgreSQL:  índice GIN sobre to_tsvector('simple', col1 || ' ' || col2 ...).
+               La consulta usa la MISMA expresión para que el planner use el
+               índice. Ranking: ts_rank().
+- Otros:       icontains sobre los campos, sin ranking (fallback).
+
+Cada término es un prefijo y tienen que estar todos ("llam prov" encuentra
+"Llamar proveedor"). SQLite ignora acentos (remove_diacritics); PostgreSQL
+con 'simple' no (haría falta unaccent).
+
+search(queryset, texto) filtra y anota `search_rank` (más alto = mejor), así
+que el scoping por usuario/empresa lo sigue poniendo cada vista en su
+queryset. Para paginar por relevancia: keyset_ordering = SEARCH_ORDERING.
+
+install() es idempotente: lo llaman la migración 0025 y el post_migrate de
+apps.py (tests y benchmarks crean la BD sin migraciones, y SQLite se lleva
+los triggers cuando una migración rehace la tabla).
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+# tabla -> columnas indexadas
+SEARCH_COLUMNS = {
+    "pedidos_pedido": ("excursion", "notas", "bono", "guia", "lugar_entrega", "lugar_recogida"),
+    "pedidos_pedidocrucero": ("supplier", "ship", "sign", "excursion", "emergency_contact", "terminal"),
+    "pedidos_reminder": ("title", "note"),
+}
+SEARCH_ORDERING = ("-search_rank", "-id")
+PG_CONFIG = "simple"
+MAX_TERMS = 8
+
+_TERM = re.compile(r"[^\W_]+")
+
+
+def terms(text):
+    """Términos de búsqueda (solo letras/dígitos: nada que escapar en MATCH / tsquery)."""
+    return _TERM.findall(text or "")[:MAX_TERMS]
+
+
+# ---------------------------------------------------------
+# SQLite (FTS5)
+# ---------------------------------------------------------
+
+def _fts(table):
+    return f"{table}_fts"
+
+
+def _sqlite_ddl(table, columns):
+    fts = _fts(table)
+    cols = ", ".join(columns)
+    new = ", ".join(f"new.{c}" for c in columns)
+    old = ", ".join(f"old.{c}" for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, "
+        f"content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+        # solo si cambia alguna columna indexada (bulk_apply de estado no lo dispara)
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+    ]
+
+
+def _sqlite_match(text):
+    return " ".join(f'"{t}"*' for t in terms(text))
+
+
+def _sqlite_search(queryset, table, text):
+    # JOIN con la tabla FTS (extra: el ORM no sabe unir tablas sin modelo): SQLite
+    # recorre solo las coincidencias del índice y calcula bm25 una vez por fila.
+    # Con una subconsulta correlada por fila era O(coincidencias²).
+    fts = _fts(table)
+    return queryset.extra(
+        tables=[fts],
+        where=[f'{fts}.rowid = "{table}"."id"', f"{fts} MATCH %s"],
+        params=[_sqlite_match(text)],
+    ).annotate(
+        # bm25: más negativo = mejor -> se invierte
+        search_rank=RawSQL(f"-bm25({fts})", (), output_field=FloatField()),
+    )
+
+
+# ---------------------------------------------------------
+# PostgreSQL (tsvector + GIN)
+# ---------------------------------------------------------
+
+def _pg_vector(table, columns, qualified=True):
+    prefix = f'"{table}".' if qualified else ""
+    body = " || ' ' || ".join(f"coalesce({prefix}\"{c}\", '')" for c in columns)
+    return f"to_tsvector('{PG_CONFIG}', {body})"
+
+
+def _pg_ddl(table, columns):
+    return [
+        f"CREATE INDEX IF NOT EXISTS {table}_fts ON {table} "
+        f"USING GIN (({_pg_vector(table, columns, qualified=False)}))",
+    ]
+
+
+def _pg_query(text):
+    return " & ".join(f"{t}:*" for t in terms(text))
+
+
+def _pg_search(queryset, table, text):
+    vector = _pg_vector(table, SEARCH_COLUMNS[table])
+    query = (_pg_query(text),)
+    return queryset.filter(
+        RawSQL(f"{vector} @@ to_tsquery('{PG_CONFIG}', %s)", query, output_field=BooleanField()),
+    ).annotate(
+        # ts_rank es float4: sin pasarlo a float8 el valor que vuelve en el cursor
+        # (decimal más corto) no es igual al de la fila y el keyset repite/salta empates
+        search_rank=RawSQL(
+            f"ts_rank({vector}, to_tsquery('{PG_CONFIG}', %s))::float8", query, output_field=FloatField(),
+        ),
+    )
+
+
+def _fallback_search(queryset, table, text):
+    q = Q()
+    for term in terms(text):
+        q &= Q(*(Q(**{f"{c}__icontains": term}) for c in SEARCH_COLUMNS[table]), _connector=Q.OR)
+    return queryset.filter(q).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+# ---------------------------------------------------------
+# API
+# ---------------------------------------------------------
+
+# vendor -> (DDL de índices, búsqueda)
+_BACKENDS = {
+    "sqlite": (_sqlite_ddl, _sqlite_search),
+    "postgresql": (_pg_ddl, _pg_search),
+}
+
+
+def install(connection):
+    """Crea índices/triggers que falten (y rellena los FTS5 recién creados)."""
+    backend = _BACKENDS.get(connection.vendor)
+    if backend is None:
+        return
+    ddl = backend[0]
+    with connection.cursor() as cursor:
+        existing = set(connection.introspection.table_names(cursor))
+        for table, columns in SEARCH_COLUMNS.items():
+            if table not in existing:
+                continue
+            is_new = connection.vendor == "sqlite" and _fts(table) not in existing
+            for sql in ddl(table, columns):
+                cursor.execute(sql)
+            if is_new:
+                cursor.execute(f"INSERT INTO {_fts(table)}({_fts(table)}) VALUES ('rebuild')")
+
+
+def uninstall(connection):
+    with connection.cursor() as cursor:
+        for table in SEARCH_COLUMNS:
+            if connection.vendor == "sqlite":
+                for suffix in ("ai", "ad", "au"):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {_fts(table)}_{suffix}")
+                cursor.execute(f"DROP TABLE IF EXISTS {_fts(table)}")
+            elif connection.vendor == "postgresql":
+                cursor.execute(f"DROP INDEX IF EXISTS {_fts(table)}")
+
+
+def search(queryset, text):
+    """
+    `queryset` filtrado por `text` y anotado con search_rank. Sin términos
+    útiles -> vacío.
+    """
+    if not terms(text):
+        return queryset.none()
+    table = queryset.model._meta.db_table
+    backend = _BACKENDS.get(connections[queryset.db].vendor)
+    run = backend[1] if backend else _fallback_search
+    return run(queryset, table, text)
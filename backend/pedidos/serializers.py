@@ -5,12 +5,15 @@ from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.utils.dateparse import parse_datetime
 from django.utils import timezone  # ← NECESARIO para validate_due_at
 
+from .auth import add_claims
 from .models import (
     Pedido,
+    PedidoEvent,
     PedidoCrucero,
     Empresa,
     CustomUser,
     Reminder,
+    ManifestJob,
 )
 
 User = get_user_model()
@@ -36,6 +39,11 @@ class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
     email = serializers.EmailField()
     password = serializers.CharField(style={"input_type": "password"}, write_only=True)
 
+    @classmethod
+    def get_token(cls, user):
+        # claims para autenticar las lecturas sin ir a la BD (auth.py)
+        return add_claims(super().get_token(user), user)
+
     def validate(self, attrs):
         email = attrs.get("email")
         password = attrs.get("password")
@@ -65,15 +73,18 @@ class PedidoSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Pedido
-        fields = "__all__"
-        read_only_fields = ["id", "fecha_creacion", "fecha_modificacion", "updates"]
+        # el historial va aparte: /api/ops/pedidos/{id}/history/;
+        # fecha_fin_efectiva es interna (filtros de solape)
+        exclude = ["updates", "fecha_fin_efectiva"]
+        read_only_fields = ["id", "fecha_creacion", "fecha_modificacion"]
 
     def create(self, validated_data):
         request = self.context["request"]
         validated_data["user"] = request.user
-        validated_data["empresa"] = (
-            request.user.empresa
-        )  # si CustomUser.empresa fuese FK, ajusta a request.user.empresa_id
+        # la empresa del usuario manda sobre la del payload
+        if request.user.empresa_id:
+            validated_data.pop("empresa", None)
+            validated_data["empresa_id"] = request.user.empresa_id
         return super().create(validated_data)
 
     def update(self, instance, validated_data):
@@ -141,21 +152,116 @@ class PedidoOpsSerializer(serializers.ModelSerializer):
                 )
             return attrs
 
-        # No-staff: resolver Empresa por nombre (CustomUser.empresa es CharField)
-        nombre = (getattr(user, "empresa", "") or "").strip()
-        if not nombre:
+        # No-staff: la empresa es la FK del usuario (sin consulta extra)
+        if not user.empresa_id:
             raise serializers.ValidationError(
                 {"empresa": "Tu usuario no tiene empresa asignada."}
             )
 
-        try:
-            empresa_obj = Empresa.objects.get(nombre=nombre)
-        except Empresa.DoesNotExist:
-            raise serializers.ValidationError(
-                {"empresa": f"No existe Empresa con nombre '{nombre}' asociada a tu usuario."}
-            )
+        attrs.pop("empresa", None)
+        attrs["empresa_id"] = user.empresa_id
+        return attrs
+
+
+class PedidoEventSerializer(serializers.ModelSerializer):
+    # mismas claves que las entradas del antiguo Pedido.updates
+    user_id = serializers.IntegerField(read_only=True)
+    user = serializers.CharField(source="user_label", read_only=True)
+
+    class Meta:
+        model = PedidoEvent
+        fields = ["id", "ts", "event", "user_id", "user", "note"]
+
+
+# ====== OPS (Operaciones masivas) ======
+class PedidoBulkPatchSerializer(serializers.Serializer):
+    guia = serializers.CharField(max_length=150, required=False, allow_blank=True)
+    lugar_entrega = serializers.CharField(max_length=150, required=False, allow_blank=True)
+    estado = serializers.ChoiceField(choices=Pedido.ESTADOS, required=False)
+
+
+class PedidoBulkSerializer(serializers.Serializer):
+    """
+    {
+        "ids": [1, 2, 3],
+        "action": "delivered" | "collected" | "update",
+        "patch": {"guia": "...", "lugar_entrega": "...", "estado": "..."},  # solo action=update
+        "note": "texto libre"                                               # opcional
+    }
+    """
+    ACTIONS = ("delivered", "collected", "update")
+    MAX_IDS = 1000
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_IDS,
+    )
+    action = serializers.ChoiceField(choices=ACTIONS)
+    patch = PedidoBulkPatchSerializer(required=False)
+    note = serializers.CharField(required=False, allow_blank=True)
+
+    def validate(self, attrs):
+        patch = attrs.get("patch") or {}
+        if attrs["action"] == "update" and not patch:
+            raise serializers.ValidationError({"patch": "Indica al menos un campo (guia, lugar_entrega, estado)."})
+        if attrs["action"] != "update" and patch:
+            raise serializers.ValidationError({"patch": "Solo se admite con action=update."})
+        # ids únicos conservando el orden
+        attrs["ids"] = list(dict.fromkeys(attrs["ids"]))
+        return attrs
+
+
+# ====== Alta masiva (BulkPedidos, ver pedidos/pedido_batch.py) ======
+class EmpresaRefField(serializers.Field):
+    """
+    Empresa por id (12 o "12") o por nombre. No consulta nada: la referencia
+    se resuelve después, de una vez para todo el lote.
+    """
+    default_error_messages = {"invalid": "Indica el id o el nombre de la empresa."}
+
+    def to_internal_value(self, data):
+        if isinstance(data, int) and not isinstance(data, bool) and data > 0:
+            return data
+        if isinstance(data, str) and data.strip():
+            data = data.strip()
+            return int(data) if data.isdigit() else data
+        self.fail("invalid")
+
+    def to_representation(self, value):
+        return value
+
+
+class PedidoBatchRowSerializer(serializers.ModelSerializer):
+    """Una fila del alta masiva. Valida sin tocar la BD."""
+    empresa = EmpresaRefField(required=False)
+    fecha_inicio = DateOrDateTimeToDateField()
+    fecha_fin = DateOrDateTimeToDateField(required=False, allow_null=True)
+    emisores = EmptyToNoneIntegerField(required=False, allow_null=True, min_value=0)
+
+    class Meta:
+        model = Pedido
+        fields = (
+            "empresa",
+            "excursion",
+            "estado",
+            "tipo_servicio",
+            "lugar_entrega",
+            "lugar_recogida",
+            "fecha_inicio",
+            "fecha_fin",
+            "pax",
+            "bono",
+            "guia",
+            "emisores",
+            "notas",
+        )
 
-        attrs["empresa"] = empresa_obj
+    def validate(self, attrs):
+        fi = attrs.get("fecha_inicio")
+        ff = attrs.get("fecha_fin")
+        if ff and fi and ff < fi:
+            raise serializers.ValidationError({"fecha_fin": "Debe ser >= fecha_inicio."})
         return attrs
 
 
@@ -243,6 +349,17 @@ class PedidoCruceroSerializer(serializers.ModelSerializer):
         return attrs
 
 
+# ====== Cruceros (subidas async, ver pedidos/jobs.py) ======
+class ManifestJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ManifestJob
+        fields = [
+            "id", "status", "groups_total", "groups_done", "attempts", "result", "errors",
+            "created_at", "started_at", "finished_at", "updated_at",
+        ]
+        read_only_fields = fields
+
+
 # ====== Reminders ======
 class ReminderSerializer(serializers.ModelSerializer):
     """
@@ -253,6 +370,9 @@ class ReminderSerializer(serializers.ModelSerializer):
     Inyecta 'user' si el modelo tiene ese FK.
     """
 
+    # True en las ocurrencias generadas de una serie (id = el de la serie)
+    is_occurrence = serializers.SerializerMethodField()
+
     class Meta:
         model = Reminder
         fields = "__all__"
@@ -284,7 +404,8 @@ class ReminderSerializer(serializers.ModelSerializer):
             self.fields["user"] = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
         # Marcar algunos como solo-lectura si existen
-        for ro in ("id", "created_at", "done_at"):
+        for ro in ("id", "created_at", "done_at", "notified_at", "notified_through", "updated_at",
+                   "recurrence_exceptions"):
             if ro in self.fields:
                 self.fields[ro].read_only = True
 
@@ -333,8 +454,16 @@ class ReminderSerializer(serializers.ModelSerializer):
             dt = attrs[self.real_due_field]
             if dt < timezone.now():
                 raise serializers.ValidationError({self.real_due_field: "No puede ser en el pasado."})
+
+        until = attrs.get("recurrence_until")
+        due = attrs.get(self.real_due_field) or getattr(self.instance, "due_at", None)
+        if until and due and until < due:
+            raise serializers.ValidationError({"recurrence_until": "Debe ser posterior a due_at."})
         return attrs
 
+    def get_is_occurrence(self, obj):
+        return getattr(obj, "is_occurrence", False)
+
     def create(self, validated_data):
         # Inyectar user si existe en el modelo y no vino (HiddenField suele cubrirlo)
         if "user" in self._fields_in_model and "user" not in validated_data:
@@ -342,3 +471,17 @@ class ReminderSerializer(serializers.ModelSerializer):
             if req and getattr(req, "user", None) and req.user.is_authenticated:
                 validated_data["user"] = req.user
         return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        # Nueva fecha -> hay que volver a avisar (pedidos/reminders.py)
+        due = self.real_due_field
+        if due and due in validated_data and validated_data[due] != getattr(instance, due):
+            validated_data["notified_at"] = None
+            validated_data["notified_through"] = None
+        # Serie con otras fechas: las ocurrencias saltadas ya no casan
+        if any(
+            f in validated_data and validated_data[f] != getattr(instance, f)
+            for f in (due, "recurrence", "recurrence_interval") if f
+        ):
+            validated_data["recurrence_exceptions"] = []
+        return super().update(instance, validated_data)
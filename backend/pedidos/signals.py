@@ -0,0 +1,138 @@
+# backend/pedidos/signals.py
+"""
+Efectos secundarios de escribir modelos fila a fila (save/delete):
+
+- invalidación de la caché de respuestas (pedidos/cache.py)
+- deltas del resumen diario de pedidos (pedidos/stats.py)
+- revocación de los JWT de un usuario (token_version, pedidos/auth.py)
+
+Los caminos masivos que no disparan señales (bulk_create, bulk_update,
+QuerySet.update) lo hacen a mano: merge_groups, crucero_merge.create_pedidos,
+Pedido.bulk_apply, Pedido.bulk_insert.
+
+Para saber qué había antes, en pre_save se lee la fila anterior (una consulta
+por pk, con select_for_update: dos transiciones concurrentes del mismo pedido
+no pueden restar dos veces del mismo estado). Los save con update_fields que
+no tocan ningún campo relevante se ahorran esa consulta. En delete igual:
+la instancia puede estar desfasada (p. ej. tras un bulk_apply), así que se
+resta lo que hay en BD, no lo que hay en memoria.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .auth import REVOKING_FIELDS, publish_version
+from .cache import crucero_tags, empresa_tags, invalidate, pedido_tags
+from .models import Empresa, Pedido, PedidoCrucero
+from .stats import SUMMARY_SOURCE_FIELDS, pedido_row, record_change
+
+PEDIDO_TRACKED_FIELDS = ("user", *SUMMARY_SOURCE_FIELDS)
+CRUCERO_GROUP_FIELDS = ("service_date", "ship")
+
+
+def _previous_row(sender, instance, update_fields, fields, lock=False):
+    """Valores en BD antes del save (dict), o None si es alta / no hace falta."""
+    if instance.pk is None:
+        return None
+    if update_fields is not None and not {f.removesuffix("_id") for f in update_fields} & set(fields):
+        return None
+    qs = sender.objects.filter(pk=instance.pk)
+    if lock:
+        qs = qs.select_for_update()
+    return qs.values(*fields).first()
+
+
+@receiver(pre_save, sender=Pedido)
+def pedido_before_save(sender, instance, update_fields=None, **kwargs):
+    # Pedido.save() abre transacción, así que select_for_update es válido
+    instance._previous_row = _previous_row(
+        sender, instance, update_fields, PEDIDO_TRACKED_FIELDS, lock=True,
+    )
+
+
+@receiver(pre_save, sender=PedidoCrucero)
+def crucero_before_save(sender, instance, update_fields=None, **kwargs):
+    instance._previous_row = _previous_row(sender, instance, update_fields, CRUCERO_GROUP_FIELDS)
+
+
+@receiver(pre_save, sender=get_user_model())
+def user_before_save(sender, instance, update_fields=None, **kwargs):
+    instance._previous_row = _previous_row(sender, instance, update_fields, REVOKING_FIELDS)
+
+
+@receiver(post_save, sender=get_user_model())
+def user_saved(sender, instance, **kwargs):
+    old = getattr(instance, "_previous_row", None)
+    instance._previous_row = None
+    if old is None:
+        return
+    current = {f: getattr(instance, instance._meta.get_field(f).attname) for f in REVOKING_FIELDS}
+    if current != old:
+        # UPDATE aparte: con save(update_fields=...) token_version no se guardaría
+        sender.objects.filter(pk=instance.pk).update(token_version=F("token_version") + 1)
+        instance.token_version += 1
+        publish_version(instance.pk)
+
+
+@receiver(post_delete, sender=get_user_model())
+def user_deleted(sender, instance, **kwargs):
+    publish_version(instance.pk, deleted=True)
+
+
+@receiver([post_save, post_delete], sender=Empresa)
+def empresa_changed(sender, instance, **kwargs):
+    invalidate(*empresa_tags(instance.pk))
+
+
+@receiver(post_save, sender=Pedido)
+def pedido_saved(sender, instance, created, update_fields=None, **kwargs):
+    old = getattr(instance, "_previous_row", None)
+    instance._previous_row = None
+    invalidate(
+        *pedido_tags(instance.empresa_id, instance.user_id),
+        *(pedido_tags(old["empresa"], old["user"]) if old else ()),
+    )
+    if created:
+        record_change(new=pedido_row(instance))
+    elif old is not None:
+        new = pedido_row(instance)
+        if update_fields is not None:
+            # lo que no se ha guardado sigue como estaba en BD
+            saved = {f.removesuffix("_id") for f in update_fields}
+            new = {f: (new[f] if f in saved else old[f]) for f in new}
+        record_change(old=old, new=new)
+
+
+def _empresa_cascade(origin):
+    # al borrar una empresa su resumen se va en cascada: no hay nada que restar
+    return getattr(origin, "model", type(origin)) is Empresa
+
+
+@receiver(pre_delete, sender=Pedido)
+def pedido_before_delete(sender, instance, origin=None, **kwargs):
+    instance._previous_row = None
+    if not _empresa_cascade(origin):
+        instance._previous_row = _previous_row(sender, instance, None, PEDIDO_TRACKED_FIELDS, lock=True)
+
+
+@receiver(post_delete, sender=Pedido)
+def pedido_deleted(sender, instance, origin=None, **kwargs):
+    old = getattr(instance, "_previous_row", None)
+    instance._previous_row = None
+    invalidate(
+        *pedido_tags(instance.empresa_id, instance.user_id),
+        *(pedido_tags(old["empresa"], old["user"]) if old else ()),
+    )
+    if old is not None:
+        record_change(old=old)
+
+
+@receiver([post_save, post_delete], sender=PedidoCrucero)
+def crucero_changed(sender, instance, **kwargs):
+    old = getattr(instance, "_previous_row", None)
+    instance._previous_row = None
+    invalidate(
+        *crucero_tags(instance.service_date, instance.ship),
+        *(crucero_tags(old["service_date"], old["ship"]) if old else ()),
+    )
@@ -0,0 +1,251 @@
+# backend/pedidos/stats.py
+"""
+Resumen diario de pedidos (PedidoDailySummary) mantenido por deltas.
+
+Cada escritura de Pedido se traduce en deltas (pedidos, pax, emisores) sobre
+la clave (fecha_inicio, empresa, tipo_servicio, estado):
+
+    alta        -> +1 en la clave nueva
+    baja        -> -1 en la clave vieja
+    cambio      -> -1 en la vieja, +1 en la nueva (o solo ±pax si la clave no cambia)
+
+y se aplican todas a la vez con INSERT ... ON CONFLICT (clave) DO UPDATE SET
+pedidos = pedidos + excluded.pedidos (PostgreSQL y SQLite >= 3.24), por
+lotes: la suma la hace la BD, así dos escrituras concurrentes nunca se pisan
+y una importación de temporada entera son unas pocas sentencias, no una por
+clave.
+
+Quién llama a esto:
+- signals.py          save() / delete() de Pedido (y set_delivered/collected)
+- Pedido.bulk_apply   UPDATE masivo
+- crucero_merge       bulk_create de pedidos de crucero
+- Pedido.bulk_insert  alta masiva (BulkPedidos)
+- rebuild()           reparación completa o por rango (manage.py rebuild_daily_summary)
+
+Todo dentro de la misma transacción que la escritura del pedido.
+"""
+from collections import defaultdict
+from datetime import date
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+from rest_framework.exceptions import ValidationError
+
+from .models import Pedido, PedidoDailySummary
+
+# campos de Pedido que mueven el resumen
+SUMMARY_SOURCE_FIELDS = ("fecha_inicio", "empresa", "tipo_servicio", "estado", "pax", "emisores")
+REBUILD_BATCH = 1000
+# parámetros por sentencia donde el backend no fija límite (PostgreSQL: 65535)
+MAX_QUERY_PARAMS = 65535
+# dimensiones por las que se puede agrupar en /api/ops/stats/
+GROUP_FIELDS = ("dia", "empresa", "tipo_servicio", "estado")
+
+
+def _key(row):
+    return (row["fecha_inicio"], row["empresa"], row["tipo_servicio"], row["estado"])
+
+
+def pedido_row(pedido):
+    """Dict con los SUMMARY_SOURCE_FIELDS de una instancia (empresa como id)."""
+    return {
+        "fecha_inicio": pedido.fecha_inicio,
+        "empresa": pedido.empresa_id,
+        "tipo_servicio": pedido.tipo_servicio,
+        "estado": pedido.estado,
+        "pax": pedido.pax,
+        "emisores": pedido.emisores,
+    }
+
+
+def add_delta(deltas, old=None, new=None):
+    """Acumula en `deltas` el efecto de pasar de `old` a `new` (dicts o None)."""
+    if old is not None:
+        d = deltas[_key(old)]
+        d[0] -= 1
+        d[1] -= old["pax"] or 0
+        d[2] -= old["emisores"] or 0
+    if new is not None:
+        d = deltas[_key(new)]
+        d[0] += 1
+        d[1] += new["pax"] or 0
+        d[2] += new["emisores"] or 0
+    return deltas
+
+
+def new_deltas():
+    return defaultdict(lambda: [0, 0, 0])
+
+
+def _sort_key(item):
+    # fecha_inicio puede venir como date o como str (instancias sin refrescar)
+    return tuple(str(v) for v in item[0])
+
+
+def _upsert_sql(rows):
+    meta = PedidoDailySummary._meta
+    qn = connection.ops.quote_name
+    table = qn(meta.db_table)
+    keys = [qn(meta.get_field(f).column) for f in ("dia", "empresa", "tipo_servicio", "estado")]
+    sums = [qn(f) for f in ("pedidos", "pax", "emisores")]
+    placeholders = "({})".format(", ".join(["%s"] * (len(keys) + len(sums))))
+    return (
+        f"INSERT INTO {table} ({', '.join(keys + sums)}) VALUES {', '.join([placeholders] * rows)} "
+        f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET "
+        + ", ".join(f"{c} = {table}.{c} + excluded.{c}" for c in sums)
+    )
+
+
+def apply_deltas(deltas):
+    """Todas las claves con INSERT ... ON CONFLICT DO UPDATE (suma), por lotes."""
+    params = [
+        [connection.ops.adapt_datefield_value(dia), empresa_id, tipo, estado, n, pax, emisores]
+        # orden fijo: dos transacciones con claves comunes las bloquean en el mismo orden
+        for (dia, empresa_id, tipo, estado), (n, pax, emisores) in sorted(deltas.items(), key=_sort_key)
+        if (n or pax or emisores) and dia is not None and empresa_id is not None
+    ]
+    if not params:
+        return
+    batch = max(1, (connection.features.max_query_params or MAX_QUERY_PARAMS) // len(params[0]))
+    with connection.cursor() as cursor:
+        for start in range(0, len(params), batch):
+            lote = params[start:start + batch]
+            cursor.execute(_upsert_sql(len(lote)), [v for row in lote for v in row])
+
+
+def record_change(old=None, new=None):
+    apply_deltas(add_delta(new_deltas(), old, new))
+
+
+def record_created(pedidos):
+    """Pedidos recién creados con bulk_create (sin señales)."""
+    deltas = new_deltas()
+    for p in pedidos:
+        add_delta(deltas, new=pedido_row(p))
+    apply_deltas(deltas)
+
+
+# ---------------------------------------------------------
+# Reconstrucción (reparación)
+# ---------------------------------------------------------
+
+def rebuild(desde=None, hasta=None):
+    """
+    Regenera el resumen desde Pedido (entero o para fecha_inicio en
+    [desde, hasta]). Bloquea las filas del rango mientras dura: lanzarlo con
+    poco tráfico. Devuelve el nº de filas de resumen escritas.
+    """
+    summary = PedidoDailySummary.objects.all()
+    pedidos = Pedido.objects.all()
+    if desde:
+        summary = summary.filter(dia__gte=desde)
+        pedidos = pedidos.filter(fecha_inicio__gte=desde)
+    if hasta:
+        summary = summary.filter(dia__lte=hasta)
+        pedidos = pedidos.filter(fecha_inicio__lte=hasta)
+
+    rows = (
+        pedidos.order_by()
+        .values("fecha_inicio", "empresa_id", "tipo_servicio", "estado")
+        .annotate(n=Count("id"), total_pax=Coalesce(Sum("pax"), 0), total_emisores=Coalesce(Sum("emisores"), 0))
+    )
+    written = 0
+    with transaction.atomic():
+        summary.delete()
+        batch = []
+        for r in rows.iterator(chunk_size=REBUILD_BATCH):
+            batch.append(PedidoDailySummary(
+                dia=r["fecha_inicio"],
+                empresa_id=r["empresa_id"],
+                tipo_servicio=r["tipo_servicio"],
+                estado=r["estado"],
+                pedidos=r["n"],
+                pax=r["total_pax"],
+                emisores=r["total_emisores"],
+            ))
+            if len(batch) >= REBUILD_BATCH:
+                PedidoDailySummary.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            PedidoDailySummary.objects.bulk_create(batch)
+            written += len(batch)
+    return written
+
+
+# ---------------------------------------------------------
+# Dashboard (/api/ops/stats/)
+# ---------------------------------------------------------
+
+def _parse_date(params, name):
+    raw = params.get(name)
+    if not raw:
+        return None
+    try:
+        return date.fromisoformat(raw)
+    except ValueError:
+        raise ValidationError({name: "Fecha inválida. Usa YYYY-MM-DD."})
+
+
+def summary_queryset(user, params):
+    """Resumen filtrado; no-staff solo ve su empresa."""
+    qs = PedidoDailySummary.objects.all()
+    if not user.is_staff:
+        qs = qs.filter(empresa_id=user.empresa_id) if user.empresa_id else qs.none()
+    elif params.get("empresa"):
+        try:
+            qs = qs.filter(empresa_id=int(params["empresa"]))
+        except ValueError:
+            raise ValidationError({"empresa": "Debe ser un id numérico."})
+
+    desde = _parse_date(params, "desde")
+    hasta = _parse_date(params, "hasta")
+    if desde:
+        qs = qs.filter(dia__gte=desde)
+    if hasta:
+        qs = qs.filter(dia__lte=hasta)
+    for name in ("tipo_servicio", "estado"):
+        if params.get(name):
+            qs = qs.filter(**{name: params[name]})
+    return qs
+
+
+def summary_stats(user, params):
+    """
+    {"group_by": [...], "results": [{<dims>, pedidos, pax, emisores}], "totals": {...}}
+    Agrupa por ?group_by=dia,empresa,tipo_servicio,estado (cualquier subconjunto).
+    """
+    raw = params.get("group_by")
+    group_by = [g.strip() for g in raw.split(",") if g.strip()] if raw else list(GROUP_FIELDS)
+    unknown = [g for g in group_by if g not in GROUP_FIELDS]
+    if unknown:
+        raise ValidationError({"group_by": f"No soportado: {', '.join(unknown)}. Usa: {', '.join(GROUP_FIELDS)}."})
+    group_by = list(dict.fromkeys(group_by))
+
+    qs = summary_queryset(user, params)
+    sums = {
+        "total_pedidos": Coalesce(Sum("pedidos"), 0),
+        "total_pax": Coalesce(Sum("pax"), 0),
+        "total_emisores": Coalesce(Sum("emisores"), 0),
+    }
+    results = []
+    if group_by:
+        rows = (
+            qs.values(*group_by).annotate(**sums)
+            .filter(total_pedidos__gt=0).order_by(*group_by)
+        )
+        for r in rows:
+            item = {g: r[g] for g in group_by}
+            item.update(pedidos=r["total_pedidos"], pax=r["total_pax"], emisores=r["total_emisores"])
+            results.append(item)
+    totals = qs.aggregate(**sums)
+    return {
+        "group_by": group_by,
+        "results": results,
+        "totals": {
+            "pedidos": totals["total_pedidos"],
+            "pax": totals["total_pax"],
+            "emisores": totals["total_emisores"],
+        },
+    }
@@ -1,7 +1,19 @@
+import json
+
 from django.contrib.auth import get_user_model
-from .models import Empresa, Pedido
+from django.core.cache import cache
+from .models import Empresa, Pedido, PedidoCrucero, Reminder
 from django.utils import timezone
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import include, path
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# urlconf de AsyncReadPathTest: camino async (como bajo ASGI) delante del de siempre
+urlpatterns = [
+    path("api/", include("pedidos.async_urls")),
+    path("api/", include("pedidos.api_urls")),
+]
 
 
 class PedidoModelTest(TestCase):
@@ -11,7 +23,7 @@ class PedidoModelTest(TestCase):
             username="tester",
             email="tester@example.com",
             password="pass",
-            empresa="Acme",
+            empresa=empresa,
         )
         pedido = Pedido.objects.create(
             user=user,
@@ -21,3 +33,1678 @@ class PedidoModelTest(TestCase):
             pax=1,
         )
         self.assertIn("Pedido", str(pedido))
+
+
+class ApiTestCase(TestCase):
+    """Base: empresa + usuario no-staff autenticado en self.client."""
+
+    def setUp(self):
+        # la caché (LocMem) sobrevive al rollback de cada test
+        cache.clear()
+        self.empresa = Empresa.objects.create(nombre="Acme")
+        self.user = get_user_model().objects.create_user(
+            username="ops",
+            email="ops@example.com",
+            password="pass",
+            empresa=self.empresa,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class KeysetPaginationTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(7):
+            Pedido.objects.create(
+                user=self.user,
+                empresa=self.empresa,
+                fecha_inicio=timezone.now().date(),
+                pax=i + 1,
+            )
+
+    def test_recorre_todas_las_paginas_sin_solapes(self):
+        ids = []
+        url = "/api/ops/pedidos/?page_size=3"
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, 200)
+            self.assertNotIn("count", res.data)
+            ids.extend(p["id"] for p in res.data["results"])
+            url = res.data["next"]
+        esperado = list(
+            Pedido.objects.order_by("-fecha_creacion", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual(ids, esperado)
+
+    def test_previous_devuelve_la_pagina_anterior(self):
+        first = self.client.get("/api/ops/pedidos/?page_size=3").data
+        second = self.client.get(first["next"]).data
+        back = self.client.get(second["previous"]).data
+        self.assertEqual(
+            [p["id"] for p in back["results"]],
+            [p["id"] for p in first["results"]],
+        )
+        self.assertIsNone(back["previous"])
+
+    def test_cursor_invalido(self):
+        res = self.client.get("/api/ops/pedidos/?cursor=basura")
+        self.assertEqual(res.status_code, 404)
+
+    def test_mis_pedidos_paginado(self):
+        res = self.client.get("/api/mis-pedidos/?page_size=5")
+        self.assertEqual(len(res.data["results"]), 5)
+        self.assertIsNotNone(res.data["next"])
+
+
+class StreamingExportTest(ApiTestCase):
+    def _body(self, res):
+        return b"".join(res.streaming_content).decode("utf-8")
+
+    def test_cruceros_csv_respeta_ordering(self):
+        for sign in ("B2", "B1", "B3"):
+            PedidoCrucero.objects.create(
+                supplier="Sup", service_date="2025-06-01", ship="Costa",
+                sign=sign, excursion="City", pax=10, status="final",
+            )
+        res = self.client.get("/api/pedidos/cruceros/bulk/?export=csv&ordering=sign")
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.streaming)
+        lines = self._body(res).strip().splitlines()
+        self.assertTrue(lines[0].startswith("id,printing_date,supplier"))
+        self.assertEqual([line.split(",")[6] for line in lines[1:]], ["B1", "B2", "B3"])
+
+    def test_ops_ndjson_aplica_filtros(self):
+        for estado in ("pagado", "entregado", "pagado"):
+            Pedido.objects.create(
+                user=self.user, empresa=self.empresa, estado=estado,
+                fecha_inicio=timezone.now().date(), pax=2,
+            )
+        res = self.client.get("/api/ops/pedidos/?export=ndjson&estado=pagado")
+        rows = [json.loads(line) for line in self._body(res).splitlines()]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual({r["estado"] for r in rows}, {"pagado"})
+        self.assertEqual(rows[0]["empresa"], self.empresa.id)
+
+    def test_formato_desconocido(self):
+        res = self.client.get("/api/ops/pedidos/?export=xlsx")
+        self.assertEqual(res.status_code, 400)
+
+
+class CruceroMergeTest(ApiTestCase):
+    URL = "/api/pedidos/cruceros/bulk/"
+
+    def _upload(self, rows, status="final"):
+        meta = {"service_date": "2025-06-01", "ship": "Costa", "status": status, "supplier": "Sup"}
+        return self.client.post(self.URL, {"meta": meta, "rows": rows}, format="json")
+
+    def test_resubida_solo_toca_lo_que_cambia(self):
+        rows = [
+            {"sign": "B1", "excursion": "City", "pax": 10},
+            {"sign": "B2", "excursion": "Beach", "pax": 20},
+            {"sign": "B3", "excursion": "Wine", "pax": 30},
+        ]
+        self._upload(rows)
+        ids_antes = dict(PedidoCrucero.objects.values_list("sign", "id"))
+
+        res = self._upload([
+            {"sign": "B1", "excursion": "City", "pax": 10},     # igual
+            {"sign": "B2", "excursion": "Beach", "pax": 25},    # cambia
+            {"sign": "B4", "excursion": "Tapas", "pax": 5},     # nueva
+        ])                                                      # B3 desaparece
+        self.assertEqual(res.status_code, 201)
+        for key, value in {"unchanged": 1, "updated": 1, "inserted": 1, "removed": 1,
+                           "created": 3, "overwritten": 3}.items():
+            self.assertEqual(res.data[key], value, key)
+
+        ids_despues = dict(PedidoCrucero.objects.values_list("sign", "id"))
+        self.assertEqual(ids_despues["B1"], ids_antes["B1"])
+        self.assertEqual(ids_despues["B2"], ids_antes["B2"])
+        self.assertNotIn("B3", ids_despues)
+        self.assertEqual(PedidoCrucero.objects.get(sign="B2").pax, 25)
+
+    def test_sign_repetido_cuenta_una_vez(self):
+        res = self._upload([
+            {"sign": "B1", "excursion": "City", "pax": 10},
+            {"sign": "B1", "excursion": "City", "pax": 12},  # gana la última
+            {"sign": "B2", "excursion": "Beach", "pax": 20},
+        ])
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual((res.data["created"], res.data["inserted"]), (2, 2))
+        self.assertEqual(PedidoCrucero.objects.get(sign="B1").pax, 12)
+
+    def test_preliminary_no_pisa_final(self):
+        self._upload([{"sign": "B1", "excursion": "City", "pax": 10}], status="final")
+        res = self._upload([{"sign": "B1", "excursion": "City", "pax": 99}], status="preliminary")
+        self.assertEqual(res.data["blocked"], 1)
+        self.assertEqual(res.data["updated"], 0)
+        self.assertEqual(PedidoCrucero.objects.get(sign="B1").pax, 10)
+
+
+class PedidoEventTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pedido = Pedido.objects.create(
+            user=self.user, empresa=self.empresa,
+            fecha_inicio=timezone.now().date(), pax=10,
+        )
+
+    def test_transiciones_insertan_eventos(self):
+        self.pedido.set_delivered(user=self.user, delivered_pax=8, override_pax=True)
+        self.pedido.set_collected(user=self.user, note="ok")
+        events = list(self.pedido.events.values_list("event", flat=True))
+        self.assertEqual(events, ["created", "delivered", "collected"])
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.pax, 8)
+        self.assertEqual(self.pedido.updates, [])
+
+    def test_history_paginado(self):
+        for _ in range(3):
+            self.client.post(f"/api/ops/pedidos/{self.pedido.id}/collected/", {"note": "x"}, format="json")
+        res = self.client.get(f"/api/ops/pedidos/{self.pedido.id}/history/?page_size=2")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([e["event"] for e in res.data["results"]], ["collected", "collected"])
+        self.assertEqual(res.data["results"][0]["user"], "ops")
+        res = self.client.get(res.data["next"])
+        self.assertEqual([e["event"] for e in res.data["results"]], ["collected", "created"])
+
+    def test_backfill_desde_updates(self):
+        import importlib
+        from django.apps import apps
+
+        migration = importlib.import_module("pedidos.migrations.0018_backfill_pedido_events")
+        Pedido.objects.filter(pk=self.pedido.pk).update(updates=[
+            {"ts": "2025-01-01T10:00:00+00:00", "event": "created"},
+            {"ts": "2025-01-02T10:00:00+00:00", "event": "delivered", "user_id": self.user.pk,
+             "user": "ops", "note": "delivered_pax=3"},
+            {"ts": "2025-01-03T10:00:00+00:00", "event": "collected", "user_id": 999999},
+        ])
+        self.pedido.events.all().delete()
+        migration.backfill_events(apps, None)
+        events = list(self.pedido.events.order_by("ts"))
+        self.assertEqual([e.event for e in events], ["created", "delivered", "collected"])
+        self.assertEqual(events[1].user_id, self.user.pk)
+        self.assertIsNone(events[2].user_id)
+
+        # relanzarla (p. ej. tras fallar a medias) no duplica: los que ya tienen eventos se saltan
+        otro = Pedido.objects.create(user=self.user, empresa=self.empresa, fecha_inicio=timezone.now().date(), pax=1)
+        Pedido.objects.filter(pk=otro.pk).update(updates=[{"ts": "2025-01-01T10:00:00+00:00", "event": "created"}])
+        migration.backfill_events(apps, None)
+        self.assertEqual(self.pedido.events.count(), 3)
+        self.assertEqual(otro.events.count(), 1)
+
+
+class PedidoBulkActionTest(ApiTestCase):
+    URL = "/api/ops/pedidos/bulk/"
+
+    def setUp(self):
+        super().setUp()
+        self.mios = [
+            Pedido.objects.create(
+                user=self.user, empresa=self.empresa,
+                fecha_inicio=timezone.now().date(), pax=5, estado="pagado",
+            )
+            for _ in range(3)
+        ]
+        otro = get_user_model().objects.create_user(
+            username="otro", email="otro@example.com", password="pass", empresa=self.empresa,
+        )
+        self.ajeno = Pedido.objects.create(
+            user=otro, empresa=self.empresa, fecha_inicio=timezone.now().date(), pax=5,
+        )
+
+    def test_entrega_masiva_respeta_scoping(self):
+        ids = [p.id for p in self.mios] + [self.ajeno.id]
+        res = self.client.post(self.URL, {"ids": ids, "action": "delivered", "note": "salida"}, format="json")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["updated"], 3)
+        self.assertEqual(res.data["results"][-1], {"id": self.ajeno.id, "status": "not_found"})
+        self.assertEqual(
+            set(Pedido.objects.filter(estado="entregado").values_list("id", flat=True)),
+            {p.id for p in self.mios},
+        )
+        self.assertEqual(
+            self.mios[0].events.filter(event="delivered").get().note, "salida"
+        )
+
+    def test_patch_de_campos(self):
+        res = self.client.post(self.URL, {
+            "ids": [self.mios[0].id],
+            "action": "update",
+            "patch": {"guia": "Ana", "estado": "aprobado"},
+        }, format="json")
+        self.assertEqual(res.status_code, 200)
+        self.mios[0].refresh_from_db()
+        self.assertEqual((self.mios[0].guia, self.mios[0].estado), ("Ana", "aprobado"))
+
+    def test_patch_invalido(self):
+        res = self.client.post(self.URL, {
+            "ids": [self.mios[0].id], "action": "update", "patch": {"estado": "perdido"},
+        }, format="json")
+        self.assertEqual(res.status_code, 400)
+        res = self.client.post(self.URL, {"ids": [self.mios[0].id], "action": "update"}, format="json")
+        self.assertEqual(res.status_code, 400)
+
+
+class EmpresaFKTest(ApiTestCase):
+    def test_empresas_no_staff_solo_la_suya(self):
+        Empresa.objects.create(nombre="Otra")
+        res = self.client.get("/api/empresas/")
+        self.assertEqual([e["id"] for e in res.data["results"]], [self.empresa.id])
+
+    def test_me_devuelve_empresa(self):
+        res = self.client.get("/api/me/")
+        self.assertEqual(res.data["empresa_id"], self.empresa.id)
+        self.assertEqual(res.data["empresa_name"], "Acme")
+
+    def test_backfill_por_nombre(self):
+        import importlib
+        from django.apps import apps
+
+        migration = importlib.import_module("pedidos.migrations.0020_backfill_customuser_empresa")
+        legacy = get_user_model().objects.create_user(
+            username="legacy", email="legacy@example.com", password="pass",
+            empresa_nombre=" Acme ",
+        )
+        sin_match = get_user_model().objects.create_user(
+            username="nadie", email="nadie@example.com", password="pass",
+            empresa_nombre="Desconocida",
+        )
+        migration.backfill_empresa_fk(apps, None)
+        legacy.refresh_from_db()
+        sin_match.refresh_from_db()
+        self.assertEqual(legacy.empresa_id, self.empresa.id)
+        self.assertIsNone(sin_match.empresa_id)
+
+
+class ConditionalGetTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pedido = Pedido.objects.create(
+            user=self.user, empresa=self.empresa, fecha_inicio=timezone.now().date(), pax=4,
+        )
+
+    def test_listado_304_con_una_sola_consulta(self):
+        url = "/api/ops/pedidos/"
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        etag = res["ETag"]
+        self.assertFalse(res.has_header("Last-Modified"))
+
+        with self.assertNumQueries(1):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res["ETag"], etag)
+
+        # cualquier cambio (o un filtro distinto) invalida el ETag
+        self.pedido.set_delivered(user=self.user, delivered_pax=2)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertNotEqual(self.client.get(url + "?estado=pagado")["ETag"], etag)
+
+    def test_borrado_cambia_etag(self):
+        otro = Pedido.objects.create(
+            user=self.user, empresa=self.empresa, fecha_inicio=timezone.now().date(), pax=1,
+        )
+        etag = self.client.get("/api/mis-pedidos/")["ETag"]
+        otro.delete()
+        self.assertEqual(self.client.get("/api/mis-pedidos/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_cruceros_if_modified_since_no_oculta_borrados(self):
+        from django.utils.http import http_date
+
+        for sign in ("A1", "A2"):
+            PedidoCrucero.objects.create(
+                service_date="2025-06-01", ship="Aurora", sign=sign, excursion="City",
+                pax=10, status="final",
+            )
+        url = "/api/pedidos/cruceros/bulk/"
+        res = self.client.get(url)
+        self.assertFalse(res.has_header("Last-Modified"))
+        etag = res["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            PedidoCrucero.objects.filter(sign="A2").delete()  # el MAX(updated_at) no cambia
+
+        desde = http_date(timezone.now().timestamp() + 60)
+        res = self.client.get(url, HTTP_IF_MODIFIED_SINCE=desde)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([r["sign"] for r in res.data], ["A1"])
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag, HTTP_IF_MODIFIED_SINCE=desde)
+        self.assertEqual(res.status_code, 200)
+
+    def test_etag_por_fila_en_retrieve(self):
+        url = f"/api/ops/pedidos/{self.pedido.id}/"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.patch(url, {"guia": "Ana"}, format="json")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class TagCacheTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.staff = get_user_model().objects.create_user(
+            username="jefe", email="jefe@example.com", password="pass", is_staff=True,
+        )
+        self.otra = Empresa.objects.create(nombre="Otra")
+        self.pedido = Pedido.objects.create(
+            user=self.user, empresa=self.empresa, fecha_inicio=timezone.now().date(), pax=4,
+        )
+
+    def test_listado_cacheado_e_invalidado_al_escribir(self):
+        url = "/api/ops/pedidos/"
+        self.client.get(url)
+        with self.assertNumQueries(1):  # solo el agregado del ETag
+            res = self.client.get(url)
+        self.assertEqual(res.data["results"][0]["estado"], "pendiente_pago")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pedido.set_delivered(user=self.user)
+        self.assertEqual(self.client.get(url).data["results"][0]["estado"], "entregado")
+
+    def test_invalida_solo_los_tags_tocados(self):
+        from datetime import date
+
+        from .cache import crucero_tag, tag_versions
+
+        tags = ["pedidos:%s" % self.otra.pk, "pedidos:%s" % self.empresa.pk, "pedidos"]
+        antes = tag_versions(tags)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pedido.save()
+        despues = tag_versions(tags)
+        self.assertEqual(antes[0], despues[0])
+        self.assertNotEqual(antes[1:], despues[1:])
+
+        fila = {"service_date": "2025-06-01", "ship": "Aurora", "sign": "A1", "excursion": "City",
+                "pax": 10, "status": "final", "supplier": "Sup"}
+        self.client.post("/api/pedidos/cruceros/bulk/", [fila], format="json")
+        aurora = crucero_tag(date(2025, 6, 1), "Aurora")
+        otro = crucero_tag(date(2025, 6, 1), "Boreal")
+        antes = tag_versions([aurora, otro])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/pedidos/cruceros/bulk/", [fila], format="json")  # sin cambios
+        self.assertEqual(tag_versions([aurora, otro]), antes)
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post("/api/pedidos/cruceros/bulk/", [{**fila, "pax": 11}], format="json")
+        self.assertEqual(res.data["updated"], 1)
+        despues = tag_versions([aurora, otro])
+        self.assertNotEqual(despues[0], antes[0])
+        self.assertEqual(despues[1], antes[1])
+
+    def test_escribir_un_grupo_no_invalida_los_demas(self):
+        fila = {"service_date": "2025-06-01", "ship": "Aurora", "sign": "A1", "excursion": "City",
+                "pax": 10, "status": "final", "supplier": "Sup"}
+        self.client.post("/api/pedidos/cruceros/bulk/", [fila, {**fila, "ship": "Boreal"}], format="json")
+        url = "/api/pedidos/cruceros/bulk/"
+        boreal = {"service_date": "2025-06-01", "ship": "Boreal"}
+        self.client.get(url, boreal)
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, [{**fila, "pax": 11}], format="json")
+        with self.assertNumQueries(1):  # solo el agregado del ETag: sigue en caché
+            res = self.client.get(url, boreal)
+        self.assertEqual([r["ship"] for r in res.data], ["Boreal"])
+        # el listado completo sí se invalida
+        res = self.client.get(url)
+        self.assertEqual({r["ship"]: r["pax"] for r in res.data}, {"Aurora": 11, "Boreal": 10})
+
+    def test_mover_de_empresa_invalida_la_vieja(self):
+        from .cache import tag_versions
+
+        tag = "pedidos:%s" % self.empresa.pk
+        antes = tag_versions([tag])
+        self.pedido.empresa = self.otra
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pedido.save()
+        self.assertNotEqual(tag_versions([tag]), antes)
+
+
+@override_settings(ROOT_URLCONF="pedidos.tests")
+class AsyncReadPathTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(3):
+            Pedido.objects.create(
+                user=self.user, empresa=self.empresa, fecha_inicio=timezone.now().date(), pax=i + 1,
+            )
+        self.auth = {"authorization": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+    async def test_mismo_json_que_drf_y_304(self):
+        from asgiref.sync import sync_to_async
+
+        for url in ("/api/ops/pedidos/?page_size=2", "/api/mis-pedidos/", "/api/me/"):
+            res = await self.async_client.get(url, headers=self.auth)
+            self.assertEqual(res.status_code, 200, url)
+            with override_settings(ROOT_URLCONF="config.urls"):
+                drf = await sync_to_async(self.client.get)(url)
+            self.assertEqual(res.json(), drf.json(), url)
+
+        url = "/api/ops/pedidos/?page_size=2"
+        etag = (await self.async_client.get(url, headers=self.auth))["ETag"]
+        res = await self.async_client.get(url, headers={**self.auth, "if-none-match": etag})
+        self.assertEqual(res.status_code, 304)
+
+    def test_cadena_asgi_sin_adaptar(self):
+        import os
+        import subprocess
+        import sys
+
+        from django.conf import settings
+
+        # proceso aparte: config.asgi fija SERVER=asgi antes de cargar settings
+        script = (
+            "import logging, config.asgi\n"
+            "from django.core.handlers.asgi import ASGIHandler\n"
+            "logger = logging.getLogger('django.request')\n"
+            "logger.setLevel(logging.DEBUG)\n"
+            "logger.addHandler(logging.StreamHandler())\n"
+            "ASGIHandler()\n"
+        )
+        env = {k: v for k, v in os.environ.items() if k not in ("SERVER", "DJANGO_SETTINGS_MODULE")}
+        out = subprocess.run(
+            [sys.executable, "-c", script], cwd=settings.BASE_DIR, env=env,
+            capture_output=True, text=True, check=True,
+        )
+        self.assertNotIn("adapted", out.stderr)
+        self.assertNotIn("whitenoise", out.stderr)
+
+    async def test_sin_token_401(self):
+        res = await self.async_client.get("/api/me/")
+        self.assertEqual(res.status_code, 401)
+
+    async def test_post_se_delega_a_drf(self):
+        res = await self.async_client.post(
+            "/api/ops/pedidos/",
+            {"empresa": self.empresa.pk, "excursion": "City", "fecha_inicio": "2025-06-01",
+             "tipo_servicio": "mediodia", "pax": 3},
+            content_type="application/json", headers=self.auth,
+        )
+        self.assertEqual(res.status_code, 201, res.content)
+        self.assertEqual(await Pedido.objects.acount(), 4)
+
+
+class QueryPlanTest(TestCase):
+    """EXPLAIN de cada combinación de filtros de la API sobre datos sembrados."""
+
+    @classmethod
+    def setUpTestData(cls):
+        from .plan_checks import analyze
+        from .seeding import Seeder
+
+        Seeder(seed=5, chunk_size=2000).run(
+            empresas=10, users=40, pedidos=6000, events_per_pedido=0, cruceros=0, reminders=3000,
+        )
+        get_user_model().objects.create_user(
+            username="planner", email="planner@example.com", password="pass", is_staff=True,
+        )
+        analyze()
+
+    def test_sin_full_scan_ni_sort(self):
+        from .plan_checks import api_plan_cases, explain, plan_problems, sample_actors
+
+        staff, user, empresa_id = sample_actors()
+        casos = 0
+        for label, queryset, allow_sort in api_plan_cases(staff, user, empresa_id):
+            casos += 1
+            with self.subTest(label):
+                self.assertEqual(plan_problems(queryset, allow_sort=allow_sort), [], explain(queryset))
+        self.assertGreater(casos, 60)
+
+    def test_detecta_sort(self):
+        from .plan_checks import plan_problems
+
+        self.assertTrue(plan_problems(Pedido.objects.order_by("pax")[:10]))
+
+
+class BenchmarkSuiteTest(TestCase):
+    def test_smoke_todos_los_caminos(self):
+        from .benchmarks import BENCHMARKS, run_benchmarks
+
+        data = run_benchmarks([20], repeat=1)
+        self.assertEqual(set(data["results"]), {f"{name}@20" for name in BENCHMARKS})
+
+    def test_detecta_regresiones_por_umbral(self):
+        from .benchmarks import compare_results
+
+        baseline = {"results": {"a@1": {"seconds": 0.100}, "b@1": {"seconds": 0.100}, "c@1": {"seconds": 0.001}}}
+        current = {"results": {"a@1": {"seconds": 0.130}, "b@1": {"seconds": 0.110}, "c@1": {"seconds": 0.003}}}
+        regs = compare_results(current, baseline, threshold_pct=20, min_delta_ms=5)
+        self.assertEqual([r["benchmark"] for r in regs], ["a@1"])
+
+
+class SeedLoadTest(TestCase):
+    FIELDS = ("excursion", "fecha_inicio", "fecha_fin", "estado", "pax", "fecha_creacion")
+
+    def _seed(self):
+        from .seeding import Seeder
+
+        Seeder.clear()
+        counts = Seeder(seed=7, chunk_size=50).run(
+            empresas=3, users=5, pedidos=120, cruceros=200, reminders=30,
+        )
+        pedidos = list(Pedido.objects.order_by("id").values_list(*self.FIELDS))
+        return counts, pedidos
+
+    def test_determinista_y_con_historial(self):
+        counts, primera = self._seed()
+        _, segunda = self._seed()
+        self.assertEqual(primera, segunda)
+        self.assertEqual(counts["pedidos"], 120)
+        self.assertEqual(PedidoCrucero.objects.count(), 200)
+        self.assertGreater(counts["events"], counts["pedidos"])
+        # ids de eventos apuntan a pedidos reales
+        from .models import PedidoEvent
+        self.assertFalse(PedidoEvent.objects.exclude(pedido__in=Pedido.objects.all()).exists())
+
+    def test_clear_solo_borra_lo_sembrado(self):
+        from .seeding import Seeder
+
+        empresa = Empresa.objects.create(nombre="Real")
+        user = get_user_model().objects.create_user(
+            username="real", email="real@example.com", password="x", empresa=empresa,
+        )
+        hoy = timezone.now().date()
+        pedido = Pedido.objects.create(user=user, empresa=empresa, fecha_inicio=hoy, pax=3)
+        PedidoCrucero.objects.create(supplier="Sup", service_date=hoy, ship="Real", sign="1",
+                                     excursion="City", pax=10, status="final")
+        Reminder.objects.create(user=user, title="Real", due_at=timezone.now())
+
+        self._seed()
+        Seeder.clear()
+        self.assertEqual(list(Pedido.objects.values_list("id", flat=True)), [pedido.id])
+        self.assertEqual(list(PedidoCrucero.objects.values_list("ship", flat=True)), ["Real"])
+        self.assertEqual(list(Reminder.objects.values_list("title", flat=True)), ["Real"])
+        self.assertEqual(list(get_user_model().objects.values_list("email", flat=True)), ["real@example.com"])
+        self.assertEqual(list(Empresa.objects.values_list("nombre", flat=True)), ["Real"])
+
+    def test_insert_rows_devuelve_los_ids_en_orden(self):
+        from datetime import date
+
+        from .seeding import insert_rows
+
+        empresa = Empresa.objects.create(nombre="Seed")
+        user = get_user_model().objects.create_user(username="seed", email="seed@example.com", password="x")
+        rows = [{"empresa_id": empresa.id, "user_id": user.id, "excursion": f"E{i}", "fecha_inicio": date(2025, 6, 1), "pax": i}
+                for i in range(120)]  # más de un lote con el límite de parámetros de SQLite
+        ids = insert_rows(Pedido, rows)
+        self.assertEqual(len(ids), 120)
+        self.assertEqual(
+            list(Pedido.objects.filter(pk__in=ids).order_by("pax").values_list("pk", flat=True)), ids,
+        )
+
+    def test_grupos_de_crucero_realistas(self):
+        from django.db.models import Count
+
+        self._seed()
+        tamanos = (
+            PedidoCrucero.objects.values("service_date", "ship")
+            .annotate(n=Count("id")).values_list("n", flat=True)
+        )
+        # todos los grupos completos tienen 30-80 signs (el último puede quedar cortado)
+        self.assertGreaterEqual(sorted(tamanos)[1], 30)
+        self.assertLessEqual(max(tamanos), 80)
+
+
+class DailySummaryTest(ApiTestCase):
+    URL = "/api/ops/stats/"
+
+    def _resumen(self):
+        from .models import PedidoDailySummary
+
+        return sorted(
+            PedidoDailySummary.objects.filter(pedidos__gt=0)
+            .values_list("dia", "empresa_id", "tipo_servicio", "estado", "pedidos", "pax", "emisores")
+        )
+
+    def _assert_coherente(self):
+        from .stats import rebuild
+
+        incremental = self._resumen()
+        rebuild()
+        self.assertEqual(incremental, self._resumen())
+        return incremental
+
+    def _pedido(self, **kw):
+        data = {"user": self.user, "empresa": self.empresa, "fecha_inicio": timezone.now().date(), "pax": 10, "emisores": 2}
+        data.update(kw)
+        return Pedido.objects.create(**data)
+
+    def test_deltas_en_todos_los_caminos(self):
+        otra = Empresa.objects.create(nombre="Otra")
+        a, b, c = self._pedido(), self._pedido(pax=4), self._pedido(estado="pagado")
+        self._assert_coherente()
+
+        a.set_delivered(delivered_pax=7, override_pax=True)
+        b.empresa = otra
+        b.save()
+        c.estado = "aprobado"
+        c.pax = 99  # no se guarda: update_fields solo lleva estado
+        c.save(update_fields=["estado"])
+        self._assert_coherente()
+
+        Pedido.bulk_apply([a.id, b.id], {"estado": "recogido"}, "collected")
+        a.delete()
+        filas = self._assert_coherente()
+        self.assertEqual(sum(f[4] for f in filas), 2)
+
+        # borrar la empresa se lleva su resumen en cascada
+        otra.delete()
+        self._assert_coherente()
+
+    def test_endpoint_agrupa_y_acota(self):
+        otra = Empresa.objects.create(nombre="Otra")
+        self._pedido(estado="pagado")
+        self._pedido(estado="pagado", pax=5)
+        self._pedido(empresa=otra, pax=50)
+
+        res = self.client.get(self.URL, {"group_by": "estado"})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["results"], [{"estado": "pagado", "pedidos": 2, "pax": 15, "emisores": 4}])
+        self.assertEqual(res.data["totals"]["pedidos"], 2)
+
+        self.user.is_staff = True
+        self.user.save()
+        res = self.client.get(self.URL, {"group_by": "empresa"})
+        self.assertEqual(res.data["totals"], {"pedidos": 3, "pax": 65, "emisores": 6})
+        self.assertEqual(len(res.data["results"]), 2)
+
+        self.assertEqual(self.client.get(self.URL, {"group_by": "user"}).status_code, 400)
+        self.assertEqual(self.client.get(self.URL, {"desde": "ayer"}).status_code, 400)
+
+
+class EmisoresPlannerTest(ApiTestCase):
+    URL = "/api/ops/planner/"
+
+    def setUp(self):
+        super().setUp()
+        from datetime import date
+
+        self.otra = Empresa.objects.create(nombre="Otra")
+        self.dia = date(2025, 6, 1)
+        specs = [
+            (self.empresa, "mediodia", 0, None, 2, 20),
+            (self.empresa, "circuito", -3, 4, 3, 30),   # empieza antes del rango
+            (self.otra, "circuito", 2, 40, None, 10),   # termina después
+            (self.otra, "mediodia", 5, None, 1, 15),
+            (self.empresa, "mediodia", 40, None, 5, 50),  # fuera del rango
+        ]
+        for empresa, tipo, ini, fin, emisores, pax in specs:
+            Pedido.objects.create(
+                user=self.user, empresa=empresa, tipo_servicio=tipo,
+                fecha_inicio=self.dia + timezone.timedelta(days=ini),
+                fecha_fin=self.dia + timezone.timedelta(days=fin) if fin is not None else None,
+                emisores=emisores, pax=pax,
+            )
+
+    def test_barrido_igual_que_contar_dia_a_dia(self):
+        from .planner import plan_demand
+
+        hasta = self.dia + timezone.timedelta(days=9)
+        plan = plan_demand(self.dia, hasta, stock_emisores=4)
+        for item in plan["results"]:
+            dia = item["dia"]
+            fuera = [
+                p for p in Pedido.objects.all()
+                if p.fecha_inicio <= dia <= max(p.fecha_fin or p.fecha_inicio, p.fecha_inicio)
+            ]
+            self.assertEqual(item["emisores"], sum(p.emisores or 0 for p in fuera), dia)
+            self.assertEqual(item["receptores"], sum(p.pax for p in fuera), dia)
+        self.assertEqual(len(plan["results"]), 10)
+        self.assertEqual(plan["peak"]["receptores"], {"dia": self.dia, "valor": 50})
+        self.assertEqual(plan["over_stock"], [self.dia])
+        self.assertEqual(len(plan["groups"]), 4)
+
+    def test_endpoint_solo_staff(self):
+        params = {"desde": "2025-06-01", "hasta": "2025-06-10", "stock_receptores": 40}
+        self.assertEqual(self.client.get(self.URL, params).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        res = self.client.get(self.URL, {**params, "empresa": self.otra.pk})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["peak"]["receptores"]["valor"], 25)
+        self.assertEqual([g["pico_receptores"] for g in res.data["groups"]], [10, 15])
+        self.assertEqual(res.data["over_stock"], [])
+        self.assertEqual(self.client.get(self.URL, {"desde": "2025-06-10", "hasta": "2025-06-01"}).status_code, 400)
+        self.assertEqual(self.client.get(self.URL, {**params, "stock_emisores": "x"}).status_code, 400)
+
+
+class SolapeFilterTest(ApiTestCase):
+    URL = "/api/ops/pedidos/"
+
+    def setUp(self):
+        super().setUp()
+        from datetime import date
+
+        def crear(excursion, inicio, fin=None):
+            return Pedido.objects.create(
+                user=self.user, empresa=self.empresa, excursion=excursion,
+                fecha_inicio=date(2025, 6, inicio), fecha_fin=date(2025, 6, fin) if fin else None, pax=1,
+            )
+
+        crear("circuito", 1, 8)
+        crear("dia suelto", 5)
+        crear("otro dia", 9)
+        crear("fin raro", 10, 2)  # fecha_fin < fecha_inicio: cuenta como un día
+
+    def _excursiones(self, **params):
+        res = self.client.get(self.URL, params)
+        self.assertEqual(res.status_code, 200)
+        return sorted(p["excursion"] for p in res.data["results"])
+
+    def test_fecha_fin_efectiva(self):
+        self.assertEqual(
+            sorted(Pedido.objects.values_list("excursion", "fecha_fin_efectiva__day")),
+            [("circuito", 8), ("dia suelto", 5), ("fin raro", 10), ("otro dia", 9)],
+        )
+
+    def test_dia_y_rango(self):
+        self.assertEqual(self._excursiones(dia="2025-06-05"), ["circuito", "dia suelto"])
+        # desde/hasta (solo fecha_inicio) se deja el circuito
+        self.assertEqual(self._excursiones(desde="2025-06-05", hasta="2025-06-05"), ["dia suelto"])
+        self.assertEqual(
+            self._excursiones(solapa_desde="2025-06-08", solapa_hasta="2025-06-09"),
+            ["circuito", "otro dia"],
+        )
+        self.assertEqual(self._excursiones(solapa_desde="2025-06-10"), ["fin raro"])
+        self.assertEqual(self._excursiones(dia="2025-06-11"), [])
+
+
+class SearchTest(ApiTestCase):
+    URL = "/api/ops/pedidos/"
+
+    def setUp(self):
+        super().setUp()
+        hoy = timezone.now().date()
+        otro = get_user_model().objects.create_user(
+            username="otro", email="otro@example.com", password="pass", empresa=self.empresa,
+        )
+        datos = [
+            (self.user, "Alhambra", "Llegan tarde", "Ana"),
+            (self.user, "City tour", "Alhambra el martes; Alhambra sin guía", ""),
+            (self.user, "Córdoba", "", "Luis"),
+            (otro, "Alhambra", "", ""),
+        ]
+        self.pedidos = [
+            Pedido.objects.create(
+                user=u, empresa=self.empresa, fecha_inicio=hoy, pax=1,
+                excursion=exc, notas=notas, guia=guia,
+            )
+            for u, exc, notas, guia in datos
+        ]
+
+    def _buscar(self, q, **params):
+        res = self.client.get(self.URL, {"q": q, **params})
+        self.assertEqual(res.status_code, 200)
+        return res
+
+    def test_ranking_prefijos_acentos_y_scoping(self):
+        res = self._buscar("alham")
+        # el que lo repite en notas pesa más; el de `otro` no se ve
+        self.assertEqual(
+            [p["id"] for p in res.data["results"]], [self.pedidos[1].id, self.pedidos[0].id],
+        )
+        self.assertEqual([p["id"] for p in self._buscar("cordoba").data["results"]], [self.pedidos[2].id])
+        self.assertEqual(self._buscar("alhambra ana").data["results"][0]["id"], self.pedidos[0].id)
+        self.assertEqual(self._buscar("%' OR 1=1 --").data["results"], [])
+
+        # por relevancia también se pagina con cursor
+        primera = self._buscar("alhambra", page_size=1)
+        segunda = self.client.get(primera.data["next"])
+        self.assertEqual(segunda.data["results"][0]["id"], self.pedidos[0].id)
+        self.assertIsNone(segunda.data["next"])
+
+    def test_empates_de_relevancia_por_paginas(self):
+        from .search import _pg_search
+
+        hoy = timezone.now().date()
+        Pedido.objects.bulk_create([
+            Pedido(user=self.user, empresa=self.empresa, fecha_inicio=hoy, pax=1, excursion="Ronda")
+            for _ in range(7)
+        ])
+        vistos, res = [], self._buscar("ronda", page_size=3)
+        while True:
+            vistos += [p["id"] for p in res.data["results"]]
+            if not res.data["next"]:
+                break
+            res = self.client.get(res.data["next"])
+        rondas = Pedido.objects.filter(excursion="Ronda").values_list("id", flat=True)
+        self.assertEqual(sorted(vistos), sorted(rondas))
+        # en PostgreSQL ts_rank (float4) va como float8 para que el cursor cuadre exacto
+        sql = str(_pg_search(Pedido.objects.all(), "pedidos_pedido", "ronda").query)
+        self.assertIn("::float8", sql)
+
+    def test_indice_sigue_a_la_tabla(self):
+        p = self.pedidos[2]
+        p.guia = "Marisol"
+        p.save()
+        self.assertEqual([x["id"] for x in self._buscar("marisol").data["results"]], [p.id])
+        self.assertEqual(self._buscar("luis").data["results"], [])
+        with self.captureOnCommitCallbacks(execute=True):  # invalida la caché de respuestas
+            p.delete()
+        self.assertEqual(self._buscar("marisol").data["results"], [])
+
+    def test_reminders_y_cruceros(self):
+        for title in ("Llamar proveedor", "Cargar emisores"):
+            Reminder.objects.create(user=self.user, title=title, due_at=timezone.now())
+        res = self.client.get("/api/reminders/", {"q": "llam prov"})
+        self.assertEqual([r["title"] for r in res.data["results"]], ["Llamar proveedor"])
+
+        for sign, ship in (("A1", "Costa Diadema"), ("A2", "MSC Orchestra")):
+            PedidoCrucero.objects.create(
+                supplier="Sup", service_date=timezone.now().date(), ship=ship,
+                sign=sign, excursion="Granada", pax=10, status="final",
+            )
+        res = self.client.get("/api/pedidos/cruceros/bulk/", {"q": "orchestra"})
+        self.assertEqual([r["sign"] for r in res.data], ["A2"])
+
+
+class ReminderDispatchTest(ApiTestCase):
+    LOCMEM = "django.core.mail.backends.locmem.EmailBackend"
+
+    def _reminder(self, minutos, **kwargs):
+        return Reminder.objects.create(
+            user=self.user, title=f"R{minutos}", due_at=timezone.now() + timezone.timedelta(minutes=minutos), **kwargs,
+        )
+
+    def test_heap_avisa_lotes_y_recoge_cambios(self):
+        from django.core import mail
+
+        from .reminders import EmailNotifier, ReminderDispatcher
+
+        vencido = self._reminder(-5)
+        futuro = self._reminder(60)
+        self._reminder(-10, is_done=True)
+        d = ReminderDispatcher(notifier=EmailNotifier(self.LOCMEM))
+        self.assertEqual(d.load(), 2)
+
+        # lote = 1 SELECT + 1 UPDATE
+        with self.assertNumQueries(2):
+            self.assertEqual(d.fire_due(), 1)
+        self.assertEqual([m.to for m in mail.outbox], [[self.user.email]])
+        vencido.refresh_from_db()
+        self.assertIsNotNone(vencido.notified_at)
+        self.assertFalse(vencido.is_done)
+
+        # alta nueva y edición de due_at: entran por el feed, no por re-escaneo
+        nuevo = self._reminder(-1)
+        futuro.due_at = timezone.now() - timezone.timedelta(minutes=1)
+        futuro.save()
+        d.poll_changes()
+        self.assertEqual(set(d.scheduled), {nuevo.id, futuro.id})
+        self.assertEqual(d.fire_due(), 2)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(d.pending().count(), 0)
+
+        # cambiar la fecha por la API vuelve a dejarlo pendiente
+        res = self.client.patch(
+            f"/api/reminders/{nuevo.id}/",
+            {"due_at": (timezone.now() + timezone.timedelta(hours=1)).isoformat()},
+            format="json",
+        )
+        self.assertEqual(res.status_code, 200)
+        self.assertIsNone(res.data["notified_at"])
+        d.poll_changes()
+        self.assertEqual(list(d.scheduled), [nuevo.id])
+
+    def test_fallo_del_notificador_reintenta(self):
+        from .reminders import LogNotifier, ReminderDispatcher
+
+        class Roto:
+            def send(self, reminders):
+                raise ConnectionError("smtp caído")
+
+        r = self._reminder(-1)
+        d = ReminderDispatcher(notifier=Roto())
+        d.load()
+        now = timezone.now()
+        with self.assertLogs("pedidos.reminders", "ERROR"):
+            self.assertEqual(d.fire_due(now), 0)
+        self.assertEqual(d.fire_due(now), 0)  # aún no toca reintentar
+
+        d.notifier = LogNotifier()
+        self.assertEqual(d.fire_due(now + timezone.timedelta(minutes=2)), 1)
+        r.refresh_from_db()
+        self.assertIsNotNone(r.notified_at)
+
+
+    def test_migracion_da_por_avisado_lo_anterior(self):
+        from importlib import import_module
+
+        from django.apps import apps
+
+        from .reminders import fire_at
+
+        ahora = timezone.now()
+        serie = Reminder.objects.create(user=self.user, title="Serie", recurrence="semanal",
+                                        due_at=ahora - timezone.timedelta(days=60))
+        import_module("pedidos.migrations.0032_reminder_backlog_notified").mark_past_as_notified(apps, None)
+        serie.refresh_from_db()
+        self.assertIsNone(serie.notified_at)
+        self.assertGreater(fire_at(serie), ahora)  # la próxima ocurrencia, no las 8 semanas atrasadas
+
+    def test_serie_avisa_cada_ocurrencia(self):
+        from .reminders import LogNotifier, ReminderDispatcher
+
+        semana = timezone.timedelta(weeks=1)
+        serie = self._reminder(-1, recurrence="semanal")
+        primera = serie.due_at
+        d = ReminderDispatcher(notifier=LogNotifier())
+        self.assertEqual(d.load(), 1)
+
+        now = timezone.now()
+        self.assertEqual(d.fire_due(now), 1)
+        serie.refresh_from_db()
+        # sigue pendiente (nadie la ha hecho) y avisada hasta la primera
+        self.assertEqual((serie.due_at, serie.notified_through, serie.notified_at), (primera, primera, None))
+        self.assertEqual(d.scheduled, {serie.id: primera + semana})
+        self.assertEqual(d.fire_due(now), 0)
+
+        # otro proceso que arranca después no repite la primera
+        otro = ReminderDispatcher(notifier=LogNotifier())
+        otro.load()
+        self.assertEqual(otro.scheduled, {serie.id: primera + semana})
+
+        # la semana siguiente vuelve a avisar, aunque la primera no se marcara hecha
+        self.assertEqual(d.fire_due(now + semana), 1)
+        serie.refresh_from_db()
+        self.assertEqual(serie.notified_through, primera + semana)
+        self.assertEqual(d.scheduled, {serie.id: primera + 2 * semana})
+
+        # hecha (la primera, con retraso): la serie pasa a la siguiente y no se repite lo ya avisado
+        serie.mark_done()
+        self.assertEqual(serie.due_at, primera + semana)
+        d.poll_changes()
+        self.assertEqual(d.scheduled, {serie.id: primera + 2 * semana})
+
+
+class RecurringReminderTest(ApiTestCase):
+    URL = "/api/reminders/"
+
+    def setUp(self):
+        super().setUp()
+        manana = timezone.now().date() + timezone.timedelta(days=1)
+        self.base = timezone.make_aware(timezone.datetime.combine(manana, timezone.datetime.min.time())).replace(hour=9)
+        res = self.client.post(self.URL, {
+            "title": "Revisar manifiestos", "due_at": self.base.isoformat(), "recurrence": "semanal",
+        }, format="json")
+        self.assertEqual(res.status_code, 201, res.data)
+        self.serie = Reminder.objects.get(pk=res.data["id"])
+        self.suelto = Reminder.objects.create(
+            user=self.user, title="Llamar", due_at=self.base + timezone.timedelta(days=8, hours=1),
+        )
+
+    def _ventana(self, dias=28, **params):
+        params = {
+            "due_after": self.base.isoformat(),
+            "due_before": (self.base + timezone.timedelta(days=dias)).isoformat(),
+            **params,
+        }
+        res = self.client.get(self.URL, params)
+        self.assertEqual(res.status_code, 200)
+        return res
+
+    def test_ventana_expande_sin_crear_filas(self):
+        res = self._ventana()
+        semana = timezone.timedelta(weeks=1)
+        esperado = [self.base, self.base + semana, self.suelto.due_at, self.base + 2 * semana,
+                    self.base + 3 * semana, self.base + 4 * semana]
+        self.assertEqual([timezone.datetime.fromisoformat(r["due_at"]) for r in res.data["results"]], esperado)
+        self.assertEqual([r["is_occurrence"] for r in res.data["results"]],
+                         [False, True, False, True, True, True])
+        self.assertEqual(Reminder.objects.count(), 2)
+
+        # paginado por cursor (y vuelta atrás) sobre la mezcla
+        ids = []
+        page = self._ventana(page_size=4)
+        ids += [(r["id"], r["due_at"]) for r in page.data["results"]]
+        page = self.client.get(page.data["next"])
+        ids += [(r["id"], r["due_at"]) for r in page.data["results"]]
+        self.assertIsNone(page.data["next"])
+        self.assertEqual(ids, [(r["id"], r["due_at"]) for r in res.data["results"]])
+        back = self.client.get(page.data["previous"])
+        self.assertEqual([(r["id"], r["due_at"]) for r in back.data["results"]], ids[:4])
+
+        # sin ventana: la serie sale una vez
+        self.assertEqual(len(self.client.get(self.URL).data["results"]), 2)
+
+    def test_skip_y_done_avanzan_la_serie(self):
+        semana = timezone.timedelta(weeks=1)
+        url = f"{self.URL}{self.serie.id}/"
+        res = self.client.post(url + "skip/", {"occurrence": (self.base + semana).isoformat()}, format="json")
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn(
+            self.base + semana,
+            [timezone.datetime.fromisoformat(r["due_at"]) for r in self._ventana().data["results"]],
+        )
+        res = self.client.post(url + "skip/", {"occurrence": (self.base + timezone.timedelta(days=1)).isoformat()},
+                               format="json")
+        self.assertEqual(res.status_code, 400)
+
+        # done: salta a la siguiente (la saltada no cuenta) y poda la excepción
+        self.client.post(url + "done/")
+        self.serie.refresh_from_db()
+        self.assertEqual(self.serie.due_at, self.base + 2 * semana)
+        self.assertFalse(self.serie.is_done)
+        self.assertEqual(self.serie.recurrence_exceptions, [])
+
+        # con until, la última ocurrencia cierra la serie
+        self.serie.recurrence_until = self.serie.due_at
+        self.serie.save()
+        self.serie.mark_done()
+        self.assertTrue(self.serie.is_done)
+
+
+class PedidoBatchCreateTest(ApiTestCase):
+    URL = "/api/pedidos/bulk/"
+
+    def _fila(self, **extra):
+        return {"fecha_inicio": "2025-07-01", "pax": 10, "excursion": "Alhambra", "estado": "pagado", **extra}
+
+    def test_lote_grande_pocas_consultas_y_exito_parcial(self):
+        from datetime import date, timedelta
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from .models import PedidoDailySummary, PedidoEvent
+
+        staff = get_user_model().objects.create_user(
+            username="jefe", email="jefe@example.com", password="pass", is_staff=True,
+        )
+        self.client.force_authenticate(staff)
+        otra = Empresa.objects.create(nombre="Beta")
+        # una temporada: 120 días × 3 tipos × 2 empresas -> cientos de claves de resumen
+        tipos = ("mediodia", "dia_Completo", "circuito")
+        filas = [
+            self._fila(empresa=self.empresa.id if i % 2 else "Beta", tipo_servicio=tipos[i // 2 % 3],
+                       fecha_inicio=(date(2025, 6, 1) + timedelta(days=i // 2 % 120)).isoformat())
+            for i in range(1200)
+        ]
+        filas[3] = self._fila(empresa=self.empresa.id, pax=None)
+        filas[7] = self._fila(empresa="No existe")
+        filas[9] = self._fila(empresa=otra.id, fecha_fin="2025-06-01")
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.post(self.URL, filas, format="json")
+        self.assertEqual(res.status_code, 201)
+        # antes eran 3+ consultas por fila; SQLite parte cada INSERT en trozos
+        # de 999 parámetros (~60 filas), PostgreSQL hace BATCH_SIZE
+        self.assertLess(len(ctx.captured_queries), 60)
+
+        self.assertEqual((res.data["created"], res.data["failed"]), (1197, 3))
+        self.assertEqual([r["index"] for r in res.data["results"]], list(range(1200)))
+        self.assertEqual(sorted(r["index"] for r in res.data["results"] if "errors" in r), [3, 7, 9])
+        self.assertIn("pax", res.data["results"][3]["errors"])
+        self.assertIn("empresa", res.data["results"][7]["errors"])
+
+        creado = Pedido.objects.get(pk=res.data["results"][0]["id"])
+        self.assertEqual((creado.empresa_id, creado.user_id), (otra.id, staff.id))
+        self.assertEqual(Pedido.objects.filter(empresa=otra).count(), 600)
+        self.assertEqual(PedidoEvent.objects.filter(event="created").count(), 1197)
+        resumen = PedidoDailySummary.objects.filter(empresa=otra)
+        self.assertGreater(resumen.count(), 100)
+        self.assertEqual(sum(resumen.values_list("pedidos", flat=True)), 600)
+
+    def test_usuario_normal_usa_su_empresa(self):
+        otra = Empresa.objects.create(nombre="Beta")
+        res = self.client.post(self.URL, [self._fila(empresa=otra.id), self._fila()], format="json")
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(set(Pedido.objects.values_list("empresa_id", flat=True)), {self.empresa.id})
+
+        res = self.client.post(self.URL, [{"pax": 1}], format="json")
+        self.assertEqual(res.status_code, 400)
+        self.assertIn("fecha_inicio", res.data["results"][0]["errors"])
+        self.assertEqual(self.client.post(self.URL, {"pax": 1}, format="json").status_code, 400)
+
+
+class CruceroCsvUploadTest(ApiTestCase):
+    URL = "/api/pedidos/cruceros/upload/"
+    CSV = (
+        "Fecha;Barco;Nº Bus;Excursión;Pax;Estado;Proveedor;Hora\n"
+        "01/06/2025;Costa;B1;City;10;final;Sup;09:30\n"
+        "01/06/2025;MSC;M1;Beach;20;final;Sup;\n"
+        "01/06/2025;Costa;B2;Wine;30;final;Sup;10:00\n"
+        "01/06/2025;MSC;M2;Tapas;5;final;Sup;\n"
+        "01/06/2025;Costa;B3;Alhambra;40;final;Sup;\n"
+    )
+
+    def _subir(self, contenido, **campos):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        fichero = SimpleUploadedFile("manifiesto.csv", contenido.encode("utf-8"), content_type="text/csv")
+        return self.client.post(self.URL, {"file": fichero, **campos}, format="multipart")
+
+    def test_streaming_por_trozos_con_grupos_repartidos(self):
+        from datetime import date, time
+        from unittest import mock
+
+        dia = date(2025, 6, 1)
+        b1 = PedidoCrucero.objects.create(
+            supplier="Sup", service_date=dia, ship="Costa", sign="B1", excursion="City", pax=10, status="final",
+            arrival_time=time(9, 30),
+        )
+        PedidoCrucero.objects.create(
+            supplier="Sup", service_date=dia, ship="Costa", sign="B9", excursion="Old", pax=1, status="final",
+        )
+        # trozos de 2 filas: Costa llega en 3 trozos distintos
+        with mock.patch("pedidos.crucero_csv.CHUNK_ROWS", 2):
+            res = self._subir(self.CSV, empresa=self.empresa.id)
+        self.assertEqual(res.status_code, 201, res.data)
+        self.assertEqual(res.data["chunks"], 3)
+        for key, value in {"rows": 5, "inserted": 4, "unchanged": 1, "removed": 1,
+                           "overwritten": 2, "created_pedidos": 5}.items():
+            self.assertEqual(res.data[key], value, key)
+
+        signs = dict(PedidoCrucero.objects.values_list("sign", "id"))
+        self.assertEqual(set(signs), {"B1", "B2", "B3", "M1", "M2"})
+        self.assertEqual(signs["B1"], b1.id)  # no se borra y re-crea entre trozos
+        self.assertEqual(str(PedidoCrucero.objects.get(sign="B2").arrival_time), "10:00:00")
+
+    def test_errores_por_linea_sin_guardar_nada(self):
+        res = self._subir(self.CSV.replace("Wine;30", "Wine;treinta"))
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual([e["line"] for e in res.data["errors"]], [4])
+        self.assertIn("pax", res.data["errors"][0]["errors"])
+        self.assertFalse(PedidoCrucero.objects.exists())
+
+        res = self._subir("Fecha,Barco,Pax\n2025-06-01,Costa,3\n")
+        self.assertEqual(res.status_code, 400)
+        self.assertIn("sign", res.data["file"])
+
+        # columnas que faltan se pueden fijar desde el formulario
+        res = self._subir("Bus,Tour,Pax\nB1,City,3\n", service_date="2025-06-02", ship="Costa",
+                          status="preliminary", supplier="Sup")
+        self.assertEqual(res.status_code, 201, res.data)
+        self.assertEqual(res.data["inserted"], 1)
+
+    def test_codificacion_que_no_es_de_texto(self):
+        for encoding in ("rot13", "hex", "base64", "no-existe"):
+            res = self._subir(self.CSV, encoding=encoding)
+            self.assertEqual(res.status_code, 400, encoding)
+            self.assertIn("encoding", res.data)
+        self.assertEqual(self._subir(self.CSV, encoding="utf-8").status_code, 201)
+
+
+class ManifestJobTest(ApiTestCase):
+    URL = "/api/pedidos/cruceros/bulk/?async=1"
+    PAYLOAD = {
+        "meta": {"service_date": "2025-06-01", "status": "final", "supplier": "Sup"},
+        "rows": [
+            {"ship": "Costa", "sign": "B1", "excursion": "City", "pax": 10},
+            {"ship": "MSC", "sign": "M1", "excursion": "Beach", "pax": 20},
+            {"ship": "Costa", "sign": "B2", "excursion": "Wine", "pax": 30},
+        ],
+    }
+
+    def test_202_y_el_worker_lo_procesa_por_grupos(self):
+        from .jobs import claim, process_job
+
+        res = self.client.post(self.URL, {**self.PAYLOAD, "meta": {**self.PAYLOAD["meta"], "empresa": self.empresa.id}},
+                               format="json")
+        self.assertEqual(res.status_code, 202)
+        self.assertEqual(res["Location"], res.data["url"])
+        self.assertFalse(PedidoCrucero.objects.exists())  # nada hasta que pase el worker
+
+        estado = self.client.get(res.data["url"])
+        self.assertEqual(estado.data["status"], "pending")
+
+        [(job_id, owner)] = claim(5)
+        self.assertEqual(job_id, res.data["job"])
+        self.assertEqual(claim(5), [])  # ya está en running
+        process_job(job_id, owner)
+
+        estado = self.client.get(res.data["url"]).data
+        self.assertEqual(estado["status"], "done")
+        self.assertEqual((estado["groups_done"], estado["groups_total"]), (2, 2))
+        for key, value in {"created": 3, "inserted": 3, "overwritten": 0, "created_pedidos": 3}.items():
+            self.assertEqual(estado["result"][key], value, key)
+        self.assertEqual(PedidoCrucero.objects.count(), 3)
+
+        # de otro usuario: no existe
+        otro = get_user_model().objects.create_user(username="otro", password="x", empresa=self.empresa)
+        self.client.force_authenticate(otro)
+        self.assertEqual(self.client.get(res.data["url"]).status_code, 404)
+
+    def test_reanuda_tras_caida_y_errores_de_validacion(self):
+        from datetime import timedelta
+
+        from .crucero_merge import normalize_payload
+        from .jobs import STALE_AFTER, claim, process_job, requeue_stale
+        from .models import ManifestJob
+
+        job_id = self.client.post(self.URL, self.PAYLOAD, format="json").data["job"]
+        [(_, owner)] = claim(1)
+        # worker caído tras confirmar el primer grupo (Costa)
+        process_job(job_id, owner)
+        PedidoCrucero.objects.filter(ship="MSC").delete()
+        rows, meta = normalize_payload(self.PAYLOAD)
+        ManifestJob.objects.filter(pk=job_id).update(
+            status="running", groups_done=1, result={}, payload={"rows": rows, "meta": meta},
+            updated_at=timezone.now() - STALE_AFTER - timedelta(seconds=1),
+        )
+        PedidoCrucero.objects.filter(ship="Costa").update(pax=1)
+
+        self.assertEqual(requeue_stale(), 1)
+        [(_, owner)] = claim(1)
+        process_job(job_id, owner)
+        job = ManifestJob.objects.get(pk=job_id)
+        self.assertEqual(job.status, "done")
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(job.groups_done, 2)
+        self.assertEqual(PedidoCrucero.objects.get(sign="M1").pax, 20)
+        self.assertEqual(PedidoCrucero.objects.get(sign="B1").pax, 1)  # Costa no se repite
+
+        rows = [*self.PAYLOAD["rows"], {"ship": "MSC", "sign": "M2", "excursion": "X", "pax": "mucho"}]
+        job_id = self.client.post(self.URL, {**self.PAYLOAD, "rows": rows}, format="json").data["job"]
+        [(_, owner)] = claim(1)
+        process_job(job_id, owner)
+        job = ManifestJob.objects.get(pk=job_id)
+        self.assertEqual(job.status, "failed")
+        self.assertEqual([e["index"] for e in job.errors], [3])
+        self.assertEqual(PedidoCrucero.objects.get(sign="M1").pax, 20)
+
+
+    def test_job_de_otro_dueno_no_se_aplica_dos_veces(self):
+        from datetime import timedelta
+
+        from .jobs import MAX_ATTEMPTS, STALE_AFTER, JobLost, claim, process_job, requeue_stale
+        from .models import ManifestJob
+
+        meta = {**self.PAYLOAD["meta"], "empresa": self.empresa.id}
+        job_id = self.client.post(self.URL, {**self.PAYLOAD, "meta": meta}, format="json").data["job"]
+        [(_, viejo)] = claim(1, "w1")
+        later = timezone.now() + STALE_AFTER + timedelta(seconds=1)
+        # el propio worker no re-encola lo suyo aunque vaya lento
+        self.assertEqual(requeue_stale(later, worker="w1"), 0)
+        # otro sí (w1 sin latido = caído) y el job cambia de dueño
+        self.assertEqual(requeue_stale(later, worker="w2"), 1)
+        [(_, nuevo)] = claim(1, "w2")
+
+        # w1 seguía vivo: su grupo se deshace al ver que el job ya no es suyo
+        with self.assertRaises(JobLost):
+            process_job(job_id, viejo)
+        self.assertFalse(PedidoCrucero.objects.exists())
+        self.assertFalse(Pedido.objects.exists())
+
+        process_job(job_id, nuevo)
+        self.assertEqual(ManifestJob.objects.get(pk=job_id).status, "done")
+        self.assertEqual(Pedido.objects.count(), 3)
+
+        # un job que tumba al worker MAX_ATTEMPTS veces acaba en failed
+        job_id = self.client.post(self.URL, self.PAYLOAD, format="json").data["job"]
+        ManifestJob.objects.filter(pk=job_id).update(attempts=MAX_ATTEMPTS - 1)
+        claim(1, "w1")
+        self.assertEqual(requeue_stale(later, worker="w2"), 0)
+        job = ManifestJob.objects.get(pk=job_id)
+        self.assertEqual((job.status, job.attempts), ("failed", MAX_ATTEMPTS))
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+class ServerTimingTest(ApiTestCase):
+    def _metricas(self, header):
+        return {part.split(";")[0].strip(): part.strip() for part in header.split(",")}
+
+    def test_cabecera_con_bd_auth_serializacion_y_render(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        Pedido.objects.create(user=self.user, empresa=self.empresa, fecha_inicio=timezone.now().date(), pax=3)
+        token = RefreshToken.for_user(self.user).access_token
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        with CaptureQueriesContext(connection) as queries:
+            res = client.get("/api/ops/pedidos/")
+        self.assertEqual(res.status_code, 200)
+
+        metricas = self._metricas(res["Server-Timing"])
+        self.assertEqual(list(metricas), ["db", "auth", "serialize", "render", "total"])
+        self.assertIn(f'desc="{len(queries)} queries"', metricas["db"])
+        self.assertRegex(metricas["total"], r"^total;dur=\d+\.\d$")
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_apagado_sin_cabecera(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertNotIn("Server-Timing", client.get("/api/ops/pedidos/"))
+
+
+@override_settings(METRICS_TOKEN="secreto")
+class MetricsTest(ApiTestCase):
+    def _valor(self, nombre, **labels):
+        from prometheus_client import REGISTRY
+
+        return REGISTRY.get_sample_value(nombre, labels) or 0
+
+    def test_latencia_por_vista_e_ingesta(self):
+        antes = {
+            "lista": self._valor("http_request_duration_seconds_count", view="pedido-ops:list", status="2xx"),
+            "bulk": self._valor("http_request_duration_seconds_count", view="crucero-bulk:post", status="2xx"),
+            "created": self._valor("crucero_rows_total", result="created"),
+            "blocked": self._valor("crucero_rows_total", result="blocked"),
+            "pedidos": self._valor("pedidos_created_total", source="crucero"),
+        }
+        self.client.get("/api/ops/pedidos/")
+        meta = {"service_date": "2025-06-01", "ship": "Costa", "supplier": "Sup", "empresa": self.empresa.id}
+        rows = [{"sign": "B1", "excursion": "City", "pax": 10}, {"sign": "B2", "excursion": "Beach", "pax": 20}]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/pedidos/cruceros/bulk/", {"meta": {**meta, "status": "final"}, "rows": rows},
+                             format="json")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/pedidos/cruceros/bulk/", {"meta": {**meta, "status": "preliminary"}, "rows": rows},
+                             format="json")
+
+        self.assertEqual(self._valor("http_request_duration_seconds_count", view="pedido-ops:list", status="2xx"),
+                         antes["lista"] + 1)
+        self.assertEqual(self._valor("http_request_duration_seconds_count", view="crucero-bulk:post", status="2xx"),
+                         antes["bulk"] + 2)
+        self.assertEqual(self._valor("crucero_rows_total", result="created"), antes["created"] + 2)
+        self.assertEqual(self._valor("crucero_rows_total", result="blocked"), antes["blocked"] + 2)
+        self.assertEqual(self._valor("pedidos_created_total", source="crucero"), antes["pedidos"] + 2)
+        self.assertGreater(self._valor("http_request_db_queries_sum", view="crucero-bulk:post"), 0)
+
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        res = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secreto")
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'http_request_duration_seconds_bucket{le="0.01",status="2xx",view="pedido-ops:list"}',
+                      res.content)
+
+        with self.settings(METRICS_TOKEN=""):
+            self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_cuenta_queries_sin_encender_server_timing(self):
+        from unittest import mock
+
+        from . import timing
+
+        vistas = []
+        with mock.patch("pedidos.middleware.observe_request",
+                        side_effect=lambda *a: vistas.append((timing.current(), a[3]))):
+            self.client.get("/api/ops/pedidos/")
+        [(current, queries)] = vistas
+        self.assertIsNone(current)
+        self.assertGreater(queries, 0)
+
+
+class ValuesSerializerTest(ApiTestCase):
+    """El camino values_list tiene que dar exactamente lo mismo que DRF."""
+
+    def setUp(self):
+        super().setUp()
+        from datetime import date
+
+        otra = Empresa.objects.create(nombre="Ñandú & Cía")
+        for i in range(7):
+            Pedido.objects.create(
+                user=self.user, empresa=otra if i % 2 else self.empresa,
+                excursion=f"Excursión {i}", fecha_inicio=date(2025, 6, 1 + i),
+                fecha_fin=date(2025, 6, 3 + i) if i % 3 else None,
+                tipo_servicio="circuito" if i % 3 else "mediodia",
+                estado="pagado", pax=10 + i, emisores=i or None, notas="línea 1\nlínea 2" if i == 4 else "",
+            )
+
+    def test_misma_salida_que_los_serializers_de_drf(self):
+        from .serializers import PedidoOpsSerializer, PedidoSerializer
+        from .values_serializers import ValuesSerializer
+
+        qs = Pedido.objects.order_by("-fecha_creacion", "-id")
+        for serializer_class in (PedidoSerializer, PedidoOpsSerializer):
+            esperado = serializer_class(qs.select_related("empresa"), many=True).data
+            reader = ValuesSerializer(serializer_class)
+            rapido = reader.data(reader.queryset(qs))
+            self.assertEqual(json.dumps(rapido), json.dumps(esperado), serializer_class.__name__)
+
+    def test_listados_paginan_igual(self):
+        from django.test import RequestFactory
+        from rest_framework.request import Request
+
+        from .pagination import paginate
+        from .serializers import PedidoOpsSerializer, PedidoSerializer
+
+        self.user.is_staff = True
+        self.user.save()
+        for url, serializer_class, qs in (
+            ("/api/mis-pedidos/", PedidoSerializer, Pedido.objects.select_related("empresa")),
+            ("/api/ops/pedidos/", PedidoOpsSerializer, Pedido.objects.all()),
+            ("/api/pedidos/", PedidoSerializer, Pedido.objects.select_related("empresa")),
+        ):
+            cursor_url = f"{url}?page_size=3"
+            while cursor_url:
+                res = self.client.get(cursor_url)
+                self.assertEqual(res.status_code, 200)
+                # la misma página por el serializer de DRF (paginate de siempre)
+                request = Request(RequestFactory().get(cursor_url))
+                esperado = paginate(request, qs, serializer_class, ordering=("-fecha_creacion", "-id")).data
+                self.assertEqual(json.loads(json.dumps(res.data)), json.loads(json.dumps(esperado)), cursor_url)
+                cursor_url = res.data["next"]
+
+
+class ClaimsAuthTest(ApiTestCase):
+    """Lecturas con JWT sin consultar el usuario; token_version revoca."""
+
+    def setUp(self):
+        from unittest import mock
+
+        from .auth import shared_cache
+
+        super().setUp()
+        # como con Redis: la LocMem de los tests es la única caché del proceso
+        self.real_shared_cache = shared_cache
+        patcher = mock.patch("pedidos.auth.shared_cache", return_value=True)
+        self.shared_cache = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        res = self.client.post("/api/token/", {"email": "ops@example.com", "password": "pass"}, format="json")
+        self.assertEqual(res.status_code, 200)
+        self.tokens = res.data
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}")
+
+    def _user_queries(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        return res, [q["sql"] for q in ctx.captured_queries if "pedidos_customuser" in q["sql"]]
+
+    def test_lecturas_sin_consultar_el_usuario(self):
+        Pedido.objects.create(user=self.user, empresa=self.empresa, fecha_inicio=timezone.now().date(), pax=3)
+        self._user_queries("/api/me/")  # la primera lee token_version y la deja en caché
+        res, queries = self._user_queries("/api/me/")
+        self.assertEqual(queries, [])
+        self.assertEqual(
+            (res.data["id"], res.data["email"], res.data["is_staff"], res.data["empresa_id"]),
+            (self.user.id, "ops@example.com", False, self.empresa.id),
+        )
+        res, queries = self._user_queries("/api/mis-pedidos/")
+        self.assertEqual(queries, [])
+        self.assertEqual(len(res.data["results"]), 1)
+
+    def test_polling_de_me_sin_consultas(self):
+        self.client.get("/api/me/")  # versión y nombre de la empresa a la caché
+        with self.assertNumQueries(0):
+            res = self.client.get("/api/me/")
+        self.assertEqual(res.data["empresa_name"], self.empresa.nombre)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.empresa.nombre = "Acme Renombrada"
+            self.empresa.save()
+        self.assertEqual(self.client.get("/api/me/").data["empresa_name"], "Acme Renombrada")
+
+    def test_cambio_de_contrasena_revoca_los_tokens(self):
+        self.assertEqual(self.client.get("/api/me/").status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password("otra")
+            self.user.save()
+
+        res = self.client.get("/api/me/")
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(res.data["code"], "token_revoked")
+        res = APIClient().post("/api/token/refresh/", {"refresh": self.tokens["refresh"]}, format="json")
+        self.assertEqual(res.status_code, 401)
+
+        # login nuevo: token con la versión actual
+        res = self.client.post("/api/token/", {"email": "ops@example.com", "password": "otra"}, format="json")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {res.data['access']}")
+        self.assertEqual(self.client.get("/api/me/").status_code, 200)
+
+    def test_last_login_no_revoca(self):
+        from django.contrib.auth.models import update_last_login
+
+        with self.captureOnCommitCallbacks(execute=True):
+            update_last_login(None, self.user)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_version, 0)
+        self.assertEqual(self.client.get("/api/me/").status_code, 200)
+
+    def test_escrituras_con_el_usuario_de_la_bd(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from unittest import mock
+
+        from .auth import ClaimsJWTAuthentication
+
+        self._user_queries("/api/me/")  # versión ya en caché: una lectura no tocaría la BD
+        get_user = ClaimsJWTAuthentication.get_user
+        with mock.patch.object(ClaimsJWTAuthentication, "get_user", autospec=True,
+                               side_effect=get_user) as loaded, \
+                CaptureQueriesContext(connection) as ctx:
+            res = self.client.post("/api/pedidos/bulk/", [{
+                "empresa": self.empresa.id, "excursion": "City", "fecha_inicio": "2025-06-01",
+                "tipo_servicio": "mediodia", "estado": "pagado", "pax": 10,
+            }], format="json")
+        self.assertEqual(res.status_code, 201, res.data)
+        loaded.assert_called_once()
+        self.assertTrue(any(
+            q["sql"].lstrip().startswith("SELECT") and "pedidos_customuser" in q["sql"]
+            for q in ctx.captured_queries
+        ))
+        pedido = Pedido.objects.get()
+        self.assertEqual(pedido.user_id, self.user.id)
+
+    def test_lectura_vieja_no_pisa_la_version_publicada(self):
+        from django.core.cache import cache
+
+        from .auth import _version_key
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password("otra")
+            self.user.save()
+        self.assertEqual(cache.get(_version_key(self.user.id)), 1)
+        # una lectura que leyó la versión 0 de la BD antes del commit llega tarde
+        cache.add(_version_key(self.user.id), 0)
+        res = self.client.get("/api/me/")
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(res.data["code"], "token_revoked")
+
+    def test_cache_por_proceso_lee_la_version_de_la_bd(self):
+        from unittest import mock
+
+        from django.core.cache.backends.locmem import LocMemCache
+
+        from . import auth
+
+        # worker B: ya tiene la versión 0 en su caché
+        self.assertEqual(self.client.get("/api/me/").status_code, 200)
+        # worker A (su propia LocMem) revoca
+        worker_a = LocMemCache("worker-a", {})
+        with mock.patch.object(auth, "cache", worker_a), self.captureOnCommitCallbacks(execute=True):
+            self.user.is_staff = True
+            self.user.save()
+        self.assertEqual(worker_a.get(auth._version_key(self.user.id)), 1)
+
+        # fiándose de su caché, B no se entera
+        self.assertEqual(self.client.get("/api/me/").status_code, 200)
+        # con la comprobación de verdad (LocMem no es compartida) va a la BD
+        self.shared_cache.side_effect = self.real_shared_cache
+        self.assertFalse(auth.shared_cache())
+        res = self.client.get("/api/me/")
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(res.data["code"], "token_revoked")
+        res = APIClient().post("/api/token/refresh/", {"refresh": self.tokens["refresh"]}, format="json")
+        self.assertEqual(res.status_code, 401)
+
+    def test_usuario_borrado(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        res = self.client.get("/api/me/")
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(res.data["code"], "user_not_found")
+
+
+class MigrationTest(TransactionTestCase):
+    """
+    La BD de tests sale de los modelos (TEST MIGRATE=False: 0009/0013 son SQL
+    de PostgreSQL), así que aquí se vuelve a 0016 y se aplican las
+    migraciones siguientes (backfills incluidos) sobre filas sembradas.
+    """
+    START = ("pedidos", "0016_keyset_indexes")
+
+    def _executor(self):
+        from django.db import connection
+        from django.db.migrations.executor import MigrationExecutor
+
+        return MigrationExecutor(connection)
+
+    def setUp(self):
+        from django.db import connection
+        from django.db.migrations.recorder import MigrationRecorder
+
+        # el esquema de los modelos = todas las migraciones aplicadas
+        recorder = MigrationRecorder(connection)
+        for app_label, name in self._executor().loader.disk_migrations:
+            recorder.record_applied(app_label, name)
+        executor = self._executor()
+        self.latest = executor.loader.graph.leaf_nodes("pedidos")
+        executor.migrate([self.START])
+
+    def tearDown(self):
+        executor = self._executor()
+        executor.loader.build_graph()
+        executor.migrate(self.latest)
+
+    def test_backfills_sobre_datos_antiguos(self):
+        from datetime import date, timedelta
+
+        old = self._executor().loader.project_state([self.START]).apps
+        Empresa_, User_, Pedido_ = (old.get_model("pedidos", m) for m in ("Empresa", "CustomUser", "Pedido"))
+        acme = Empresa_.objects.create(nombre="Acme")
+        user = User_.objects.create(username="u", email="u@example.com", empresa=" Acme ")  # texto libre
+        sin_empresa = User_.objects.create(username="v", email="v@example.com", empresa="Nadie")
+        Reminder_ = old.get_model("pedidos", "Reminder")
+        ahora = timezone.now()
+        vencido, futuro, hecho = (
+            Reminder_.objects.create(user_id=user.pk, title=t, due_at=ahora + delta, is_done=done)
+            for t, delta, done in (("vencido", -timedelta(days=30), False), ("futuro", timedelta(days=1), False),
+                                   ("hecho", -timedelta(days=2), True))
+        )
+        for i, fin in enumerate((None, date(2025, 6, 5))):
+            Pedido_.objects.create(
+                user_id=user.pk, empresa_id=acme.pk, fecha_inicio=date(2025, 6, 1), fecha_fin=fin,
+                pax=10 + i, estado="pagado", tipo_servicio="mediodia", excursion=f"Ronda {i}",
+                updates=[{"ts": "2025-06-01T10:00:00+00:00", "event": "created", "user_id": user.pk}],
+            )
+
+        executor = self._executor()
+        executor.loader.build_graph()
+        executor.migrate(self.latest)
+
+        from .models import PedidoDailySummary, PedidoEvent
+        from .search import search
+
+        self.assertEqual(get_user_model().objects.get(pk=user.pk).empresa_id, acme.pk)           # 0020
+        self.assertIsNone(get_user_model().objects.get(pk=sin_empresa.pk).empresa_id)
+        self.assertEqual(PedidoEvent.objects.filter(event="created", user_id=user.pk).count(), 2)  # 0018
+        resumen = PedidoDailySummary.objects.get()                                                 # 0023
+        self.assertEqual((resumen.dia, resumen.pedidos, resumen.pax), (date(2025, 6, 1), 2, 21))
+        self.assertEqual(                                                                          # 0024
+            sorted(Pedido.objects.values_list("fecha_fin_efectiva", flat=True)),
+            [date(2025, 6, 1), date(2025, 6, 5)],
+        )
+        self.assertEqual(search(Pedido.objects.all(), "ronda").count(), 2)                        # 0025
+        self.assertEqual(get_user_model().objects.get(pk=user.pk).token_version, 0)               # 0029
+        self.assertEqual(                                                                          # 0032
+            {r.title: r.notified_at for r in Reminder.objects.all()},
+            {"vencido": vencido.due_at, "futuro": None, "hecho": None},
+        )
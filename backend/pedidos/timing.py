@@ -0,0 +1,145 @@
+# backend/pedidos/timing.py
+"""
+Cabecera Server-Timing (la pone ServerTimingMiddleware, pedidos/middleware.py).
+
+    Server-Timing: db;dur=12.3;desc="8 queries", auth;dur=1.1,
+                   serialize;dur=30.2, render;dur=4.0, total;dur=51.7
+
+- db         execute_wrapper en cada conexión (se engancha con connection_created)
+- auth       Request._authenticate de DRF (JWT/Token; también el camino async)
+- serialize  BaseSerializer.data y ValuesSerializer.data (listados por values_list)
+- render     render() de la respuesta DRF (de process_template_response al
+             post_render_callback)
+- total      toda la petición vista desde el middleware
+
+auth, serialize y render no incluyen las queries que lancen dentro (un
+listado que evalúa el queryset al serializar las cuenta en db), así que se
+pueden sumar sin contar nada dos veces.
+
+La petición en curso va en un ContextVar: sirve igual con WSGI que con las
+vistas async (sync_to_async copia el contexto al hilo). Fuera de muestra el
+coste es un ContextVar.get() por query/serializer.
+
+install() parchea DRF una sola vez (lo llama el middleware al arrancar si el
+muestreo está activo). Las respuestas en streaming (?export=) solo miden hasta
+que empieza el cuerpo.
+"""
+import functools
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.request import Request
+from rest_framework.serializers import BaseSerializer
+
+from .values_serializers import ValuesSerializer
+
+_current = ContextVar("server_timing", default=None)
+_installed = False
+
+# orden de las métricas en la cabecera
+METRICS = ("db", "auth", "serialize", "render", "total")
+
+
+class Timing:
+    def __init__(self):
+        self.start = perf_counter()
+        self.db = 0.0
+        self.queries = 0
+        self.spans = {}      # métrica -> segundos (sin la BD de dentro)
+        self.active = set()  # métricas abiertas: un .data dentro de otro no cuenta dos veces
+
+    def add(self, name, seconds):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def header(self):
+        spans = {**self.spans, "db": self.db, "total": perf_counter() - self.start}
+        parts = []
+        for name in METRICS:
+            if name not in spans:
+                continue
+            part = f"{name};dur={spans[name] * 1000:.1f}"
+            if name == "db":
+                part += f';desc="{self.queries} queries"'
+            parts.append(part)
+        return ", ".join(parts)
+
+
+def start():
+    """Empieza a medir en el contexto actual. Devuelve (timing, token para stop)."""
+    # conexiones abiertas antes de install() (o en otro hilo): connection_created ya pasó
+    for connection in connections.all(initialized_only=True):
+        _hook_connection(connection)
+    timing = Timing()
+    return timing, _current.set(timing)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+# ---------------------------------------------------------
+# Ganchos
+# ---------------------------------------------------------
+
+def _db_wrapper(execute, sql, params, many, context):
+    timing = _current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    t0 = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.db += perf_counter() - t0
+        timing.queries += 1
+
+
+def _hook_connection(connection, **kwargs):
+    if _db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_wrapper)
+
+
+def _timed(name, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        timing = _current.get()
+        if timing is None or name in timing.active:
+            return func(*args, **kwargs)
+        timing.active.add(name)
+        t0, db0 = perf_counter(), timing.db
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timing.active.discard(name)
+            timing.add(name, perf_counter() - t0 - (timing.db - db0))
+    return wrapper
+
+
+def start_render(response):
+    """Desde process_template_response, justo antes de render()."""
+    timing = _current.get()
+    if timing is None:
+        return
+    t0, db0 = perf_counter(), timing.db
+
+    def done(rendered):
+        timing.add("render", perf_counter() - t0 - (timing.db - db0))
+
+    response.add_post_render_callback(done)
+
+
+def install():
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    connection_created.connect(_hook_connection)
+    # Serializer.data y ListSerializer.data acaban en BaseSerializer.data
+    BaseSerializer.data = property(_timed("serialize", BaseSerializer.data.fget))
+    ValuesSerializer.data = _timed("serialize", ValuesSerializer.data)
+    Request._authenticate = _timed("auth", Request._authenticate)
@@ -0,0 +1,119 @@
+# backend/pedidos/values_serializers.py
+"""
+Camino rápido de lectura para los listados grandes de pedidos.
+
+PedidoSerializer / PedidoOpsSerializer(many=True) construyen una instancia de
+Pedido por fila y pasan cada campo por get_attribute + to_representation de
+DRF; con miles de filas eso es casi todo el tiempo de la petición.
+ValuesSerializer saca la MISMA salida sin instancias:
+
+- la consulta es values_list(...) con solo las columnas que salen (las
+  relaciones como empresa.nombre van en el mismo SELECT: empresa__nombre)
+- cada columna lleva su conversor ya resuelto al construir el serializer
+  (fechas a ISO, datetimes a la zona actual con "Z"); las que DRF devuelve
+  tal cual (texto, enteros, choices, ids) no se tocan
+- las claves y su orden se toman de los campos del serializer original, así
+  que un campo nuevo en PedidoSerializer aparece solo aquí también
+
+Solo salida (list). Campos que no sabe traducir (SerializerMethodField,
+serializers anidados...) dan error al crear el ValuesSerializer: para esos
+hay que seguir con el serializer de DRF.
+
+Las filas son namedtuples (values_list(named=True)): KeysetPagination las
+pagina igual que instancias, y las columnas de ordenación que no salen en la
+respuesta (p. ej. search_rank) se añaden al final.
+"""
+import functools
+
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+# campos cuya to_representation devuelve el valor de la BD sin cambios
+_PASSTHROUGH = (
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.IntegerField,
+    serializers.BooleanField,
+    serializers.ReadOnlyField,
+)
+
+
+def _date_converter(field):
+    if getattr(field, "format", api_settings.DATE_FORMAT) != ISO_8601:
+        return field.to_representation
+    return lambda value: value.isoformat()
+
+
+def _datetime_converter(field):
+    if getattr(field, "format", api_settings.DATETIME_FORMAT) != ISO_8601:
+        return field.to_representation
+    # como DRF: a la zona del campo (o la actual) y "+00:00" -> "Z"
+    tz = getattr(field, "timezone", None) or field.default_timezone()
+
+    def convert(value):
+        text = (value.astimezone(tz) if tz is not None else value).isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+
+    return convert
+
+
+@functools.cache
+def _columns(serializer_class):
+    """[(clave, columna de values_list, tipo de conversor)] de los campos de lectura."""
+    model = serializer_class.Meta.model
+    columns = []
+    for key, field in serializer_class().fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+            columns.append((key, model._meta.get_field(field.source).attname, None))
+        elif isinstance(field, serializers.DateTimeField):
+            columns.append((key, field.source.replace(".", "__"), "datetime"))
+        elif isinstance(field, serializers.DateField):
+            columns.append((key, field.source.replace(".", "__"), "date"))
+        elif isinstance(field, _PASSTHROUGH) and not isinstance(field, serializers.MultipleChoiceField):
+            columns.append((key, field.source.replace(".", "__"), None))
+        else:
+            raise TypeError(f"{serializer_class.__name__}.{key}: {type(field).__name__} no soportado")
+    return tuple(columns)
+
+
+class ValuesSerializer:
+    """
+    ValuesSerializer(PedidoSerializer): .queryset(qs) para la consulta y
+    .data(filas) para la salida (lista de dicts, igual que .data de DRF).
+    """
+
+    def __init__(self, serializer_class):
+        columns = _columns(serializer_class)
+        fields = serializer_class().fields
+        self.keys = [key for key, _, _ in columns]
+        self.values = [value for _, value, _ in columns]
+        self.converters = []
+        for i, (key, _, kind) in enumerate(columns):
+            if kind == "datetime":
+                self.converters.append((i, _datetime_converter(fields[key])))
+            elif kind == "date":
+                self.converters.append((i, _date_converter(fields[key])))
+
+    def queryset(self, queryset, extra=()):
+        """values_list con las columnas de salida (+ `extra`, p. ej. las de ordenación)."""
+        extra = [name for name in extra if name not in self.values]
+        return queryset.values_list(*self.values, *extra, named=True)
+
+    def data(self, rows):
+        keys, converters = self.keys, self.converters
+        out = []
+        for row in rows:
+            values = list(row)
+            for i, convert in converters:
+                value = values[i]
+                if value is not None:
+                    values[i] = convert(value)
+            out.append(dict(zip(keys, values)))  # zip corta las columnas extra
+        return out
+
+
+def ordering_columns(ordering):
+    """Columnas de `keyset_ordering` (sin el signo) para ValuesSerializer.queryset."""
+    return [name.lstrip("-") for name in ordering]
@@ -1,26 +1,57 @@
+import ast
+import codecs
 import logging
 import json
 from datetime import datetime, timedelta
 
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.db import transaction
-from django.db.models import Q  
+from django.db.models import Q
 from django.shortcuts import get_object_or_404
 
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from rest_framework.views import APIView
 
-from .models import Pedido, Empresa, PedidoCrucero, Reminder
+from .models import ManifestJob, Pedido, PedidoEvent, Empresa, PedidoCrucero, Reminder
 from .serializers import (
     PedidoSerializer,
     PedidoOpsSerializer,
     PedidoOpsWriteSerializer,
     EmpresaSerializer,
     PedidoCruceroSerializer,
+    PedidoEventSerializer,
+    PedidoBulkSerializer,
     ReminderSerializer,
     EmailTokenObtainPairSerializer,
+    ManifestJobSerializer,
+)
+from .pagination import paginate, paginate_values
+from .cache import (
+    cached_data,
+    cached_value,
+    crucero_tag,
+    empresa_tags,
+    invalidation_batch,
+    pedido_tag,
+)
+from .conditional import collection_validators, not_modified, object_validators, with_validators
+from .crucero_merge import create_pedidos, group_rows, merge_groups, normalize_payload
+from .crucero_csv import ManifestError, import_manifest
+from .stats import summary_stats
+from .planner import plan_from_params
+from .recurrence import advance, exception_key, is_occurrence, merge_page
+from .pedido_batch import MAX_ROWS, create_batch
+from .search import SEARCH_ORDERING, search
+from .exports import (
+    CRUCERO_EXPORT_COLUMNS,
+    PEDIDO_OPS_EXPORT_COLUMNS,
+    export_response,
+    requested_format,
 )
 from rest_framework_simplejwt.views import TokenObtainPairView
 
@@ -36,11 +67,22 @@ class PedidoViewSet(viewsets.ReadOnlyModelViewSet):
     """
     serializer_class = PedidoSerializer
     permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = ("-fecha_creacion", "-id")
 
     def get_queryset(self):
         # pedidos visibles solo del usuario autenticado
         user = self.request.user
-        return Pedido.objects.filter(user=user).order_by("-fecha_creacion")
+        return (
+            Pedido.objects.filter(user=user).defer("updates").select_related("empresa")
+            .order_by("-fecha_creacion", "-id")
+        )
+
+    def list(self, request, *args, **kwargs):
+        # sin instancias (values_serializers.py); misma salida que PedidoSerializer
+        return paginate_values(request, self.get_queryset(), PedidoSerializer, view=self)
+
+    def retrieve(self, request, *args, **kwargs):
+        return _conditional_retrieve(self, request)
 
 
 class EmailTokenObtainPairView(TokenObtainPairView):
@@ -50,21 +92,50 @@ class EmailTokenObtainPairView(TokenObtainPairView):
 class MisPedidosView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    keyset_ordering = ("-fecha_creacion", "-id")
+
     def get(self, request):
+        # empresa.nombre va en el mismo SELECT (empresa__nombre en values_list)
         pedidos = Pedido.objects.filter(user=request.user)
-        serializer = PedidoSerializer(pedidos, many=True)
-        return Response(serializer.data)
+        validators = collection_validators(request, pedidos, "fecha_modificacion")
+        cached = not_modified(request, validators)
+        if cached is not None:
+            return cached
+        return with_validators(paginate_values(request, pedidos, PedidoSerializer, view=self), validators)
 
 
 class BulkPedidos(APIView):
+    """
+    POST /api/pedidos/bulk/  [ {pedido}, ... ]  (hasta MAX_ROWS filas)
+
+    Alta masiva con éxito parcial (ver pedido_batch.py): crea las filas
+    válidas y devuelve el resultado por índice de fila. 201 si se ha creado
+    alguna, 400 si ninguna.
+    """
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request):
-        ser = PedidoSerializer(data=request.data, many=True)
-        if ser.is_valid():
-            ser.save()
-            return Response({"created": len(ser.data)})
-        return Response(ser.errors, status=status.HTTP_400_BAD_REQUEST)
+        rows = request.data
+        if not isinstance(rows, list) or not rows:
+            return Response({"detail": "Se espera una lista de pedidos."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > MAX_ROWS:
+            return Response({"detail": f"Como mucho {MAX_ROWS} filas por petición."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        with invalidation_batch():
+            result = create_batch(rows, request.user)
+        code = status.HTTP_201_CREATED if result["created"] else status.HTTP_400_BAD_REQUEST
+        return Response(result, status=code)
+
+
+def _conditional_retrieve(view, request):
+    """retrieve con ETag por fila (pk + fecha_modificacion); 304 sin serializar."""
+    obj = view.get_object()
+    validators = object_validators(obj, "fecha_modificacion")
+    cached = not_modified(request, validators)
+    if cached is not None:
+        return cached
+    return with_validators(Response(view.get_serializer(obj).data), validators)
 
 
 # ---------------------------------------------------------
@@ -76,12 +147,62 @@ class CruceroBulkView(APIView):
 
     # ---------- GET con ordering flexible ----------
     def get(self, request):
+        """
+        Listado de cruceros. Con ?export=csv|ndjson se devuelve en streaming
+        (mismo ordering), sin cargar la tabla entera en memoria.
+        Con If-None-Match → 304 si no ha cambiado nada.
+        ?q= busca en supplier/ship/sign/excursion/contacto/terminal (search.py).
+        """
+        qs = self._ordered_queryset(request)
+
+        validators = collection_validators(request, qs, "updated_at")
+        cached = not_modified(request, validators)
+        if cached is not None:
+            return cached
+
+        fmt = requested_format(request)
+        if fmt:
+            return with_validators(export_response(qs, CRUCERO_EXPORT_COLUMNS, fmt, "cruceros"), validators)
+
+        # el manifiesto es el mismo para todos los usuarios
+        data = cached_data(
+            request, "cruceros", [crucero_tag(*self._group(request))],
+            lambda: PedidoCruceroSerializer(qs, many=True).data,
+            scope="all",
+        )
+        return with_validators(Response(data, status=status.HTTP_200_OK), validators)
+
+    @staticmethod
+    def _group(request):
+        """(service_date, ship) de los query params; una fecha inválida no filtra."""
+        service_date = request.query_params.get("service_date")
+        try:
+            service_date = datetime.fromisoformat(service_date).date() if service_date else None
+        except ValueError:
+            service_date = None
+        return service_date, request.query_params.get("ship") or None
+
+    def _ordered_queryset(self, request):
         log = logging.getLogger(__name__)
         ordering_raw = request.query_params.getlist("ordering")
         log.info("ordering param crudo → %s", ordering_raw)
 
         qs = PedidoCrucero.objects.all()
 
+        # filtros opcionales por grupo (?service_date=YYYY-MM-DD&ship=...)
+        service_date, ship = self._group(request)
+        if service_date:
+            qs = qs.filter(service_date=service_date)
+        if ship:
+            qs = qs.filter(ship=ship)
+
+        # texto libre (?q=): sin ?ordering explícito, por relevancia
+        query_text = request.query_params.get("q")
+        if query_text:
+            qs = search(qs, query_text)
+            if not ordering_raw:
+                return qs.order_by(*SEARCH_ORDERING)
+
         if ordering_raw:
             order_fields: list[str] = []
             for item in ordering_raw:
@@ -109,10 +230,10 @@ class CruceroBulkView(APIView):
         else:
             qs = qs.order_by("-updated_at", "-uploaded_at")
 
-        serializer = PedidoCruceroSerializer(qs, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return qs
 
     # ---------- POST con reglas preliminary/final + creación de Pedidos ----------
+    # ?async=1 -> 202 y lo procesa el worker de pedidos/jobs.py
     def post(self, request):
         payload = request.data
 
@@ -120,107 +241,126 @@ class CruceroBulkView(APIView):
         printing_dt = timezone.now()
 
         # Normaliza a rows + meta y fuerza printing_date desde servidor
-        if isinstance(payload, dict) and "rows" in payload:
-            meta = payload.get("meta", {}) or {}
-            rows = payload.get("rows", []) or []
-
-            common_keys = (
-                "service_date", "ship", "status", "terminal",
-                "supplier", "emergency_contact"
-            )
-
-            full_rows = []
-            for r in rows:
-                rr = dict(r)
-                for k in common_keys:
-                    v = meta.get(k, None)
-                    if v not in (None, ""):
-                        rr[k] = v
-                rr["printing_date"] = printing_dt  # siempre desde backend
-                full_rows.append(rr)
-            rows = full_rows
-        else:
-            meta = {}
-            rows = payload if isinstance(payload, list) else []
-            rows = [{**r, "printing_date": printing_dt} for r in rows]
+        rows, meta = normalize_payload(payload)
+        if (request.query_params.get("async") or "").lower() in ("1", "true", "yes", "y"):
+            return self._enqueue(request, rows, meta)
+        rows = [{**r, "printing_date": printing_dt} for r in rows]  # siempre desde backend
 
         # Valida cruceros
         ser = PedidoCruceroSerializer(data=rows, many=True)
         ser.is_valid(raise_exception=True)
         rows_data = ser.validated_data
 
-        created = overwritten = blocked = 0
-        blocked_groups = []
         created_pedidos = 0
 
-        # Agrupar por (fecha, barco)
-        groups = {}
-        for r in rows_data:
-            groups.setdefault((r["service_date"], r["ship"]), []).append(r)
+        # Agrupar por (fecha, barco) y aplicar merge por (fecha, barco, sign)
+        groups = group_rows(rows_data)
 
         with transaction.atomic():
-            for (service_date, ship), lote in groups.items():
-                new_status = (lote[0]["status"] or "").lower()
-                qs = PedidoCrucero.objects.filter(service_date=service_date, ship=ship)
-
-                final_exists = qs.filter(status__iexact="final").exists()
-                if new_status == "preliminary" and final_exists:
-                    blocked += len(lote)
-                    blocked_groups.append({"service_date": service_date, "ship": ship})
-                    continue
-
-                overwritten += qs.count()
-                qs.delete()
-
-                PedidoCrucero.objects.bulk_create([PedidoCrucero(**r) for r in lote])
-                created += len(lote)
-
-                # Crear también Pedidos si meta.empresa está presente
-                empresa_id = meta.get("empresa")
-                if empresa_id:
-                    estado_pedido = meta.get("estado_pedido") or "pagado"
-
-                    ped_objs = []
-                    for r in lote:
-                        kwargs = dict(
-                            empresa_id=empresa_id,
-                            user=request.user,
-                            excursion=r.get("excursion") or "",
-                            estado=estado_pedido,
-                            # ¡Eliminados: lugar_entrega, lugar_recogida, emisores!
-                            fecha_inicio=service_date,
-                            fecha_fin=None,
-                            pax=r.get("pax") or 0,
-                            bono=r.get("sign") or "",
-                            guia="",
-                            tipo_servicio="crucero",
-                            notas="; ".join(
-                                x for x in [
-                                    f"Barco: {ship}",
-                                    f"Idioma: {r.get('language') or ''}",
-                                    f"Hora: {r.get('arrival_time') or ''}",
-                                    f"Proveedor: {lote[0].get('supplier') or ''}",
-                                    f"Terminal: {lote[0].get('terminal') or ''}",
-                                    f"Impresión: {printing_dt.isoformat(timespec='minutes')}",
-                                ] if x and not x.endswith(': ')
-                            ),
-                        )
-                        ped_objs.append(Pedido(**kwargs))
-
-                    if ped_objs:
-                        Pedido.objects.bulk_create(ped_objs)
-                        created_pedidos += len(ped_objs)
+            merge = merge_groups(groups, printing_dt=printing_dt)
+
+            # Crear también Pedidos si meta.empresa está presente
+            empresa_id = meta.get("empresa")
+            if empresa_id:
+                created_pedidos = create_pedidos(
+                    merge["applied"], empresa_id, request.user, printing_dt,
+                    estado=meta.get("estado_pedido") or "pagado",
+                )
 
         return Response(
             {
-                "created": created,
-                "overwritten": overwritten,
-                "blocked": blocked,
-                "blocked_groups": blocked_groups,
+                "created": merge["created"],
+                "overwritten": merge["overwritten"],
+                "blocked": merge["blocked"],
+                "blocked_groups": merge["blocked_groups"],
                 "created_pedidos": created_pedidos,
+                "inserted": merge["inserted"],
+                "updated": merge["updated"],
+                "unchanged": merge["unchanged"],
+                "removed": merge["removed"],
             },
             status=status.HTTP_201_CREATED,
         )
+
+    def _enqueue(self, request, rows, meta):
+        """?async=1: se guarda el lote y lo procesa el worker (manage.py run_jobs)."""
+        job = ManifestJob.objects.create(user=request.user, payload={"rows": rows, "meta": meta})
+        url = reverse("job-detail", args=[job.pk], request=request)
+        return Response(
+            {"job": job.pk, "status": job.status, "url": url},
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Location": url},
+        )
+
+
+class JobDetailView(APIView):
+    """
+    GET /api/jobs/<id>/  estado de una subida en segundo plano: status,
+    progreso por grupos (groups_done / groups_total), los contadores de
+    /cruceros/bulk/ en "result" y, si ha fallado, "errors".
+    Cada usuario ve sus jobs; staff, todos.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        qs = ManifestJob.objects.defer("payload")
+        if not request.user.is_staff:
+            qs = qs.filter(user=request.user)
+        job = get_object_or_404(qs, pk=pk)
+        return Response(ManifestJobSerializer(job).data)
+
+
+class CruceroUploadView(APIView):
+    """
+    POST /api/pedidos/cruceros/upload/  (multipart)
+
+      file            CSV del proveedor (cabeceras con alias, ver crucero_csv.py)
+      encoding        opcional, por defecto utf-8 (p. ej. cp1252 para Excel antiguo)
+      service_date, ship, status, terminal, supplier, emergency_contact
+                      opcionales: fijan ese campo para todo el fichero
+      empresa, estado_pedido
+                      opcionales: crear también Pedidos (como meta en /bulk/)
+
+    Se procesa en streaming por trozos con el mismo merge que /bulk/. 201 con
+    los contadores; 400 con errores por línea (y no se guarda nada).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def post(self, request):
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({"file": "Adjunta el CSV en el campo 'file'."}, status=status.HTTP_400_BAD_REQUEST)
+        encoding = request.data.get("encoding") or "utf-8-sig"
+        try:
+            # rot13, hex, base64... existen pero no son codificaciones de texto:
+            # TextIOWrapper los rechaza con LookupError (500)
+            text_encoding = getattr(codecs.lookup(encoding), "_is_text_encoding", True)
+        except LookupError:
+            text_encoding = False
+        if not text_encoding:
+            return Response({"encoding": "Codificación desconocida."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            with transaction.atomic():
+                result = import_manifest(
+                    upload.file, request.data, request.user, timezone.now(), encoding=encoding,
+                )
+                if result["errors"]:
+                    transaction.set_rollback(True)
+        except ManifestError as e:
+            return Response({"file": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if result["errors"]:
+            return Response(
+                {"detail": "Hay filas con errores; no se ha guardado nada.",
+                 "rows": result["rows"], "errors": result["errors"]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        del result["errors"]
+        return Response(result, status=status.HTTP_201_CREATED)
+
+
 # feedback se guarda en request para que Middleware/Response lo lea
 def _add_feedback(request, ship, sd, status, n):
     msg = f"♻️ Sobrescrito {ship} {sd} ({status}) con {n} excursiones nuevas"
@@ -260,26 +400,41 @@ class EmpresaViewSet(viewsets.ReadOnlyModelViewSet):
     GET /api/empresas/ (staff: todas | no-staff: solo la suya)
     """
     permission_classes = [permissions.IsAuthenticated]
-    queryset = Empresa.objects.all().order_by("nombre")
+    queryset = Empresa.objects.all().order_by("nombre", "id")
     serializer_class = EmpresaSerializer
+    keyset_ordering = ("nombre", "id")
 
     def get_queryset(self):
         qs = super().get_queryset()
         u = self.request.user
         if u.is_staff:
             return qs
-        nombre = (getattr(u, "empresa", "") or "").strip()
-        return qs.filter(nombre=nombre) if nombre else qs.none()
+        return qs.filter(pk=u.empresa_id) if u.empresa_id else qs.none()
+
+    def list(self, request, *args, **kwargs):
+        u = request.user
+        tags = empresa_tags() if u.is_staff else empresa_tags(u.empresa_id)
+        data = cached_data(
+            request, "empresas", tags,
+            lambda: super(EmpresaViewSet, self).list(request, *args, **kwargs).data,
+        )
+        return Response(data)
 
 class PedidoOpsViewSet(viewsets.ModelViewSet):
     """
     Endpoint OFICIAL para crear, editar y gestionar pedidos operativos.
 
     - GET /api/ops/pedidos/              -> listado filtrable (panel operaciones)
+                                            ?estado= ?tipo_servicio= ?desde= ?hasta= ?empresa= ?activos=1
+                                            ?dia= ?solapa_desde= ?solapa_hasta= (solape con el rango)
+                                            ?q= (texto en excursion/notas/bono/guia/lugares, por relevancia)
+    - GET /api/ops/pedidos/?export=csv|ndjson -> mismo listado en streaming
     - POST /api/ops/pedidos/             -> crear pedido
     - PATCH /api/ops/pedidos/{id}/       -> editar pedido parcial
     - POST /api/ops/pedidos/{id}/delivered/ -> marcar entregado
     - POST /api/ops/pedidos/{id}/collected/ -> marcar recogido
+    - GET /api/ops/pedidos/{id}/history/ -> historial (PedidoEvent), paginado
+    - POST /api/ops/pedidos/bulk/        -> entregar/recoger/editar varios a la vez
 
     Reglas:
     - perform_create fuerza user=request.user.
@@ -290,7 +445,9 @@ class PedidoOpsViewSet(viewsets.ModelViewSet):
     """
 
     permission_classes = [permissions.IsAuthenticated]  # o tu permiso custom IsAuthenticatedAndOwnerOrStaff
-    queryset = Pedido.objects.all().order_by("-fecha_creacion")
+    queryset = Pedido.objects.all().order_by("-fecha_creacion", "-id")
+    # paginación keyset: ?cursor=...&page_size=N (ver pagination.py)
+    keyset_ordering = ("-fecha_creacion", "-id")
 
     def get_serializer_class(self):
         # Para lectura (GET) usamos el serializer de lectura
@@ -302,17 +459,27 @@ class PedidoOpsViewSet(viewsets.ModelViewSet):
         # Para acciones custom tipo delivered/collected, vamos a devolver lectura final
         if self.action in ["delivered", "collected"]:
             return PedidoOpsSerializer
+        if self.action == "history":
+            return PedidoEventSerializer
+        if self.action == "bulk":
+            return PedidoBulkSerializer
         # fallback seguro
         return PedidoOpsSerializer
 
-    def get_queryset(self):
+    def _scoped_queryset(self):
         user = self.request.user
-        qs = Pedido.objects.all()
+        # el JSON legacy `updates` no se carga nunca (historial en PedidoEvent)
+        qs = Pedido.objects.defer("updates")
 
         # Si NO es staff, solo sus pedidos o de su empresa (dependiendo de tu regla)
         if not user.is_staff:
             # restringimos pedidos visibles
             qs = qs.filter(user=user)
+        return qs
+
+    def get_queryset(self):
+        user = self.request.user
+        qs = self._scoped_queryset()
 
         # filtros query params
         params = self.request.query_params
@@ -322,6 +489,11 @@ class PedidoOpsViewSet(viewsets.ModelViewSet):
         if estado:
             qs = qs.filter(estado=estado)
 
+        # solo activos (?activos=1): todo lo que no está recogido (índice parcial)
+        activos = params.get("activos")
+        if activos and activos.lower() in ("1", "true", "yes", "y"):
+            qs = qs.exclude(estado="recogido")
+
         # por tipo de servicio (?tipo_servicio=dia_Completo / mediodia / circuito / crucero ...)
         tipo_servicio = params.get("tipo_servicio")
         if tipo_servicio:
@@ -345,13 +517,65 @@ class PedidoOpsViewSet(viewsets.ModelViewSet):
             except ValueError:
                 pass
 
+        # solape (?solapa_desde=&solapa_hasta=, o ?dia=D para un solo día): pedidos
+        # con material fuera algún día del rango. desde/hasta solo miran fecha_inicio
+        # y se dejan los circuitos que empezaron antes. Índice idx_pedido_solape.
+        solapa_desde = params.get("solapa_desde") or params.get("dia")
+        solapa_hasta = params.get("solapa_hasta") or params.get("dia")
+
+        if solapa_desde:
+            try:
+                d = datetime.fromisoformat(solapa_desde).date()
+                qs = qs.filter(fecha_fin_efectiva__gte=d)
+            except ValueError:
+                pass
+
+        if solapa_hasta:
+            try:
+                h = datetime.fromisoformat(solapa_hasta).date()
+                qs = qs.filter(fecha_inicio__lte=h)
+            except ValueError:
+                pass
+
         # empresa específica (solo staff debería poder filtrar esto)
         empresa_id = params.get("empresa")
         if empresa_id and user.is_staff:
             qs = qs.filter(empresa_id=empresa_id)
 
+        # texto libre (?q=): índice FTS (search.py), ordenado por relevancia
+        query_text = params.get("q")
+        if query_text:
+            self.keyset_ordering = SEARCH_ORDERING
+            return search(qs, query_text).order_by(*SEARCH_ORDERING)
+
         return qs.order_by("-fecha_creacion", "-id")
 
+    def list(self, request, *args, **kwargs):
+        qs = self.get_queryset()
+        validators = collection_validators(request, qs, "fecha_modificacion")
+        cached = not_modified(request, validators)
+        if cached is not None:
+            return cached
+
+        fmt = requested_format(request)
+        if fmt:
+            return with_validators(export_response(qs, PEDIDO_OPS_EXPORT_COLUMNS, fmt, "pedidos"), validators)
+        # listado sin instancias (values_serializers.py): misma salida que PedidoOpsSerializer
+        data = cached_data(
+            request, "ops_pedidos", self._cache_tags(),
+            lambda: paginate_values(request, qs, PedidoOpsSerializer, view=self).data,
+        )
+        return with_validators(Response(data), validators)
+
+    def _cache_tags(self):
+        user = self.request.user
+        if not user.is_staff:
+            return [pedido_tag(user_id=user.pk)]
+        return [pedido_tag(empresa_id=self.request.query_params.get("empresa"))]
+
+    def retrieve(self, request, *args, **kwargs):
+        return _conditional_retrieve(self, request)
+
     def perform_create(self, serializer):
         # SIEMPRE atamos el pedido al usuario autenticado
         serializer.save(user=self.request.user)
@@ -370,7 +594,7 @@ class PedidoOpsViewSet(viewsets.ModelViewSet):
 
         Qué hace:
         - Cambia estado a "entregado"
-        - Añade un evento a `updates` con delivered_pax
+        - Añade un PedidoEvent con delivered_pax
         - Si override_pax=true, actualiza self.pax
         - Guarda todo
         - Devuelve el pedido actualizado
@@ -384,9 +608,9 @@ class PedidoOpsViewSet(viewsets.ModelViewSet):
         # IMPORTANTE:
         # set_delivered ya se encarga de:
         # - self.estado = "entregado"
-        # - loggear delivered_pax y note dentro de updates
+        # - registrar delivered_pax y note como PedidoEvent (un INSERT)
         # - si override_pax=True => self.pax = delivered_pax
-        # - save(update_fields=["estado", "updates", "pax"])
+        # - save(update_fields=["estado", "pax", "fecha_modificacion"])
         pedido.set_delivered(
             user=request.user,
             note=note,
@@ -401,7 +625,7 @@ class PedidoOpsViewSet(viewsets.ModelViewSet):
     def collected(self, request, pk=None):
         """
         Marcar el pedido como RECOGIDO.
-        Opcionalmente puedes mandar "note" en el body para guardar en updates.
+        Opcionalmente puedes mandar "note" en el body para guardar en el historial.
         {
             "note": "recogido todo ok"
         }
@@ -417,19 +641,112 @@ class PedidoOpsViewSet(viewsets.ModelViewSet):
         serializer = PedidoOpsSerializer(pedido, context={"request": request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        """
+        Entregar / recoger / editar muchos pedidos en una sola petición.
+        Un UPDATE por operación y los eventos con bulk_create, todo en una
+        transacción. Mismo scoping que el resto (no-staff: solo los suyos).
+
+        Respuesta:
+        {
+            "updated": 2,
+            "results": [{"id": 1, "status": "ok"}, {"id": 9, "status": "not_found"}]
+        }
+        """
+        ser = PedidoBulkSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        data = ser.validated_data
+        ids = data["ids"]
+        note = data.get("note") or None
+
+        if data["action"] == "delivered":
+            changes, event = {"estado": "entregado"}, "delivered"
+        elif data["action"] == "collected":
+            changes, event = {"estado": "recogido"}, "collected"
+        else:
+            changes, event = dict(data["patch"]), "updated"
+            detalle = "; ".join(f"{k}={v}" for k, v in changes.items())
+            note = f"{detalle}; {note}" if note else detalle
+
+        with transaction.atomic():
+            found = set(
+                self._scoped_queryset()
+                .select_for_update()
+                .filter(pk__in=ids)
+                .values_list("pk", flat=True)
+            )
+            updated = Pedido.bulk_apply(
+                [pk for pk in ids if pk in found],
+                changes,
+                event,
+                user=request.user,
+                note=note,
+            )
+
+        results = [
+            {"id": pk, "status": "ok" if pk in found else "not_found"}
+            for pk in ids
+        ]
+        return Response({"updated": updated, "results": results}, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["get"])
+    def history(self, request, pk=None):
+        """
+        Historial del pedido (más reciente primero), paginado por cursor.
+        """
+        pedido = self.get_object()
+        events = PedidoEvent.objects.filter(pedido_id=pedido.pk)
+        return paginate(request, events, PedidoEventSerializer, ordering=("-ts", "-id"))
+
+class OpsStatsView(APIView):
+    """
+    GET /api/ops/stats/ -> dashboard (pedidos, pax, emisores) desde PedidoDailySummary,
+    sin tocar la tabla de pedidos.
+
+    Filtros: ?desde=YYYY-MM-DD ?hasta=YYYY-MM-DD ?empresa= (staff) ?tipo_servicio= ?estado=
+    Agrupación: ?group_by=dia,empresa,tipo_servicio,estado (por defecto todas)
+    No-staff: solo su empresa.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response(summary_stats(request.user, request.query_params))
+
+
+class OpsPlannerView(APIView):
+    """
+    GET /api/ops/planner/ -> emisores/receptores fuera cada día y días que
+    superan el stock (ver planner.py). Solo staff: el stock es de todos.
+
+    ?desde=YYYY-MM-DD ?hasta=YYYY-MM-DD (por defecto el año en curso)
+    ?empresa= ?stock_emisores= ?stock_receptores= (por defecto los de settings)
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(plan_from_params(request.query_params))
+
+
 class ReminderViewSet(viewsets.ModelViewSet):
     """
     Recordatorios personales del usuario autenticado.
     Permite filtrar por:
       - done=true/false
       - overdue=true (atrasados)
-      - q=texto (busca en title / notes)
+      - q=texto (busca en title / note con el índice FTS; ordena por relevancia)
       - due_before=YYYY-MM-DD
       - due_after=YYYY-MM-DD
     Orden: primero no hechos, luego más urgentes.
+
+    Series recurrentes (pedidos/recurrence.py): con ?due_before= (ventana) el
+    listado incluye cada ocurrencia de la ventana, generada al vuelo
+    (is_occurrence=true, id = el de la serie). Sin ventana sale la serie una
+    vez, con su próxima ocurrencia.
     """
     serializer_class = ReminderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = ("is_done", "due_at", "id")
 
     def get_queryset(self):
         user = self.request.user
@@ -452,43 +769,92 @@ class ReminderViewSet(viewsets.ModelViewSet):
         if overdue and overdue.lower() in ("1", "true", "yes", "y"):
             qs = qs.filter(is_done=False, due_at__lt=timezone.now())
 
-        # q=texto libre
-        query_text = params.get("q")
-        if query_text:
-            qs = qs.filter(
-                Q(title__icontains=query_text) |
-                Q(notes__icontains=query_text)
-            )
 
-        # due_before / due_after (YYYY-MM-DD)
-        due_before = params.get("due_before")
+        # due_before / due_after (YYYY-MM-DD); si no es fecha válida, se ignora
+        due_before = self._param_datetime("due_before")
         if due_before:
-            try:
-                cutoff = datetime.fromisoformat(due_before)
-                qs = qs.filter(due_at__lte=cutoff)
-            except ValueError:
-                pass  # si no es fecha válida, lo ignoramos
+            qs = qs.filter(due_at__lte=due_before)
 
-        due_after = params.get("due_after")
+        due_after = self._param_datetime("due_after")
         if due_after:
-            try:
-                cutoff = datetime.fromisoformat(due_after)
-                qs = qs.filter(due_at__gte=cutoff)
-            except ValueError:
-                pass
+            qs = qs.filter(due_at__gte=due_after)
+
+        # q=texto libre: índice FTS (search.py), por relevancia
+        query_text = params.get("q")
+        if query_text:
+            self.keyset_ordering = SEARCH_ORDERING
+            return search(qs, query_text).order_by(*SEARCH_ORDERING)
 
         # Orden final: primero los no hechos, luego por fecha, luego id
         qs = qs.order_by("is_done", "due_at", "id")
         return qs
 
+    def _param_datetime(self, name):
+        raw = self.request.query_params.get(name)
+        if not raw:
+            return None
+        try:
+            value = datetime.fromisoformat(raw)
+        except ValueError:
+            return None
+        return timezone.make_aware(value) if timezone.is_naive(value) else value
+
+    def list(self, request, *args, **kwargs):
+        end = self._param_datetime("due_before")
+        params = request.query_params
+        if end is None or params.get("q"):
+            return super().list(request, *args, **kwargs)
+
+        # ventana: filas normales (+ series ya terminadas) y ocurrencias generadas
+        start = self._param_datetime("due_after")
+        qs = self.get_queryset()
+        singles = qs.filter(Q(recurrence="") | Q(is_done=True))
+        series = Reminder.objects.filter(user=request.user, is_done=False, due_at__lte=end).exclude(recurrence="")
+        if start:
+            series = series.filter(Q(recurrence_until__isnull=True) | Q(recurrence_until__gte=start))
+        if (params.get("done") or "").lower() in ("1", "true", "yes", "y"):
+            series = series.none()
+        if (params.get("overdue") or "").lower() in ("1", "true", "yes", "y"):
+            end = min(end, timezone.now())
+
+        page = merge_page(self.paginator, singles, series, request, self, start, end)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
     @action(detail=True, methods=["post"])
     def done(self, request, pk=None):
         """
-        Marcar recordatorio como hecho (is_done=True).
+        Marcar recordatorio como hecho (is_done=True). En una serie recurrente
+        pasa a la siguiente ocurrencia (solo acaba al pasar recurrence_until).
         """
         reminder = self.get_object()
-        reminder.is_done = True
-        reminder.save(update_fields=["is_done"])
+        reminder.mark_done()
+        return Response(self.serializer_class(reminder).data)
+
+    @action(detail=True, methods=["post"])
+    def skip(self, request, pk=None):
+        """
+        Saltar una ocurrencia de una serie: {"occurrence": "<due_at ISO>"}.
+        La próxima (la guardada en due_at) hace avanzar la serie; las demás
+        se guardan como excepción.
+        """
+        reminder = self.get_object()
+        raw = request.data.get("occurrence")
+        when = parse_datetime(raw) if isinstance(raw, str) else None
+        if when is not None and timezone.is_naive(when):
+            when = timezone.make_aware(when)
+        if not reminder.recurrence or when is None or not is_occurrence(reminder, when):
+            return Response(
+                {"occurrence": "No es una ocurrencia de esta serie."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if when == reminder.due_at:
+            if not advance(reminder, when):
+                reminder.is_done = True
+        else:
+            reminder.recurrence_exceptions = [*reminder.recurrence_exceptions, exception_key(when)]
+        reminder.save(update_fields=[
+            "due_at", "is_done", "notified_at", "recurrence_exceptions", "updated_at",
+        ])
         return Response(self.serializer_class(reminder).data)
 
 # ---------------------------------------------------------
@@ -499,13 +865,17 @@ class ReminderViewSet(viewsets.ModelViewSet):
 def me_view(request):
     """
     Devuelve info del usuario + empresa_id resuelta (si existe).
+    El nombre de la empresa sale de la caché (tags empresa:<id>), así que con
+    el usuario de los claims (auth.py) el polling no hace consultas.
     """
     u = request.user
-    empresa_name = (getattr(u, "empresa", "") or "").strip()
-    empresa_id = None
-    if empresa_name:
-        from .models import Empresa
-        empresa_id = Empresa.objects.filter(nombre=empresa_name).values_list("id", flat=True).first()
+    empresa_id = getattr(u, "empresa_id", None)
+    empresa_name = ""
+    if empresa_id:
+        empresa_name = cached_value(
+            f"empresa-nombre:{empresa_id}", empresa_tags(empresa_id),
+            lambda: Empresa.objects.filter(pk=empresa_id).values_list("nombre", flat=True).first() or "",
+        )
 
     return Response({
         "id": u.id,
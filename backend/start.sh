@@ -7,4 +7,18 @@ python manage.py createsuperuser --noinput \
   --username "$DJANGO_SUPERUSER_USERNAME" \
   --email "$DJANGO_SUPERUSER_EMAIL" || true      # <- clave
 
-exec gunicorn config.wsgi:application --bind 0.0.0.0:${PORT:-8000}
+# Prometheus multiproceso (pedidos/metrics.py): ficheros de métricas de los
+# workers; se vacía en cada arranque para no arrastrar procesos muertos
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus_multiproc}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# SERVER=asgi -> uvicorn + config.asgi (lecturas async, ver pedidos/async_views.py)
+# por defecto  -> gunicorn + WSGI (workers síncronos)
+if [ "${SERVER:-wsgi}" = "asgi" ]; then
+  exec uvicorn config.asgi:application \
+    --host 0.0.0.0 --port ${PORT:-8000} \
+    --workers ${WEB_CONCURRENCY:-2} \
+    --proxy-headers --forwarded-allow-ips='*'
+fi
+
+exec gunicorn config.wsgi:application --config gunicorn.conf.py --bind 0.0.0.0:${PORT:-8000}
@@ -1,29 +1,36 @@
 import { useEffect, useState } from 'react';
-import api from '../services/api';
+import api, { nextCursor } from '../services/api';
 import Modal from '../components/Modal.jsx';
 import PedidoForm from '../components/PedidoForm.jsx';
 
 
     export default function MisPedidos() {
         const [pedidos, setPedidos] = useState([]);
+        const [cursor, setCursor] = useState(null);  // siguiente página (null = no hay más)
         const [loading, setLoading] = useState(true);
+        const [loadingMore, setLoadingMore] = useState(false);
         const [modalOpen, setModalOpen] = useState(false);
 
-        useEffect(() => {
-            const fetchPedidos = async () => {
-            try {
-                const res = await api.get('/mis-pedidos/');
-                setPedidos(res.data);
-            } catch (err) {
-                console.error('Error al obtener pedidos:', err);
-            } finally {
-                setLoading(false);
-            }
-            };
+        const fetchPage = async (pageCursor) => {
+            const res = await api.get('/mis-pedidos/', { params: pageCursor ? { cursor: pageCursor } : {} });
+            const rows = res.data.results ?? res.data;
+            setPedidos((prev) => (pageCursor ? [...prev, ...rows] : rows));
+            setCursor(nextCursor(res.data.next));
+        };
 
-            fetchPedidos();
+        useEffect(() => {
+            fetchPage(null)
+                .catch((err) => console.error('Error al obtener pedidos:', err))
+                .finally(() => setLoading(false));
         }, []);
 
+        const loadMore = () => {
+            setLoadingMore(true);
+            fetchPage(cursor)
+                .catch((err) => console.error('Error al obtener pedidos:', err))
+                .finally(() => setLoadingMore(false));
+        };
+
         return (
             <div className="p-6">
                 <h1 className="text-3xl font-bold mb-4">Mis pedidos</h1>
@@ -56,6 +63,15 @@ import PedidoForm from '../components/PedidoForm.jsx';
                 ))}
                 </ul>
             )}
+            {cursor && (
+                <button
+                onClick={loadMore}
+                disabled={loadingMore}
+                className="mt-4 px-4 py-2 rounded bg-indigo-600 text-white hover:bg-indigo-700 disabled:opacity-50"
+                >
+                {loadingMore ? 'Cargando...' : 'Cargar más'}
+                </button>
+            )}
             </div>
         );
         }
@@ -1,15 +1,22 @@
 import { useState } from 'react';
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
-import api from '../services/api.js';
+import { useInfiniteQuery, useMutation, useQueryClient } from '@tanstack/react-query';
+import api, { nextCursor } from '../services/api.js';
 import Modal from '../components/Modal.jsx';
 import PedidoForm from '../components/PedidoForm.jsx';
 
 export default function PedidosList() {
   const queryClient = useQueryClient();
-  const { data: pedidos = [], isLoading, isError } = useQuery({
+  // paginado por cursor: cada página trae `next`; "Cargar más" pide la siguiente
+  const { data, isLoading, isError, hasNextPage, fetchNextPage, isFetchingNextPage } = useInfiniteQuery({
     queryKey: ['pedidos'],
-    queryFn: async () => (await api.get('/pedidos/')).data,
+    queryFn: async ({ pageParam }) => {
+      const { data } = await api.get('/pedidos/', { params: pageParam ? { cursor: pageParam } : {} });
+      return data;
+    },
+    initialPageParam: null,
+    getNextPageParam: (lastPage) => nextCursor(lastPage.next),
   });
+  const pedidos = data?.pages.flatMap((page) => page.results ?? page) ?? [];
 
   const [modalOpen, setModalOpen] = useState(false);
   const addPedido = useMutation({
@@ -56,6 +63,15 @@ export default function PedidosList() {
           </tbody>
         </table>
       )}
+      {hasNextPage && (
+        <button
+          onClick={() => fetchNextPage()}
+          disabled={isFetchingNextPage}
+          className="mt-4 px-4 py-2 rounded bg-indigo-600 text-white hover:bg-indigo-700 disabled:opacity-50"
+        >
+          {isFetchingNextPage ? 'Cargando...' : 'Cargar más'}
+        </button>
+      )}
 
       <Modal isOpen={modalOpen} onClose={() => setModalOpen(false)}>
         <h2 className="text-2xl font-bold mb-4">Nuevo Pedido</h2>
@@ -68,4 +68,11 @@ api.interceptors.response.use(
   },
 );
 
+// Listados paginados por cursor: `next` es una URL absoluta del backend;
+// solo nos quedamos con el cursor para pedir la siguiente página con `api`
+export function nextCursor(next) {
+  if (!next) return null;
+  return new URL(next, window.location.origin).searchParams.get('cursor');
+}
+
 export default api;